@@ -6,6 +6,21 @@ ASSET_TYPES = {
         "group": "Written Content",
         "group_sort_order": 2,
         "name": "techblogs",
+        # "hash" or "json". json stores list metadata as real arrays.
+        "storage_type": "hash",
+        # chunk index grows with every post, so use approximate search.
+        # "datatype": "FLOAT16" halves vector memory, add "rescore_factor": 4 to keep
+        # full precision copies on disk, in RESCORE_VECTORS_DIR, and rerank 4 * k
+        # quantized candidates with them. json storage keeps the vectors as arrays of
+        # full precision numbers, there FLOAT16 only shrinks the index's own copy.
+        "vector_index": {
+            "algorithm": "HNSW",
+            "datatype": "FLOAT32",
+            "distance_metric": "COSINE",
+            "m": 16,
+            "ef_construction": 200,
+            "ef_runtime": 20,
+        },
     },
     "summarize_techblogs": {
         "display_default": 1,
@@ -14,6 +29,17 @@ ASSET_TYPES = {
         "group": "Written Content",
         "group_sort_order": 2,
         "name": "summarize_techblogs",
+        # "redis" or "numpy". numpy keeps vectors in a memory mapped file under
+        # NUMPY_BACKEND_DIR and searches them in process, set "numpy_index":
+        # {"ivf_lists": 64, "nprobe": 8} to search an IVF index instead of every vector.
+        "backend": "redis",
+        "storage_type": "hash",
+        # one summary per post is small enough for exact search
+        "vector_index": {
+            "algorithm": "FLAT",
+            "datatype": "FLOAT32",
+            "distance_metric": "COSINE",
+        },
     },
     # "nvblogs": {
     #     "display_default": 1,
@@ -64,3 +90,10 @@ ASSET_TYPES = {
     #     "name": "developernvidiacom",
     # },
 }
+
+# settings that describe the index rather than the asset type. They are not stored in the assettypes index.
+INDEX_SETTINGS_KEYS = ["vector_index", "storage_type", "backend", "numpy_index"]
+
+
+def asset_type_metadata(asset_type_info: dict) -> dict:
+    return {k: v for k, v in asset_type_info.items() if k not in INDEX_SETTINGS_KEYS}
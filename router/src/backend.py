@@ -0,0 +1,128 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+# redis default stop words, also skipped by the other backends
+REDIS_STOP_WORDS = {
+    "a",
+    "is",
+    "the",
+    "an",
+    "and",
+    "are",
+    "as",
+    "at",
+    "be",
+    "but",
+    "by",
+    "for",
+    "if",
+    "in",
+    "into",
+    "it",
+    "no",
+    "not",
+    "of",
+    "on",
+    "or",
+    "such",
+    "that",
+    "their",
+    "then",
+    "there",
+    "these",
+    "they",
+    "this",
+    "to",
+    "was",
+    "will",
+    "with",
+}
+
+# "any" matches items containing any keyword of the value, it is used by hybrid search
+KEYWORD_SEARCH_TYPES = ["union", "exact", "fuzzy", "wildcard", "any"]
+
+
+class MissingFilterFieldsError(ValueError):
+    """The index of an asset_type has no field for some of the filtered fields,
+    typically because it was created before they were added to the schema.
+    """
+
+    def __init__(self, index_name: str, fields: List[str]) -> None:
+        self.fields = fields
+        super().__init__(
+            f"index {index_name} cannot filter on {', '.join(fields)}, it was created "
+            f"without these fields. Reindex it with POST /data/reindex to add them."
+        )
+
+
+class VectorBackend(ABC):
+    """Storage and search of the chunks of one asset_type.
+
+    Filters are backend independent dicts. A numeric field maps to [low, high],
+    either bound may be None, and a tag field maps to the list of accepted values:
+
+        {"document_date_epoch": [1704067200.0, None], "chunk_contains_code": ["true"]}
+
+    Search results are dicts with the item "id", the requested return_fields and a
+    "score", best first. Document fields are looked up and added by the backend.
+    """
+
+    # redis key prefix of the items, also used to build deterministic item ids
+    key_prefix: str
+    # "hash" if list metadata must be serialized to strings before it is written
+    storage_type = "hash"
+
+    @abstractmethod
+    def add_embedded_texts(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        keys: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Writes already embedded texts, returns their ids."""
+
+    @abstractmethod
+    def update_metadata_and_delete(
+        self,
+        keys: List[str],
+        metadatas: List[Dict[str, Any]],
+        delete_keys: List[str],
+    ) -> None:
+        """Overwrites metadata fields of existing items and deletes other items."""
+
+    @abstractmethod
+    def delete_chunks(self, keys: List[str]) -> int:
+        """Deletes items, returns how many existed."""
+
+    @abstractmethod
+    def find_document_keys(self, document_url: str) -> List[str]:
+        """Returns the ids of every item of a document."""
+
+    @abstractmethod
+    def knn_search(
+        self,
+        embedding: np.ndarray,
+        k: int,
+        return_fields: List[str],
+        ef_runtime: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Nearest neighbours of an embedded query among the items matching filters."""
+
+    @abstractmethod
+    def keyword_search(
+        self,
+        search_type: str,
+        field: str,
+        value: str,
+        k: int,
+        return_fields: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """BM25 ranked keyword search, search_type is one of KEYWORD_SEARCH_TYPES."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
@@ -0,0 +1,136 @@
+from typing import Any, Dict, List, Optional, Tuple
+from embeddings import TritonHFEmbeddings, MAX_BATCH_SIZE
+import asyncio
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent query embeddings into batched Triton requests.
+
+    Each call to aembed_query_array is queued. A background task collects queued
+    queries for up to window_ms milliseconds, or until max_batch_size are waiting,
+    sends them to Triton as one batch and hands every caller its own vector back.
+    """
+
+    def __init__(
+        self,
+        embedder: TritonHFEmbeddings,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        window_ms: float = 2.0,
+        max_queue_size: int = 1024,
+        max_inflight_batches: int = 4,
+    ) -> None:
+        if max_batch_size > MAX_BATCH_SIZE:
+            raise ValueError(f"Max batch size {MAX_BATCH_SIZE} is less than max_batch_size: {max_batch_size}")
+
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.window_ms = window_ms
+        self.max_queue_size = max_queue_size
+        self.max_inflight_batches = max_inflight_batches
+
+        # created lazily inside the running event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        # keep references to in-flight batch tasks so they are not garbage collected
+        self._batch_tasks = set()
+
+        self.batches_sent = 0
+        self.queries_batched = 0
+        self.max_queue_depth = 0
+        self.batch_size_counts: Dict[int, int] = {}
+
+    def _ensure_started(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._inflight = asyncio.Semaphore(self.max_inflight_batches)
+            self._worker = asyncio.create_task(self._run())
+
+    async def aembed_query_array(self, text: str) -> np.ndarray:
+        """Embed query text as part of the next batch. Returns a float32 array."""
+        cached = await self.embedder.aget_cached_query(text)
+        if cached is not None:
+            return cached
+
+        self._ensure_started()
+
+        future = asyncio.get_running_loop().create_future()
+        # blocks when the queue is full, which pushes back on callers
+        await self._queue.put((text, future))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        window = self.window_ms / 1000
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + window
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # keep collecting the next batch while this one is with Triton
+            await self._inflight.acquire()
+            task = asyncio.create_task(self._embed_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _embed_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # identical queries in the same window share one slot in the batch
+        texts = list(dict.fromkeys(text for text, _ in batch))
+
+        self.batches_sent += 1
+        self.queries_batched += len(batch)
+        self.batch_size_counts[len(texts)] = self.batch_size_counts.get(len(texts), 0) + 1
+
+        try:
+            # these are queries, the query cache covers them
+            embeddings = await self.embedder.aembed_documents_array(
+                texts, use_passage_cache=False
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._inflight.release()
+
+        embeddings_by_text = dict(zip(texts, embeddings))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(embeddings_by_text[text])
+
+        for text, embedding in embeddings_by_text.items():
+            await self.embedder.aput_cached_query(text, embedding)
+
+    async def aclose(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    def stats(self) -> Dict[str, Any]:
+        mean_queries_per_batch = 0.0
+        if self.batches_sent > 0:
+            mean_queries_per_batch = self.queries_batched / self.batches_sent
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window_ms,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "max_queue_size": self.max_queue_size,
+            "batches_sent": self.batches_sent,
+            "queries_batched": self.queries_batched,
+            "mean_queries_per_batch": mean_queries_per_batch,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+        }
@@ -26,7 +26,8 @@ tags_metadata = [
     },
     {
         "name": "health",
-        "description": "Health check. Returns code 200 response if application is running.",
+        "description": "Health check. Returns code 200 response if application is running. /ready returns code 200 once redis indexes "
+        "are provisioned and Triton serves the embedding model, and 503 until then. /metrics returns counters such as cache hits and misses.",
     },
 ]
 
@@ -0,0 +1,12 @@
+insert_stream_openapi_extra = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/x-ndjson": {
+                "schema": {"type": "string"},
+                "example": '{"text": "Many CUDA applications running on multi-GPU platforms usually use a single GPU for their compute needs.", "document_title": "Improving CUDA Initialization Times Using cgroups in Certain Scenarios", "document_url": "https://developer.nvidia.com/blog/improving-cuda-initialization-times-using-cgroups-in-certain-scenarios/"}\n'
+                '{"text": "GPU isolation can be achieved on Linux systems by using Linux tools like ```cgroups```.", "document_title": "Improving CUDA Initialization Times Using cgroups in Certain Scenarios", "document_url": "https://developer.nvidia.com/blog/improving-cuda-initialization-times-using-cgroups-in-certain-scenarios/"}\n',
+            }
+        },
+    },
+}
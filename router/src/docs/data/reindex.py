@@ -0,0 +1,25 @@
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel
+
+
+class ReindexRequest(BaseModel):
+    asset_type: str
+    # copy rate limit, defaults to REINDEX_MAX_CHUNKS_PER_SECOND
+    max_chunks_per_second: Optional[int] = None
+    # keep the previous version and its chunks after the switch, e.g. to switch back
+    keep_previous: bool = False
+
+
+reindex_examples = {
+    "example1": {
+        "summary": "Rebuild an asset type's index with the current schema.",
+        "description": "Builds the next version of the index from schema.index_schema and the asset type's vector_index settings, "
+        "copying the stored chunks and vectors without re-embedding them. The fields of schema.field_migrations are filled in from the stored fields "
+        "while copying. Searches use the current version until the copy is done, "
+        "then the asset_type alias is switched to the new version. Writes made meanwhile go to both versions. Poll GET /data/reindex for progress.",
+        "value": {
+            "asset_type": "techblogs",
+            "max_chunks_per_second": 2000,
+        },
+    },
+}
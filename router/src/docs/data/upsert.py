@@ -0,0 +1,41 @@
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel
+
+
+class UpsertDataRequest(BaseModel):
+    document_url: str
+    chunks: List[Dict[str, Any]]
+    asset_type: str
+
+
+upsert_data_examples = {
+    "example1": {
+        "summary": "Upsert all chunks of a document.",
+        "description": "Replaces the chunks stored for document_url with the chunks passed in. "
+        "Chunks that did not change are not re-embedded, and chunks that are no longer present are deleted.",
+        "value": {
+            "asset_type": "techblogs",
+            "document_url": "https://developer.nvidia.com/blog/improving-cuda-initialization-times-using-cgroups-in-certain-scenarios/",
+            "chunks": [
+                {
+                    "text": "GPU isolation can be achieved on Linux systems by using Linux tools like ```cgroups```. In this section, we first discuss a lower-level approach and then a higher-level possible approach. Another method exposed by CUDA to isolate devices is the use of ```CUDA_VISIBLE_DEVICES```. Although functionally similar, this approach has limited initialization performance gains compared to the ```cgroups``` approach.",
+                    "text_components": [
+                        "GPU isolation can be achieved on Linux systems by using Linux tools like ```cgroups```. In this section, we first discuss a lower-level approach and then a higher-level possible approach.",
+                        "Another method exposed by CUDA to isolate devices is the use of ```CUDA_VISIBLE_DEVICES```. Although functionally similar, this approach has limited initialization performance gains compared to the ```cgroups``` approach.",
+                    ],
+                    "word_count": [37, 40],
+                    "contains_code": [True, True],
+                    "heading_section_tag": ["h2", "h2"],
+                    "heading_section_index": [1, 1],
+                    "heading_section_title": ["GPU isolation", "GPU isolation"],
+                    "only_code": [False, False],
+                    "paragraph_index": [0, 1],
+                    "paragraph_sentence_index": [0, 0],
+                    "document_title": "Improving CUDA Initialization Times Using cgroups in Certain Scenarios",
+                    "document_date": "2024-01-05T22:14:41",
+                    "document_date_modified": "2024-01-11T19:49:33",
+                },
+            ],
+        },
+    },
+}
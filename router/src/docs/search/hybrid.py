@@ -0,0 +1,49 @@
+from typing import List, Optional
+from pydantic import BaseModel
+from docs.search.semantic import SemanticSearchFilter
+
+DEFAULT_K = 10
+
+
+class HybridSearchRequest(BaseModel):
+    query: str
+    asset_types: Optional[List[str]] = None
+    k: Optional[int] = DEFAULT_K
+    return_fields: Optional[List[str]] = None
+    # "rrf" for reciprocal rank fusion, or "weighted" for a weighted sum of scores
+    fusion: Optional[str] = "rrf"
+    # weight of the semantic score with "weighted" fusion, the BM25 score gets 1 - semantic_weight
+    semantic_weight: Optional[float] = 0.5
+    # rank constant of reciprocal rank fusion
+    rrf_k: Optional[int] = 60
+    # results fetched from each of the BM25 and KNN searches, defaults to k
+    candidates: Optional[int] = None
+    ef_runtime: Optional[int] = None
+    filter: Optional[SemanticSearchFilter] = None
+
+
+hybrid_search_examples = {
+    "example1": {
+        "summary": "Simple hybrid search.",
+        "description": "Runs a BM25 keyword search and a semantic search for the same query, "
+        "and fuses both rankings into one list with reciprocal rank fusion.",
+        "value": {
+            "query": "recommender systems",
+        },
+    },
+    "example2": {
+        "summary": "Hybrid search with weighted score fusion.",
+        "description": "With 'fusion': 'weighted', the fused score is semantic_weight times the semantic score "
+        "plus (1 - semantic_weight) times the BM25 score scaled to the best BM25 score. "
+        "Pass candidates to fetch more results from each search before fusing.",
+        "value": {
+            "query": "isolating GPUs with cgroups",
+            "k": 5,
+            "asset_types": ["techblogs"],
+            "fusion": "weighted",
+            "semantic_weight": 0.7,
+            "candidates": 20,
+            "return_fields": ["document_title", "document_url", "text"],
+        },
+    },
+}
@@ -10,6 +10,7 @@ class KeywordSearchRequest(BaseModel):
     asset_types: Optional[List[str]] = None
     search_type: Optional[str] = None
     k: Optional[int] = DEFAULT_K
+    return_fields: Optional[List[str]] = None
 
 
 keyword_search_examples = {
@@ -1,13 +1,34 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from pydantic import BaseModel
 
 DEFAULT_K = 10
 
 
+class SemanticSearchFilter(BaseModel):
+    # ISO dates, e.g. "2024-01-05" or "2024-01-05T22:14:41". A date without a time
+    # includes that whole day in document_date_to.
+    document_date_from: Optional[str] = None
+    document_date_to: Optional[str] = None
+    document_url: Optional[Union[str, List[str]]] = None
+    contains_code: Optional[bool] = None
+
+
 class SemanticSearchRequest(BaseModel):
     query: str
     asset_types: Optional[List[str]] = None
     k: Optional[int] = DEFAULT_K
+    return_fields: Optional[List[str]] = None
+    ef_runtime: Optional[int] = None
+    filter: Optional[SemanticSearchFilter] = None
+
+
+class BatchSemanticSearchRequest(BaseModel):
+    queries: List[str]
+    asset_types: Optional[List[str]] = None
+    k: Optional[int] = DEFAULT_K
+    return_fields: Optional[List[str]] = None
+    ef_runtime: Optional[int] = None
+    filter: Optional[SemanticSearchFilter] = None
 
 
 semantic_search_examples = {
@@ -29,4 +50,59 @@ semantic_search_examples = {
             "asset_types": ["techblogs"],
         },
     },
+    "example3": {
+        "summary": "Semantic search, only returning some fields.",
+        "description": "By default every field except 'document_full_text' is returned. "
+        "Pass return_fields to only get the fields you need, which keeps responses small.",
+        "value": {
+            "query": "recommender systems",
+            "k": 3,
+            "asset_types": ["techblogs"],
+            "return_fields": ["document_title", "document_url", "text"],
+        },
+    },
+    "example4": {
+        "summary": "Semantic search with a larger HNSW candidate list.",
+        "description": "For asset types indexed with HNSW, ef_runtime sets how many candidates are explored "
+        "for this query. Higher values improve recall at the cost of latency. It is ignored for FLAT indexes.",
+        "value": {
+            "query": "recommender systems",
+            "k": 10,
+            "asset_types": ["techblogs"],
+            "ef_runtime": 100,
+        },
+    },
+    "example5": {
+        "summary": "Semantic search with a filter.",
+        "description": "Only chunks matching the filter are considered by the KNN search. "
+        "You can filter on a document_date range, on one or more document_url, and on whether the chunk contains code.",
+        "value": {
+            "query": "isolating GPUs",
+            "k": 5,
+            "asset_types": ["techblogs"],
+            "filter": {
+                "document_date_from": "2024-01-01",
+                "document_date_to": "2024-01-31",
+                "contains_code": True,
+            },
+        },
+    },
+}
+
+batch_semantic_search_examples = {
+    "example1": {
+        "summary": "Semantic search for several queries in one call.",
+        "description": "Every query is searched with the same asset_types, k, return_fields and filter. "
+        "Queries are embedded together in full batches, so this is much faster than one call per query.",
+        "value": {
+            "queries": [
+                "recommender systems",
+                "isolating GPUs",
+                "speeding up CUDA initialization",
+            ],
+            "k": 3,
+            "asset_types": ["techblogs"],
+            "return_fields": ["document_title", "document_url", "text"],
+        },
+    },
 }
@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import hashlib
+import threading
+import time
+import numpy as np
+import redis
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings with a TTL.
+
+    Entries are keyed by the normalized query text plus the model name and version,
+    so a new model version never serves stale vectors. If a redis client is passed in,
+    vectors are also spilled to redis so that router replicas can share them.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: float = 3600,
+        redis_client: Optional[redis.Redis] = None,
+        redis_prefix: str = "embcache:query",
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.redis_prefix = redis_prefix
+
+        # key -> (expires_at, vector)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # collapse runs of whitespace, the tokenizer ignores them anyway
+        return " ".join(text.split())
+
+    def make_key(self, text: str, model_name: str, model_version: str) -> str:
+        normalized = self.normalize(text)
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{model_name}:{model_version}:{digest}"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+        if self.redis_client is not None:
+            try:
+                value = self.redis_client.get(f"{self.redis_prefix}:{key}")
+            except redis.RedisError as e:
+                print(f"Warning: could not read query embedding cache from redis: {e}")
+                value = None
+            if value is not None:
+                vector = np.frombuffer(value, dtype=np.float32)
+                self._put_local(key, vector)
+                with self._lock:
+                    self.redis_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, vector: List[float]) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        self._put_local(key, vector)
+
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(
+                    f"{self.redis_prefix}:{key}", vector.tobytes(), ex=int(self.ttl)
+                )
+            except redis.RedisError as e:
+                print(f"Warning: could not write query embedding cache to redis: {e}")
+
+    def _put_local(self, key: str, vector: np.ndarray) -> None:
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class PassageEmbeddingCache:
+    """Redis-backed cache of passage embeddings shared by every router replica.
+
+    Vectors are stored as raw float32 or float16 bytes under a key derived from the
+    text hash, model name and model version, so re-indexing identical passages
+    (repeated ingest runs, or the same text in several indexes) skips Triton.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        dtype: str = "float32",
+        ttl: Optional[int] = None,
+        redis_prefix: str = "embcache:passage",
+    ) -> None:
+        if dtype not in ["float32", "float16"]:
+            raise ValueError(f"Passage cache dtype {dtype} is not valid")
+
+        self.redis_client = redis_client
+        self.dtype = np.dtype(dtype)
+        self.ttl = ttl
+        self.redis_prefix = redis_prefix
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def make_keys(
+        self, texts: List[str], model_name: str, model_version: str
+    ) -> List[str]:
+        keys = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            keys.append(
+                f"{self.redis_prefix}:{model_name}:{model_version}:{self.dtype.name}:{digest}"
+            )
+        return keys
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        try:
+            values = self.redis_client.mget(keys)
+        except redis.RedisError as e:
+            print(f"Warning: could not read passage embedding cache from redis: {e}")
+            values = [None] * len(keys)
+
+        vectors = []
+        for value in values:
+            if value is None:
+                vectors.append(None)
+            else:
+                vectors.append(
+                    np.frombuffer(value, dtype=self.dtype).astype(np.float32)
+                )
+
+        num_hits = sum(vector is not None for vector in vectors)
+        with self._lock:
+            self.hits += num_hits
+            self.misses += len(keys) - num_hits
+        return vectors
+
+    def put_many(self, keys: List[str], vectors: np.ndarray) -> None:
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key, vector in zip(keys, vectors):
+            pipeline.set(key, np.asarray(vector, dtype=self.dtype).tobytes(), ex=self.ttl)
+        try:
+            pipeline.execute()
+        except redis.RedisError as e:
+            print(f"Warning: could not write passage embedding cache to redis: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+            }
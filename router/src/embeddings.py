@@ -1,23 +1,95 @@
 from langchain.schema.embeddings import Embeddings
-from typing import List
+from typing import List, Optional
+from contextlib import contextmanager
+from embedding_cache import QueryEmbeddingCache, PassageEmbeddingCache
+import asyncio
+import queue
+import threading
 import time
 import numpy as np
 import tritonclient.http
+import tritonclient.http.aio
+import tritonclient.grpc
+import tritonclient.grpc.aio
+
+
+# 16 is max batch size triton accepts based on our config
+MAX_BATCH_SIZE = 16
+# e5-large-unsupervised embedding size
+EMBEDDING_DIMS = 1024
+
+
+class TritonClientPool:
+    """Pool of long-lived Triton clients.
+
+    The tritonclient http client is not thread safe, so each thread borrows its own
+    client from the pool and returns it when done. Clients keep their connections
+    alive between requests, so there is no per-call connection setup.
+    """
+
+    def __init__(self, triton_url: str, protocol: str = "http", size: int = 8) -> None:
+        if protocol not in ["http", "grpc"]:
+            raise ValueError(f"Triton protocol {protocol} is not valid")
+
+        self.triton_url = triton_url
+        self.protocol = protocol
+        self.size = size
+
+        self._clients = queue.LifoQueue()
+        self._num_created = 0
+        self._lock = threading.Lock()
+
+    def _create_client(self):
+        if self.protocol == "grpc":
+            return tritonclient.grpc.InferenceServerClient(
+                url=self.triton_url, verbose=False
+            )
+        return tritonclient.http.InferenceServerClient(
+            url=self.triton_url, verbose=False
+        )
+
+    @contextmanager
+    def client(self):
+        try:
+            triton_client = self._clients.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._num_created < self.size
+                if create:
+                    self._num_created += 1
+            if create:
+                triton_client = self._create_client()
+            else:
+                # every client is busy, wait for one to come back
+                triton_client = self._clients.get()
+
+        try:
+            yield triton_client
+        finally:
+            self._clients.put(triton_client)
 
 
 class TritonHFEmbeddings(Embeddings):
     def __init__(
         self,
         triton_host=None,
-        triton_port=8000,
+        triton_port=None,
         triton_model_name=None,
         triton_model_version=None,
+        triton_protocol=None,
+        triton_pool_size=8,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        passage_cache: Optional[PassageEmbeddingCache] = None,
     ) -> None:
         super().__init__()
 
         # default values
         if triton_host is None:
             triton_host = "triton"
+        if triton_protocol is None:
+            triton_protocol = "http"
+        if triton_port is None:
+            triton_port = 8001 if triton_protocol == "grpc" else 8000
         if triton_model_name is None:
             triton_model_name = "transformer_tensorrt_inference"
         if triton_model_version is None:
@@ -26,40 +98,130 @@ class TritonHFEmbeddings(Embeddings):
         self.triton_url = f"{triton_host}:{triton_port}"
         self.triton_model_name = triton_model_name
         self.triton_model_version = triton_model_version
+        self.triton_protocol = triton_protocol
+        self.triton_pool_size = triton_pool_size
+        self.query_cache = query_cache
+        self.passage_cache = passage_cache
 
-    def _embed_with_triton(self, query: List[str]) -> List[List[float]]:
-        triton_client = tritonclient.http.InferenceServerClient(
-            url=self.triton_url, verbose=False
+        self._client_pool = TritonClientPool(
+            self.triton_url, protocol=triton_protocol, size=triton_pool_size
         )
+        # asyncio client, created lazily inside the running event loop
+        self._aio_client = None
+
+    def _build_triton_request(self, query: List[str]):
+        if self.triton_protocol == "grpc":
+            triton_module = tritonclient.grpc
+        else:
+            triton_module = tritonclient.http
 
         triton_batch_size = len(query)
         triton_inputs = []
         triton_outputs = []
-        triton_text_input = tritonclient.http.InferInput(
+        triton_text_input = triton_module.InferInput(
             name="TEXT", shape=(triton_batch_size,), datatype="BYTES"
         )
         triton_text_input.set_data_from_numpy(np.asarray(query, dtype=object))
         triton_inputs.append(triton_text_input)
-        triton_outputs.append(
-            tritonclient.http.InferRequestedOutput("output", binary_data=False)
-        )
+        # request the raw output tensor instead of a JSON list of floats
+        if self.triton_protocol == "grpc":
+            triton_outputs.append(triton_module.InferRequestedOutput("output"))
+        else:
+            triton_outputs.append(
+                triton_module.InferRequestedOutput("output", binary_data=True)
+            )
+        return triton_inputs, triton_outputs
+
+    @staticmethod
+    def _as_float32(inference_results) -> np.ndarray:
+        # output is float32 or float16 depending on the engine, always hand back float32
+        return inference_results.as_numpy("output").astype(np.float32, copy=False)
+
+    def _embed_with_triton(self, query: List[str]) -> np.ndarray:
+        triton_inputs, triton_outputs = self._build_triton_request(query)
+
+        with self._client_pool.client() as triton_client:
+            inference_results = triton_client.infer(
+                model_name=self.triton_model_name,
+                model_version=self.triton_model_version,
+                inputs=triton_inputs,
+                outputs=triton_outputs,
+            )
+
+        return self._as_float32(inference_results)
+
+    def _get_aio_client(self):
+        if self._aio_client is None:
+            if self.triton_protocol == "grpc":
+                self._aio_client = tritonclient.grpc.aio.InferenceServerClient(
+                    url=self.triton_url, verbose=False
+                )
+            else:
+                self._aio_client = tritonclient.http.aio.InferenceServerClient(
+                    url=self.triton_url, verbose=False, conn_limit=self.triton_pool_size
+                )
+        return self._aio_client
 
-        inference_results = triton_client.infer(
+    async def _aembed_with_triton(self, query: List[str]) -> np.ndarray:
+        triton_inputs, triton_outputs = self._build_triton_request(query)
+
+        inference_results = await self._get_aio_client().infer(
             model_name=self.triton_model_name,
             model_version=self.triton_model_version,
             inputs=triton_inputs,
             outputs=triton_outputs,
         )
-        # triton_response = inference_results.get_response()
-        # embedded_query = triton_response['outputs'][0]['data']
-        embedded_query = inference_results.as_numpy("output").tolist()
-        return embedded_query
+        return self._as_float32(inference_results)
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        if len(texts) > 16:
-            raise ValueError(f"Max batch size 16 is less than size of input batch: {len(texts)}")
+    def is_ready(self) -> bool:
+        """Whether Triton is reachable and the embedding model is loaded."""
+        try:
+            with self._client_pool.client() as triton_client:
+                return bool(
+                    triton_client.is_model_ready(
+                        self.triton_model_name, self.triton_model_version
+                    )
+                )
+        except Exception as e:
+            print(f"Warning: Triton model is not ready: {e}")
+            return False
 
-        """Embed search docs."""
+    async def aclose(self) -> None:
+        """Closes the asyncio Triton client, if one was created."""
+        if self._aio_client is not None:
+            await self._aio_client.close()
+            self._aio_client = None
+
+    def _check_batch_size(self, texts: List[str]) -> None:
+        if len(texts) > MAX_BATCH_SIZE:
+            raise ValueError(f"Max batch size {MAX_BATCH_SIZE} is less than size of input batch: {len(texts)}")
+
+    def _query_cache_key(self, text: str) -> Optional[str]:
+        if self.query_cache is None:
+            return None
+        return self.query_cache.make_key(
+            text, self.triton_model_name, self.triton_model_version
+        )
+
+    async def _run_cache_call(self, fn, *args):
+        # the in-process cache is cheap, only go off the event loop for a redis round trip
+        if self.query_cache.redis_client is None:
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, fn, *args)
+
+    def _passage_cache_keys(self, texts: List[str]) -> List[str]:
+        return self.passage_cache.make_keys(
+            texts, self.triton_model_name, self.triton_model_version
+        )
+
+    @staticmethod
+    def _merge_cached(cached: List[Optional[np.ndarray]], embedded: np.ndarray) -> np.ndarray:
+        # fill the cache misses in order with the freshly embedded vectors
+        embedded = iter(embedded)
+        return np.stack([v if v is not None else next(embedded) for v in cached])
+
+    def _embed_documents_with_triton(self, texts: List[str]) -> np.ndarray:
         start = time.perf_counter()
 
         embedded_query = self._embed_with_triton(texts)
@@ -69,8 +231,78 @@ class TritonHFEmbeddings(Embeddings):
 
         return embedded_query
 
-    def embed_query(self, text: str) -> List[float]:
-        """Embed query text."""
+    def embed_documents_array(
+        self, texts: List[str], use_passage_cache: bool = True
+    ) -> np.ndarray:
+        """Embed search docs. Returns a (len(texts), dim) float32 array.
+
+        Passages found in the passage cache are not sent to Triton.
+        """
+        self._check_batch_size(texts)
+
+        if self.passage_cache is None or not use_passage_cache:
+            return self._embed_documents_with_triton(texts)
+
+        keys = self._passage_cache_keys(texts)
+        cached = self.passage_cache.get_many(keys)
+        misses = [i for i, v in enumerate(cached) if v is None]
+        if not misses:
+            return np.stack(cached)
+
+        embedded = self._embed_documents_with_triton([texts[i] for i in misses])
+        self.passage_cache.put_many([keys[i] for i in misses], embedded)
+
+        return self._merge_cached(cached, embedded)
+
+    async def _aembed_documents_with_triton(self, texts: List[str]) -> np.ndarray:
+        start = time.perf_counter()
+
+        embedded_query = await self._aembed_with_triton(texts)
+
+        end = time.perf_counter()
+        print(f"Triton Async Embed Texts [{len(texts)}] | Total Time: [{(end - start) * 1000} ms]")
+
+        return embedded_query
+
+    async def aembed_documents_array(
+        self, texts: List[str], use_passage_cache: bool = True
+    ) -> np.ndarray:
+        """Asynchronous embed_documents_array, does not block the event loop."""
+        self._check_batch_size(texts)
+
+        if self.passage_cache is None or not use_passage_cache:
+            return await self._aembed_documents_with_triton(texts)
+
+        loop = asyncio.get_running_loop()
+        keys = self._passage_cache_keys(texts)
+        cached = await loop.run_in_executor(None, self.passage_cache.get_many, keys)
+        misses = [i for i, v in enumerate(cached) if v is None]
+        if not misses:
+            return np.stack(cached)
+
+        embedded = await self._aembed_documents_with_triton([texts[i] for i in misses])
+        await loop.run_in_executor(
+            None, self.passage_cache.put_many, [keys[i] for i in misses], embedded
+        )
+
+        return self._merge_cached(cached, embedded)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed search docs."""
+        return self.embed_documents_array(texts).tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Asynchronous embed search docs."""
+        return (await self.aembed_documents_array(texts)).tolist()
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """Embed query text. Returns a float32 array."""
+        cache_key = self._query_cache_key(text)
+        if cache_key is not None:
+            cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         start = time.perf_counter()
 
         embedded_query = self._embed_with_triton([text])
@@ -78,5 +310,86 @@ class TritonHFEmbeddings(Embeddings):
         end = time.perf_counter()
         print(f"Triton Embed Query [{text}] | Total Time: [{(end - start) * 1000} ms]")
 
-        # unpack list of list to just a list
-        return embedded_query[0]
\ No newline at end of file
+        if cache_key is not None:
+            self.query_cache.put(cache_key, embedded_query[0])
+
+        # unpack batch of one to just a vector
+        return embedded_query[0]
+
+    async def aget_cached_query(self, text: str) -> Optional[np.ndarray]:
+        """Looks up a query embedding in the query cache, if there is one."""
+        cache_key = self._query_cache_key(text)
+        if cache_key is None:
+            return None
+        return await self._run_cache_call(self.query_cache.get, cache_key)
+
+    async def aput_cached_query(self, text: str, embedding: np.ndarray) -> None:
+        """Stores a query embedding in the query cache, if there is one."""
+        cache_key = self._query_cache_key(text)
+        if cache_key is None:
+            return
+        await self._run_cache_call(self.query_cache.put, cache_key, embedding)
+
+    async def aembed_query_array(self, text: str) -> np.ndarray:
+        """Asynchronous embed_query_array, does not block the event loop."""
+        cached = await self.aget_cached_query(text)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+
+        embedded_query = await self._aembed_with_triton([text])
+
+        end = time.perf_counter()
+        print(f"Triton Async Embed Query [{text}] | Total Time: [{(end - start) * 1000} ms]")
+
+        await self.aput_cached_query(text, embedded_query[0])
+
+        # unpack batch of one to just a vector
+        return embedded_query[0]
+
+    async def aembed_queries_array(
+        self, texts: List[str], max_inflight_batches: int = 4
+    ) -> List[np.ndarray]:
+        """Embeds many query texts in full Triton batches. Returns one float32 array per text.
+
+        Cached queries and duplicates are only embedded once, and up to
+        max_inflight_batches batches are sent to Triton at the same time.
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        cached = await asyncio.gather(
+            *[self.aget_cached_query(text) for text in unique_texts]
+        )
+        embeddings = dict(
+            (text, vector)
+            for text, vector in zip(unique_texts, cached)
+            if vector is not None
+        )
+        misses = [text for text in unique_texts if text not in embeddings]
+
+        semaphore = asyncio.Semaphore(max_inflight_batches)
+
+        async def _embed_batch(batch: List[str]) -> None:
+            async with semaphore:
+                # these are queries, the query cache covers them
+                embedded = await self.aembed_documents_array(batch, use_passage_cache=False)
+            for text, vector in zip(batch, embedded):
+                embeddings[text] = vector
+                await self.aput_cached_query(text, vector)
+
+        await asyncio.gather(
+            *[
+                _embed_batch(misses[i : i + MAX_BATCH_SIZE])
+                for i in range(0, len(misses), MAX_BATCH_SIZE)
+            ]
+        )
+
+        return [embeddings[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed query text."""
+        return self.embed_query_array(text).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Asynchronous embed query text."""
+        return (await self.aembed_query_array(text)).tolist()
@@ -0,0 +1,110 @@
+"""Full precision copies of quantized vectors, kept on disk for rescoring.
+
+An index with rescore_factor > 0 stores e.g. FLOAT16 vectors in redis. A float32
+copy in every chunk would take back more memory than the quantization saves, so the
+copies are kept in one memory-mapped float32 file per index version instead, and
+each chunk only stores the row of its copy in RESCORE_ROW_KEY. Rows are allocated
+through redis, so every router can write to the same file on a shared volume.
+"""
+from typing import List, Optional
+import os
+import threading
+import numpy as np
+import redis
+
+
+# chunk field holding the row of the chunk's full precision vector
+RESCORE_ROW_KEY = "content_vector_row"
+
+# the file grows by at least this many rows at a time
+MIN_CAPACITY = 1024
+
+
+class FullVectorFile:
+    """float32 vectors of the chunks of one index version, one row per chunk.
+
+    Rows of deleted chunks are reused by the next writes.
+    """
+
+    def __init__(self, client: redis.Redis, directory: str, index_name: str, dims: int) -> None:
+        self.client = client
+        self.index_name = index_name
+        self.dims = dims
+        self.directory = directory
+        self.path = os.path.join(directory, f"{index_name}.f32")
+        self._next_row_key = f"fullvectors:{index_name}:next_row"
+        self._free_rows_key = f"fullvectors:{index_name}:free_rows"
+        self._lock = threading.Lock()
+
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+
+    def _open_vectors(self, num_rows: int) -> None:
+        # other routers may have grown the file further, it never shrinks
+        size = max(MIN_CAPACITY, 1 << (num_rows - 1).bit_length()) * self.dims * 4
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.posix_fallocate(fd, 0, size)
+            capacity = os.fstat(fd).st_size // (self.dims * 4)
+        finally:
+            os.close(fd)
+
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(
+            self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dims)
+        )
+        self._capacity = capacity
+
+    def allocate(self, count: int) -> List[int]:
+        """Rows for count new vectors, the rows of deleted chunks first"""
+        rows = [int(row) for row in self.client.lpop(self._free_rows_key, count) or []]
+        missing = count - len(rows)
+        if missing:
+            end = self.client.incrby(self._next_row_key, missing)
+            rows.extend(range(end - missing, end))
+        return rows
+
+    def write(self, rows: List[int], vectors: np.ndarray) -> None:
+        if not rows:
+            return
+        with self._lock:
+            if max(rows) >= self._capacity:
+                self._open_vectors(max(rows) + 1)
+            self._vectors[rows] = np.asarray(vectors, dtype=np.float32)
+            self._vectors.flush()
+
+    def read(self, rows: List[int]) -> np.ndarray:
+        if not rows:
+            return np.zeros((0, self.dims), dtype=np.float32)
+        with self._lock:
+            # rows written by another router may be past the end of our mapping
+            if max(rows) >= self._capacity:
+                self._open_vectors(max(rows) + 1)
+            return np.array(self._vectors[rows])
+
+    def is_complete(self) -> bool:
+        """False if rows were allocated that the file does not hold.
+
+        The row allocators are in redis and survive the file, e.g. when the volume of
+        RESCORE_VECTORS_DIR was not kept. Rows read from a recreated file are zeros.
+        """
+        next_row = int(self.client.get(self._next_row_key) or 0)
+        if next_row == 0:
+            return True
+        return os.path.exists(self.path) and os.path.getsize(self.path) >= next_row * self.dims * 4
+
+    def free(self, rows: List[int]) -> None:
+        if rows:
+            self.client.rpush(self._free_rows_key, *rows)
+
+    def remove(self) -> None:
+        """Deletes the file and its rows once the index version is dropped"""
+        with self._lock:
+            self._vectors = None
+            self._capacity = 0
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        self.client.delete(self._next_row_key, self._free_rows_key)
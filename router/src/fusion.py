@@ -0,0 +1,69 @@
+from typing import Any, Dict, List
+
+
+def _merge(
+    fused: Dict[str, Dict[str, Any]], results: List[Dict[str, Any]], score_field: str
+) -> None:
+    for result in results:
+        res = fused.setdefault(result["id"], {})
+        for field, value in result.items():
+            if field != "score":
+                res.setdefault(field, value)
+        res[score_field] = float(result["score"])
+
+
+def fuse_results(
+    semantic_results: List[Dict[str, Any]],
+    keyword_results: List[Dict[str, Any]],
+    k: int,
+    method: str = "rrf",
+    semantic_weight: float = 0.5,
+    rrf_k: int = 60,
+) -> List[Dict[str, Any]]:
+    """Fuses a semantic and a BM25 ranking of the same index into one top k list.
+
+    Args:
+        semantic_results (List[Dict[str, Any]]): KNN results, best first, with "id" and "score"
+        keyword_results (List[Dict[str, Any]]): BM25 results, best first, with "id" and "score"
+        k (int): Max number of results to return
+        method (str): "rrf" sums 1 / (rrf_k + rank) over both rankings. "weighted" sums
+            semantic_weight * semantic score and (1 - semantic_weight) * BM25 score,
+            with BM25 scores divided by the best one.
+        semantic_weight (float): weight of the semantic score for "weighted"
+        rrf_k (int): rank constant for "rrf"
+
+    Returns:
+        List[Dict[str, Any]]: fused results, best first. "score" is the fused score,
+            "semantic_score" and "keyword_score" are set when a search returned the item.
+    """
+    if method not in ["rrf", "weighted"]:
+        raise ValueError(f"fusion method {method} is not valid")
+
+    fused: Dict[str, Dict[str, Any]] = {}
+    _merge(fused, semantic_results, "semantic_score")
+    _merge(fused, keyword_results, "keyword_score")
+
+    scores = dict.fromkeys(fused, 0.0)
+    if method == "rrf":
+        for results in [semantic_results, keyword_results]:
+            for rank, result in enumerate(results, start=1):
+                scores[result["id"]] += 1.0 / (rrf_k + rank)
+    else:
+        for result in semantic_results:
+            scores[result["id"]] += semantic_weight * float(result["score"])
+        max_keyword_score = max(
+            [float(result["score"]) for result in keyword_results], default=0.0
+        )
+        if max_keyword_score > 0:
+            for result in keyword_results:
+                scores[result["id"]] += (
+                    (1 - semantic_weight) * float(result["score"]) / max_keyword_score
+                )
+
+    ranked = sorted(fused, key=lambda id: scores[id], reverse=True)[:k]
+    output = []
+    for id in ranked:
+        res = fused[id]
+        res["score"] = scores[id]
+        output.append(res)
+    return output
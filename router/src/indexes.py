@@ -0,0 +1,351 @@
+from redis.commands.search.field import TagField, TextField, NumericField, VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import re
+import time
+import redis
+import schema
+
+
+# vector settings used when an asset type does not declare a vector_index
+DEFAULT_VECTOR_INDEX = {
+    "algorithm": "FLAT",
+    "datatype": "FLOAT32",
+    "distance_metric": "COSINE",
+}
+
+# our names for the HNSW parameters -> redis names
+HNSW_PARAMS = {
+    "m": "M",
+    "ef_construction": "EF_CONSTRUCTION",
+    "ef_runtime": "EF_RUNTIME",
+    "epsilon": "EPSILON",
+}
+
+# vector datatypes redis can index. FLOAT16 needs RediSearch 2.10 or later.
+VECTOR_DATATYPES = ["FLOAT16", "FLOAT32", "FLOAT64"]
+
+
+# versions built by a reindex are named e.g. techblogs_v7
+VERSION_SUFFIX = re.compile(r"_v(\d+)$")
+
+
+def versioned_index_name(asset_type: str, version: int) -> str:
+    # version 0 is the index created before any reindex, named after the asset type
+    if version == 0:
+        return asset_type
+    return f"{asset_type}_v{version}"
+
+
+def index_version(asset_type: str, index_name: str) -> int:
+    if index_name == asset_type:
+        return 0
+    match = VERSION_SUFFIX.search(index_name)
+    if match is None or index_name[: match.start()] != asset_type:
+        raise ValueError(f"index {index_name} is not a version of asset_type {asset_type}")
+    return int(match.group(1))
+
+
+def key_prefix(asset_type: str, version: int) -> str:
+    """Prefix of the chunk keys of an index version, the keys are "{prefix}:{id}".
+
+    Versions do not start with "doc:{asset_type}", otherwise the version 0 index,
+    which matches that prefix, would also index the chunks of the newer versions.
+    """
+    if version == 0:
+        return f"doc:{asset_type}"
+    return f"doc_v{version}:{asset_type}"
+
+
+def index_prefix(asset_type: str, version: int) -> str:
+    # the version 0 index was always created without the trailing separator
+    if version == 0:
+        return key_prefix(asset_type, version)
+    return f"{key_prefix(asset_type, version)}:"
+
+
+def resolve_index(client: redis.Redis, asset_type: str) -> str:
+    """Name of the index the asset_type alias points to.
+
+    The asset type is the name of its version 0 index until the first reindex,
+    and an alias of its current version after it. Returns the asset type if
+    neither exists yet.
+    """
+    try:
+        index_info = client.ft(asset_type).info()
+    except redis.ResponseError:
+        return asset_type
+    index_name = index_info.get("index_name", asset_type)
+    if isinstance(index_name, bytes):
+        index_name = index_name.decode("utf-8")
+    return index_name
+
+
+def version_state_key(asset_type: str) -> str:
+    return f"indexversion:{asset_type}"
+
+
+def _read_state(
+    client: redis.Redis, asset_type: str
+) -> Optional[Tuple[int, Optional[int], bool]]:
+    state = client.hgetall(version_state_key(asset_type))
+    if not state:
+        return None
+    building = state.get(b"building")
+    # builds recorded before they had a lease count as expired, nothing renews them
+    expired = float(state.get(b"building_until", 0)) < time.time()
+    return int(state[b"current"]), int(building) if building is not None else None, expired
+
+
+def read_version_state(
+    client: redis.Redis, asset_type: str
+) -> Optional[Tuple[int, Optional[int]]]:
+    """Current index version of an asset type and the version being built, if any.
+
+    They are recorded by the router running the reindex so that the other routers
+    follow it. The build is only reported while its lease is renewed, a router that
+    died mid-copy does not keep the others writing to its version. Returns None if
+    the asset type was never reindexed.
+    """
+    state = _read_state(client, asset_type)
+    if state is None:
+        return None
+    current, building, expired = state
+    return current, None if expired else building
+
+
+def expired_build(client: redis.Redis, asset_type: str) -> Optional[Tuple[int, int]]:
+    """Current version and the version whose build lease expired, if any"""
+    state = _read_state(client, asset_type)
+    if state is None or state[1] is None or not state[2]:
+        return None
+    return state[0], state[1]
+
+
+def write_version_state(
+    client: redis.Redis,
+    asset_type: str,
+    current: int,
+    building: Optional[int] = None,
+    lease_seconds: float = 60,
+) -> None:
+    """Records the index versions of an asset type
+
+    Args:
+        client (redis.Redis): redis client
+        asset_type (str): asset type
+        current (int): version serving searches
+        building (Optional[int]): version being built, if any
+        lease_seconds (float): seconds the build is reported for unless renewed
+    """
+    pipeline = client.pipeline(transaction=True)
+    pipeline.hset(version_state_key(asset_type), "current", current)
+    if building is None:
+        pipeline.hdel(version_state_key(asset_type), "building", "building_until")
+    else:
+        pipeline.hset(
+            version_state_key(asset_type),
+            mapping={"building": building, "building_until": time.time() + lease_seconds},
+        )
+    pipeline.execute()
+
+
+def renew_build_lease(client: redis.Redis, asset_type: str, lease_seconds: float) -> None:
+    """Extends the lease of the version being built, called by the router building it"""
+    client.hset(version_state_key(asset_type), "building_until", time.time() + lease_seconds)
+
+
+def index_storage_type(client: redis.Redis, index_name: str) -> str:
+    """"hash" or "json", from the definition of an existing index or alias"""
+    index_info = client.ft(index_name).info()
+    return "json" if "JSON" in str(index_info.get("index_definition")) else "hash"
+
+
+def index_attributes(client: redis.Redis, index_name: str) -> Dict[str, Dict[str, Any]]:
+    """Fields of an existing index by name, with their settings as FT.INFO reports them.
+
+    Keys of the settings are lower case, e.g. "type", and "algorithm" and "data_type"
+    for the vector field. The index may predate the current schema and vector_index
+    settings, so this is what queries must match. RediSearch versions before 2.8 do
+    not report the vector field settings.
+    """
+    index_info = client.ft(index_name).info()
+    attributes = {}
+    for attribute in index_info.get("attributes", []):
+        values = [v.decode("utf-8") if isinstance(v, bytes) else v for v in attribute]
+        settings = {str(k).lower(): v for k, v in zip(values[::2], values[1::2])}
+        attributes[settings.get("attribute")] = settings
+    return attributes
+
+
+def index_prefixes(client: redis.Redis, index_name: str) -> List[str]:
+    """Key prefixes of an existing index, from its definition in FT.INFO"""
+    definition = client.ft(index_name).info().get("index_definition", [])
+    values = [v.decode("utf-8") if isinstance(v, bytes) else v for v in definition]
+    prefixes = dict(zip(values[::2], values[1::2])).get("prefixes", [])
+    return [p.decode("utf-8") if isinstance(p, bytes) else p for p in prefixes]
+
+
+def overlapping_indexes(
+    client: redis.Redis, index_name: str, prefix: str, chunk_prefix: str
+) -> List[str]:
+    """Other indexes that would index the chunks of an index, or whose chunks it would index.
+
+    Prefixes match keys by plain string prefix, so the version 0 index of techblogs,
+    with prefix "doc:techblogs", also indexes the "doc:techblogs_copy:{id}" chunks
+    of an asset type named techblogs_copy.
+
+    Args:
+        client (redis.Redis): redis client
+        index_name (str): name of the index, which is skipped
+        prefix (str): key prefix of the index
+        chunk_prefix (str): key prefix of its chunks, the keys are "{chunk_prefix}:{id}"
+
+    Returns:
+        List[str]: names of the overlapping indexes
+    """
+    overlapping = []
+    for name in client.execute_command("FT._LIST"):
+        name = name.decode("utf-8") if isinstance(name, bytes) else name
+        if name == index_name:
+            continue
+        for other_prefix in index_prefixes(client, name):
+            if f"{chunk_prefix}:".startswith(other_prefix) or other_prefix.startswith(prefix):
+                overlapping.append(name)
+                break
+    return overlapping
+
+
+def iso_to_epoch(date_string: str) -> float:
+    """Seconds since the epoch of an ISO date, the value NUMERIC date fields index"""
+    # dates without a timezone are UTC, like last_indexed
+    date = datetime.fromisoformat(date_string)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def _field_path(name: str, storage_type: str) -> str:
+    if storage_type != "json":
+        return name
+    # arrays of strings are indexed element by element
+    if name in schema.list_fields:
+        return f"$.{name}[*]"
+    return f"$.{name}"
+
+
+def index_fields(
+    storage_type: str, vector_index: Optional[Dict[str, Any]], dims: int
+) -> List[Any]:
+    """Builds the redis search fields of a chunk index from schema.index_schema.
+
+    Args:
+        storage_type (str): "hash" or "json"
+        vector_index (Optional[Dict[str, Any]]): vector_index settings of the asset type
+        dims (int): number of dimensions of the embeddings
+
+    Returns:
+        List[Any]: redis-py search fields, including the content and vector fields
+    """
+    if vector_index is None:
+        vector_index = DEFAULT_VECTOR_INDEX
+
+    def as_name(name):
+        return name if storage_type == "json" else None
+
+    fields = [TextField(_field_path("content", storage_type), as_name=as_name("content"))]
+
+    for field in schema.index_schema["tag"]:
+        fields.append(
+            TagField(
+                _field_path(field["name"], storage_type),
+                separator=field.get("separator", ","),
+                as_name=as_name(field["name"]),
+            )
+        )
+    for field in schema.index_schema["text"]:
+        fields.append(
+            TextField(
+                _field_path(field["name"], storage_type), as_name=as_name(field["name"])
+            )
+        )
+    for field in schema.index_schema.get("numeric", []):
+        fields.append(
+            NumericField(
+                _field_path(field["name"], storage_type), as_name=as_name(field["name"])
+            )
+        )
+
+    algorithm = vector_index.get("algorithm", "FLAT").upper()
+    datatype = vector_index.get("datatype", "FLOAT32").upper()
+    if datatype not in VECTOR_DATATYPES:
+        raise ValueError(f"vector datatype {datatype} is not valid")
+    vector_attributes = {
+        "TYPE": datatype,
+        "DIM": dims,
+        "DISTANCE_METRIC": vector_index.get("distance_metric", "COSINE").upper(),
+    }
+    if algorithm == "HNSW":
+        for param, redis_param in HNSW_PARAMS.items():
+            if vector_index.get(param) is not None:
+                vector_attributes[redis_param] = vector_index[param]
+    fields.append(
+        VectorField(
+            _field_path("content_vector", storage_type),
+            algorithm,
+            vector_attributes,
+            as_name=as_name("content_vector"),
+        )
+    )
+
+    return fields
+
+
+def create_index(
+    client: redis.Redis,
+    index_name: str,
+    prefix: str,
+    storage_type: str,
+    vector_index: Optional[Dict[str, Any]],
+    dims: int,
+) -> None:
+    """Creates a chunk index from the declared schema. Does not embed anything."""
+    if storage_type == "json":
+        index_type = IndexType.JSON
+    else:
+        index_type = IndexType.HASH
+
+    client.ft(index_name).create_index(
+        index_fields(storage_type, vector_index, dims),
+        definition=IndexDefinition(prefix=[prefix], index_type=index_type),
+    )
+
+
+def index_exists(client: redis.Redis, index_name: str) -> bool:
+    try:
+        client.ft(index_name).info()
+    except redis.ResponseError:
+        return False
+    return True
+
+
+def ensure_index(
+    client: redis.Redis,
+    index_name: str,
+    prefix: str,
+    storage_type: str,
+    vector_index: Optional[Dict[str, Any]],
+    dims: int,
+) -> bool:
+    """Creates a chunk index unless it already exists. Returns True if it was created."""
+    if index_exists(client, index_name):
+        return False
+    try:
+        create_index(client, index_name, prefix, storage_type, vector_index, dims)
+    except redis.ResponseError:
+        # another replica created it first
+        if not index_exists(client, index_name):
+            raise
+        return False
+    return True
@@ -1,13 +1,19 @@
-from fastapi import FastAPI, Body, Query, HTTPException
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi import FastAPI, Body, HTTPException, Request
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from langchain.vectorstores.redis import Redis
-from redisvl.query.filter import Text, Tag
-from redis.commands.search.query import Query
 from redisvl.index import SearchIndex
-from typing import List, Dict, Any
-from datetime import datetime
-from embeddings import TritonHFEmbeddings
+from typing import List, Dict, Any, Callable, Tuple, AsyncIterator, Optional
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from embeddings import TritonHFEmbeddings, EMBEDDING_DIMS
+from embedding_cache import QueryEmbeddingCache, PassageEmbeddingCache
+from batcher import EmbeddingBatcher
+from search_cache import SearchResponseCache
+from fusion import fuse_results
+from vectorstore import RedisVectorstore
+from backend import VectorBackend, MissingFilterFieldsError
+from numpy_backend import NumpyVectorBackend
+from full_vectors import FullVectorFile
 from docs.common import (
     doc_description,
     tags_metadata,
@@ -15,7 +21,10 @@ from docs.common import (
 )
 from docs.search.semantic import (
     SemanticSearchRequest,
+    BatchSemanticSearchRequest,
+    SemanticSearchFilter,
     semantic_search_examples,
+    batch_semantic_search_examples,
 )
 from docs.search.semantic import DEFAULT_K as SEMANTIC_SEARCH_DEFAULT_K
 from docs.search.keyword import (
@@ -23,56 +32,98 @@ from docs.search.keyword import (
     keyword_search_examples,
 )
 from docs.search.keyword import DEFAULT_K as KEYWORD_SEARCH_DEFAULT_K
+from docs.search.hybrid import HybridSearchRequest, hybrid_search_examples
+from docs.search.hybrid import DEFAULT_K as HYBRID_SEARCH_DEFAULT_K
 from docs.data.insert import InsertDataRequest, insert_data_examples
+from docs.data.insert_stream import insert_stream_openapi_extra
+from docs.data.upsert import UpsertDataRequest, upsert_data_examples
 from docs.data.delete import DeleteDataRequest, delete_data_examples
+from docs.data.reindex import ReindexRequest, reindex_examples
 from docs.assettypes.update import UpdateAssetTypesRequest, update_asset_types_examples
-from assettypes import ASSET_TYPES
+from assettypes import ASSET_TYPES, asset_type_metadata
 import schema
+import indexes
+import migrations
+import reindex
+import redis
+import asyncio
+import collections
+import numpy as np
+import hashlib
 import json
 import os
+import threading
+import time
 
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
 REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
+# One connection pool is shared by every redis client of the process. When all
+# connections are busy, callers wait up to REDIS_POOL_TIMEOUT seconds for one.
+REDIS_POOL_MAX_CONNECTIONS = int(os.environ.get("REDIS_POOL_MAX_CONNECTIONS", "64"))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", "20"))
 TRITON_HOST = os.environ["TRITON_HOST"]
-
-
-REDIS_STOP_WORDS = {
-    "a",
-    "is",
-    "the",
-    "an",
-    "and",
-    "are",
-    "as",
-    "at",
-    "be",
-    "but",
-    "by",
-    "for",
-    "if",
-    "in",
-    "into",
-    "it",
-    "no",
-    "not",
-    "of",
-    "on",
-    "or",
-    "such",
-    "that",
-    "their",
-    "then",
-    "there",
-    "these",
-    "they",
-    "this",
-    "to",
-    "was",
-    "will",
-    "with",
-}
+# "http" or "grpc". Port defaults to 8000 for http and 8001 for grpc.
+TRITON_PROTOCOL = os.environ.get("TRITON_PROTOCOL", "http")
+TRITON_PORT = os.environ.get("TRITON_PORT")
+TRITON_POOL_SIZE = int(os.environ.get("TRITON_POOL_SIZE", "16"))
+
+# When enabled, the per asset_type searches of a request run concurrently.
+# Either way they run on the search thread pool so they never block the event loop.
+SEARCH_FANOUT = os.environ.get("SEARCH_FANOUT", "1") == "1"
+SEARCH_FANOUT_WORKERS = int(os.environ.get("SEARCH_FANOUT_WORKERS", "16"))
+
+# Max number of 16 chunk Triton batches a single insert keeps in flight
+INSERT_CONCURRENCY = int(os.environ.get("INSERT_CONCURRENCY", "4"))
+
+# In-process LRU cache of query embeddings. Size 0 disables it.
+# With QUERY_CACHE_REDIS=1 vectors are also shared between replicas through redis.
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "10000"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "3600"))
+QUERY_CACHE_REDIS = os.environ.get("QUERY_CACHE_REDIS", "0") == "1"
+
+# Redis cache of passage embeddings, keyed by text hash and model version. Off by
+# default, each cached float32 vector takes about 4 KB of redis memory on top of the
+# index. PASSAGE_CACHE_DTYPE is "float32" or "float16". A TTL of 0 means entries never expire.
+PASSAGE_CACHE = os.environ.get("PASSAGE_CACHE", "0") == "1"
+PASSAGE_CACHE_DTYPE = os.environ.get("PASSAGE_CACHE_DTYPE", "float32")
+PASSAGE_CACHE_TTL = int(os.environ.get("PASSAGE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Coalesce concurrent query embeddings into batched Triton requests.
+# A batch is sent after EMBED_BATCH_WINDOW_MS or once EMBED_BATCH_MAX_SIZE queries are waiting.
+EMBED_BATCHING = os.environ.get("EMBED_BATCHING", "1") == "1"
+EMBED_BATCH_MAX_SIZE = int(os.environ.get("EMBED_BATCH_MAX_SIZE", "16"))
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "2"))
+EMBED_BATCH_QUEUE_SIZE = int(os.environ.get("EMBED_BATCH_QUEUE_SIZE", "1024"))
+
+# Max number of queries in one /search/semantic/batch request, and how many
+# 16 query Triton batches it keeps in flight
+SEMANTIC_BATCH_MAX_QUERIES = int(os.environ.get("SEMANTIC_BATCH_MAX_QUERIES", "256"))
+SEMANTIC_BATCH_CONCURRENCY = int(os.environ.get("SEMANTIC_BATCH_CONCURRENCY", "4"))
+
+# Redis cache of full search responses. Writes to an asset_type invalidate its entries.
+SEARCH_CACHE = os.environ.get("SEARCH_CACHE", "1") == "1"
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", "300"))
+
+# Where asset types with "backend": "numpy" keep their vectors and metadata
+NUMPY_BACKEND_DIR = os.environ.get("NUMPY_BACKEND_DIR", "/data/vectors")
+# Where indexes with a rescore_factor keep the full precision copies of their vectors.
+# Every router must see the same directory, e.g. on a shared volume.
+RESCORE_VECTORS_DIR = os.environ.get("RESCORE_VECTORS_DIR", "/data/rescore_vectors")
+
+# Reindex copies chunks in the background at a bounded rate so searches are not starved
+REINDEX_MAX_CHUNKS_PER_SECOND = int(os.environ.get("REINDEX_MAX_CHUNKS_PER_SECOND", "2000"))
+REINDEX_BATCH_SIZE = int(os.environ.get("REINDEX_BATCH_SIZE", "200"))
+# Routers follow a reindex run by another router through the index versions it records
+# in redis. Writes check them every time, searches at most every INDEX_VERSION_CHECK_SECONDS.
+INDEX_VERSION_CHECK_SECONDS = float(os.environ.get("INDEX_VERSION_CHECK_SECONDS", "5"))
+# The previous version is dropped this long after the switch, once every router left it
+REINDEX_DROP_DELAY_SECONDS = float(os.environ.get("REINDEX_DROP_DELAY_SECONDS", "30"))
+# The router running a reindex renews its lease on the version being built. If it dies,
+# the other routers stop writing to that version once the lease expires, and the next
+# reindex drops it.
+REINDEX_LEASE_SECONDS = float(os.environ.get("REINDEX_LEASE_SECONDS", "60"))
 
 
 # Instantiate FastAPI with some info needed for docs
@@ -92,6 +143,27 @@ app.add_middleware(
 )
 
 
+redis_pool = redis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_POOL_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    health_check_interval=30,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+
+def _redis_pool_stats() -> Dict[str, int]:
+    # the pool queue holds idle connections, and None for connections not created yet
+    created = len(redis_pool._connections)
+    idle = sum(1 for connection in list(redis_pool.pool.queue) if connection is not None)
+    return {
+        "max_connections": redis_pool.max_connections,
+        "created_connections": created,
+        "in_use_connections": created - idle,
+        "idle_connections": idle,
+    }
+
+
 # Now create a SearchIndex that just has info about the
 # asset_types being stored. Each asset_type itself will become
 # its own index, but this index has metadata about the other indexes.
@@ -115,12 +187,26 @@ asset_types_index = SearchIndex.from_dict(
         },
     }
 )
-asset_types_index.connect(REDIS_URL)
-asset_types_index.create(overwrite=False)
-asset_types_index.load(
-    [v for k, v in ASSET_TYPES.items()],
-    key_field="name",
-)
+
+# Nothing talks to redis or Triton at import time. Indexes are created, and
+# vectorstores opened, the first time they are used or when /ready is probed.
+_provision_lock = threading.Lock()
+_asset_types_index_ready = False
+
+
+def _get_asset_types_index() -> SearchIndex:
+    global _asset_types_index_ready
+    if not _asset_types_index_ready:
+        with _provision_lock:
+            if not _asset_types_index_ready:
+                asset_types_index.set_client(redis_client)
+                asset_types_index.create(overwrite=False)
+                asset_types_index.load(
+                    [asset_type_metadata(v) for k, v in ASSET_TYPES.items()],
+                    key_field="name",
+                )
+                _asset_types_index_ready = True
+    return asset_types_index
 
 
 def _convert_data_structs_to_str(chunk):
@@ -136,6 +222,26 @@ def _convert_data_structs_to_str(chunk):
     return chunk
 
 
+def _add_filter_fields(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds the TAG and NUMERIC fields that semantic search can pre-filter on.
+    Must be called before the list fields are converted to strings.
+    """
+    for date_field in ["document_date", "document_date_modified"]:
+        if isinstance(chunk.get(date_field), str):
+            try:
+                chunk[f"{date_field}_epoch"] = indexes.iso_to_epoch(chunk[date_field])
+            except ValueError:
+                print(f"Warning: chunk has invalid {date_field} {chunk[date_field]}")
+
+    contains_code = chunk.get("contains_code")
+    if isinstance(contains_code, list):
+        chunk["chunk_contains_code"] = "true" if any(contains_code) else "false"
+    elif isinstance(contains_code, bool):
+        chunk["chunk_contains_code"] = "true" if contains_code else "false"
+
+    return chunk
+
+
 def _redis_results_as_dicts(results) -> List[Dict[str, Any]]:
     results_as_dicts = []
 
@@ -150,64 +256,436 @@ def _redis_results_as_dicts(results) -> List[Dict[str, Any]]:
     return results_as_dicts
 
 
-def _instantiate_vectorstore(asset_type: str) -> Redis:
-    embedder = TritonHFEmbeddings(triton_host=TRITON_HOST)
+query_cache = None
+if QUERY_CACHE_SIZE > 0:
+    query_cache = QueryEmbeddingCache(
+        max_size=QUERY_CACHE_SIZE,
+        ttl=QUERY_CACHE_TTL,
+        redis_client=redis_client if QUERY_CACHE_REDIS else None,
+    )
 
-    metadata = dict(schema.metadata)
+passage_cache = None
+if PASSAGE_CACHE:
+    passage_cache = PassageEmbeddingCache(
+        redis_client,
+        dtype=PASSAGE_CACHE_DTYPE,
+        ttl=PASSAGE_CACHE_TTL or None,
+    )
 
-    text = "passage: " + metadata["text"]
+search_cache = None
+if SEARCH_CACHE:
+    search_cache = SearchResponseCache(redis_client, ttl=SEARCH_CACHE_TTL)
+
+# Single embedder shared by the vectorstores and the search endpoints
+embedder = TritonHFEmbeddings(
+    triton_host=TRITON_HOST,
+    triton_port=TRITON_PORT,
+    triton_protocol=TRITON_PROTOCOL,
+    triton_pool_size=TRITON_POOL_SIZE,
+    query_cache=query_cache,
+    passage_cache=passage_cache,
+)
 
-    metadata = _convert_data_structs_to_str(metadata)
+query_batcher = None
+if EMBED_BATCHING:
+    query_batcher = EmbeddingBatcher(
+        embedder,
+        max_batch_size=EMBED_BATCH_MAX_SIZE,
+        window_ms=EMBED_BATCH_WINDOW_MS,
+        max_queue_size=EMBED_BATCH_QUEUE_SIZE,
+    )
 
-    try:  # try to restore from an existing index
-        rds = Redis.from_existing_index(
-            embedder,
-            index_name=asset_type,
-            redis_url=REDIS_URL,
-            schema=schema.index_schema,
-        )
-        print(f"Restored from existing redis index {asset_type}")
-    except:
-        # create the index with some dummy data
-        rds, keys = Redis.from_texts_return_keys(
-            texts=[text],
-            embedding=embedder,
-            metadatas=[metadata],
-            redis_url=REDIS_URL,
-            index_name=asset_type,
-            index_schema=schema.index_schema,  # need this to tell what is a tag
-        )
 
-        # delete dummy data
-        Redis.delete(keys, redis_url=REDIS_URL)
+async def _aembed_query(query: str) -> np.ndarray:
+    if query_batcher is not None:
+        return await query_batcher.aembed_query_array(query)
+    return await embedder.aembed_query_array(query)
 
-        print(f"Created new redis index {asset_type}")
 
+def _get_storage_type(asset_type: str) -> str:
+    return ASSET_TYPES[asset_type].get("storage_type", "hash")
+
+
+def _instantiate_numpy_backend(asset_type: str) -> NumpyVectorBackend:
+    vector_schema = ASSET_TYPES[asset_type].get("vector_index") or {}
+    numpy_index = ASSET_TYPES[asset_type].get("numpy_index") or {}
+    backend = NumpyVectorBackend(
+        os.path.join(NUMPY_BACKEND_DIR, asset_type),
+        asset_type,
+        EMBEDDING_DIMS,
+        distance_metric=vector_schema.get("distance_metric", "COSINE"),
+        ivf_lists=numpy_index.get("ivf_lists", 0),
+        nprobe=numpy_index.get("nprobe", 8),
+    )
+    print(
+        f"Opened numpy vector backend {asset_type} with {backend.stats()['num_items']} items"
+    )
+    return backend
+
+
+def _open_redis_vectorstore(asset_type: str, version: int) -> RedisVectorstore:
+    # FLAT or HNSW, and the HNSW parameters. Only used when the index is created.
+    vector_schema = ASSET_TYPES[asset_type].get("vector_index")
+
+    storage_type = _get_storage_type(asset_type)
+    index_name = indexes.versioned_index_name(asset_type, version)
+
+    # create the index straight from the declared schema, nothing is embedded
+    created = indexes.ensure_index(
+        redis_client,
+        index_name,
+        indexes.index_prefix(asset_type, version),
+        storage_type,
+        vector_schema,
+        EMBEDDING_DIMS,
+    )
+    if created:
+        print(f"Created new redis index {index_name}")
+    else:
+        print(f"Restored from existing redis index {index_name}")
+
+    # langchain only knows FLOAT32 and FLOAT64 vectors, and not our rescoring setting
+    langchain_vector_schema = None
+    if vector_schema is not None:
+        langchain_vector_schema = {
+            k: v for k, v in vector_schema.items() if k != "rescore_factor"
+        }
+        langchain_vector_schema["datatype"] = "FLOAT32"
+
+    # the index was just ensured, open it over the shared pool
+    rds = RedisVectorstore.from_client(
+        redis_client,
+        embedder,
+        index_name=index_name,
+        index_schema=schema.index_schema,
+        vector_schema=langchain_vector_schema,
+    )
+    rds.key_prefix = indexes.key_prefix(asset_type, version)
+    rds.storage_type = storage_type
+    if vector_schema is not None:
+        rds.vector_datatype = vector_schema.get("datatype", "FLOAT32").upper()
+        rds.rescore_factor = int(vector_schema.get("rescore_factor") or 0)
+    rds.full_vectors = FullVectorFile(redis_client, RESCORE_VECTORS_DIR, index_name, EMBEDDING_DIMS)
+    if rds.rescore_factor > 0 and not rds.full_vectors.is_complete():
+        # reranking by zeros would be worse than the quantized distances
+        print(
+            f"Full precision vectors of index {index_name} are missing from "
+            f"{rds.full_vectors.path}, rescoring is disabled"
+        )
+        rds.rescore_factor = 0
     return rds
 
 
-# Create vectorstores
-vectorstores = {}
-for asset_type in ASSET_TYPES.keys():
-    vectorstores[asset_type] = _instantiate_vectorstore(asset_type)
+def _open_index_versions(
+    asset_type: str, current: int, building: Optional[int]
+) -> VectorBackend:
+    live = _open_redis_vectorstore(asset_type, current)
+    # search through the alias, so that the next switch applies before we notice it
+    if indexes.resolve_index(redis_client, asset_type) == live.index_name:
+        live.search_index_name = asset_type
+    if building is None:
+        return live
+    # another router is building the next version, mirror our writes into it
+    return reindex.DualWriteBackend(live, _open_redis_vectorstore(asset_type, building))
+
+
+def _instantiate_vectorstore(asset_type: str) -> VectorBackend:
+    if ASSET_TYPES[asset_type].get("backend", "redis") == "numpy":
+        return _instantiate_numpy_backend(asset_type)
+
+    state = indexes.read_version_state(redis_client, asset_type)
+    if state is None:
+        # never reindexed, the asset type is the name of its version 0 index
+        index_name = indexes.resolve_index(redis_client, asset_type)
+        state = (indexes.index_version(asset_type, index_name), None)
+    vectorstore_versions[asset_type] = state
+    version_checks[asset_type] = time.monotonic()
+    return _open_index_versions(asset_type, *state)
+
+
+# vectorstore of each asset_type, opened on first use
+vectorstores: Dict[str, VectorBackend] = {}
+# (current version, version being built) the redis vectorstores were opened for,
+# and when the versions recorded in redis were last compared with them
+vectorstore_versions: Dict[str, Tuple[int, Optional[int]]] = {}
+version_checks: Dict[str, float] = {}
+
+
+def _refresh_vectorstore(asset_type: str) -> VectorBackend:
+    """Reopens the vectorstore of an asset_type if another router reindexed it"""
+    version_checks[asset_type] = time.monotonic()
+    state = indexes.read_version_state(redis_client, asset_type)
+    if state is not None and state != vectorstore_versions[asset_type]:
+        with _provision_lock:
+            if state != vectorstore_versions[asset_type]:
+                print(f"Index versions of asset_type {asset_type} changed to {state}")
+                vectorstores[asset_type] = _open_index_versions(asset_type, *state)
+                vectorstore_versions[asset_type] = state
+    return vectorstores[asset_type]
+
+
+def _get_vectorstore(
+    asset_type: str, max_age: float = INDEX_VERSION_CHECK_SECONDS
+) -> VectorBackend:
+    """Vectorstore of an asset_type
+
+    Args:
+        asset_type (str): asset_type to open
+        max_age (float): seconds since the index versions were last checked after which
+            they are checked again, 0 before writes
 
+    Raises:
+        ValueError: if the asset_type is invalid
 
-def _get_vectorstore(asset_type: str) -> Redis:
+    Returns:
+        VectorBackend: vectorstore of the asset_type
+    """
     if asset_type not in ASSET_TYPES:
         raise ValueError(f"asset_type {asset_type} is not valid")
-    rds = vectorstores[asset_type]
+    rds = vectorstores.get(asset_type)
+    if rds is None:
+        with _provision_lock:
+            rds = vectorstores.get(asset_type)
+            if rds is None:
+                rds = _instantiate_vectorstore(asset_type)
+                vectorstores[asset_type] = rds
+    elif (
+        asset_type in vectorstore_versions
+        and time.monotonic() - version_checks[asset_type] >= max_age
+    ):
+        rds = _refresh_vectorstore(asset_type)
     return rds
 
 
+def _search_vectorstore(
+    asset_type: str, search_fn: Callable[[VectorBackend], List[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    rds = _get_vectorstore(asset_type)
+    try:
+        return search_fn(rds)
+    except MissingFilterFieldsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except redis.ResponseError:
+        # the index may have been switched or dropped by a reindex on another router
+        refreshed = _get_vectorstore(asset_type, 0)
+        if refreshed is rds:
+            raise
+        return search_fn(refreshed)
+
+
+def _provision() -> None:
+    """Creates missing indexes and opens every vectorstore"""
+    redis_client.ping()
+    _get_asset_types_index()
+    for asset_type in ASSET_TYPES.keys():
+        _get_vectorstore(asset_type)
+
+
+# Bounded pool for the blocking redis calls made by the endpoints
+search_executor = ThreadPoolExecutor(
+    max_workers=SEARCH_FANOUT_WORKERS, thread_name_prefix="search"
+)
+
+
+async def _run_blocking(fn: Callable, *args):
+    """Runs a blocking call on the search thread pool so the event loop stays free"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, fn, *args)
+
+
+async def _fan_out(
+    search_fn: Callable[[str], List[Dict[str, Any]]], asset_types: List[str]
+) -> List[Dict[str, Any]]:
+    """Runs search_fn for each asset_type and builds the per asset_type output.
+
+    Args:
+        search_fn (Callable[[str], List[Dict[str, Any]]]): Blocking search for one asset_type.
+        asset_types (List[str]): asset_types to search.
+
+    Returns:
+        List[Dict[str, Any]]: list of dicts, in the same order as asset_types.
+    """
+    for asset_type in asset_types:
+        if asset_type not in ASSET_TYPES:
+            raise ValueError(f"asset_type {asset_type} is not valid")
+
+    if SEARCH_FANOUT:
+        all_results = await asyncio.gather(
+            *[_run_blocking(search_fn, asset_type) for asset_type in asset_types]
+        )
+    else:
+        all_results = []
+        for asset_type in asset_types:
+            all_results.append(await _run_blocking(search_fn, asset_type))
+
+    output = []
+    for asset_type, asset_type_results in zip(asset_types, all_results):
+        output.append(
+            {
+                "asset_type": asset_type,
+                "display_title": ASSET_TYPES[asset_type]["display_title"],
+                "results": asset_type_results,
+            }
+        )
+    return output
+
+
+async def _cached_search(
+    kind: str,
+    request: Dict[str, Any],
+    asset_types: List[str],
+    search: Callable[[], Any],
+) -> List[Dict[str, Any]]:
+    """Returns the cached response of a search request, or runs search and caches it
+
+    Args:
+        kind (str): which search endpoint, part of the cache key
+        request (Dict[str, Any]): normalized request parameters, part of the cache key
+        asset_types (List[str]): asset_types searched, their generations are part of the cache key
+        search (Callable[[], Any]): coroutine function computing the response
+
+    Returns:
+        List[Dict[str, Any]]: the search response
+    """
+    if search_cache is None:
+        return await search()
+
+    cache_key, cached = await _run_blocking(
+        search_cache.lookup, kind, request, asset_types
+    )
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+    output = await search()
+    compute_ms = (time.perf_counter() - start) * 1000
+
+    if cache_key is not None:
+        await _run_blocking(search_cache.put, cache_key, output, compute_ms)
+    return output
+
+
+async def _invalidate_search_cache(asset_types: List[str]) -> None:
+    if search_cache is not None:
+        await _run_blocking(search_cache.invalidate, asset_types)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if query_batcher is not None:
+        await query_batcher.aclose()
+    await embedder.aclose()
+
+
 @app.get("/health", tags=["health"])
 async def health_endpoint() -> JSONResponse:
     return JSONResponse(status_code=200, content={"success": True})
 
 
+@app.get("/ready", tags=["health"])
+async def ready_endpoint() -> JSONResponse:
+    """Readiness probe. The first call provisions the redis indexes.
+
+    Returns:
+        JSONResponse: 200 if redis and Triton are ready to serve, 503 otherwise.
+    """
+    checks = {}
+    try:
+        await _run_blocking(_provision)
+        checks["redis"] = True
+    except redis.RedisError as e:
+        print(f"Warning: redis is not ready: {e}")
+        checks["redis"] = False
+    checks["triton"] = await _run_blocking(embedder.is_ready)
+
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503, content={"ready": ready, **checks}
+    )
+
+
+@app.get("/metrics", tags=["health"])
+async def metrics_endpoint() -> Dict[str, Any]:
+    metrics = {}
+    if query_cache is not None:
+        metrics["query_embedding_cache"] = query_cache.stats()
+    if passage_cache is not None:
+        metrics["passage_embedding_cache"] = passage_cache.stats()
+    if query_batcher is not None:
+        metrics["query_embedding_batcher"] = query_batcher.stats()
+    if search_cache is not None:
+        metrics["search_response_cache"] = search_cache.stats()
+    metrics["redis_connection_pool"] = _redis_pool_stats()
+    backend_stats = {
+        asset_type: rds.stats() for asset_type, rds in list(vectorstores.items())
+    }
+    backend_stats = {k: v for k, v in backend_stats.items() if v}
+    if backend_stats:
+        metrics["vector_backends"] = backend_stats
+    return metrics
+
+
 def _ends_with_eos_punctuation(text: str):
     return text.endswith(".") or text.endswith("!") or text.endswith("?")
 
 
+def _get_return_fields(return_fields: Optional[List[str]]) -> List[str]:
+    if not return_fields:
+        return schema.default_return_fields
+    for field in return_fields:
+        if field not in schema.returnable_fields:
+            raise ValueError(f"return_fields has invalid field: {field}")
+    return return_fields
+
+
+def _date_to_upper_epoch(date_string: str) -> float:
+    # a date without a time includes the whole day, up to its last millisecond
+    try:
+        date.fromisoformat(date_string)
+    except ValueError:
+        return indexes.iso_to_epoch(date_string)
+    return indexes.iso_to_epoch(date_string) + 24 * 3600 - 0.001
+
+
+def _build_semantic_filter(
+    search_filter: Optional[SemanticSearchFilter],
+) -> Optional[Dict[str, Any]]:
+    """Turns the optional filter of a semantic search into backend filters
+
+    Args:
+        search_filter (Optional[SemanticSearchFilter]): filter passed in the request body
+
+    Returns:
+        Optional[Dict[str, Any]]: [low, high] range of numeric fields and accepted values
+            of tag fields, None if nothing is filtered on
+    """
+    if search_filter is None:
+        return None
+
+    filters: Dict[str, Any] = {}
+
+    if search_filter.document_date_from or search_filter.document_date_to:
+        filters["document_date_epoch"] = [
+            indexes.iso_to_epoch(search_filter.document_date_from)
+            if search_filter.document_date_from
+            else None,
+            _date_to_upper_epoch(search_filter.document_date_to)
+            if search_filter.document_date_to
+            else None,
+        ]
+    if search_filter.document_url:
+        document_url = search_filter.document_url
+        filters["document_url"] = (
+            [document_url] if isinstance(document_url, str) else list(document_url)
+        )
+    if search_filter.contains_code is not None:
+        filters["chunk_contains_code"] = [
+            "true" if search_filter.contains_code else "false"
+        ]
+
+    return filters or None
+
+
 @app.post("/search/semantic", tags=["search"])
 async def semantic_search_endpoint(
     params: SemanticSearchRequest = Body(openapi_examples=semantic_search_examples),
@@ -239,139 +717,153 @@ async def semantic_search_endpoint(
     if not asset_types:
         asset_types = list(sorted(ASSET_TYPES.keys()))
 
-    print(f"Semantic search for query '{params.query}' in asset_types {asset_types}")
-
-    output = []
-
-    #TODO: change rds.similarity_search_with_relevance_scores
-    # so that we don't re-embed query over and over...
-    # this adds latency. 
-    # we should first embed the query independently, and then...
-    # this means subclassing langchain Redis vectorstore
-    # so that we have similarity_search_by_vector but with returning scores 
-    for asset_type in asset_types:
-        rds: Redis = _get_vectorstore(asset_type)
+    # which fields to return for each result
+    return_fields = _get_return_fields(params.return_fields)
 
-        display_title = ASSET_TYPES[asset_type]["display_title"]
+    # hybrid pre-filter applied inside the KNN query
+    filters = _build_semantic_filter(params.filter)
 
-        docs_and_scores = rds.similarity_search_with_relevance_scores(query, k=k)
+    # size of the HNSW candidate list, trades recall for latency.
+    # Ignored for FLAT indexes. Uses the index default if missing.
+    ef_runtime = params.ef_runtime
 
-        asset_type_results = []
-
-        for doc, similarity_score in docs_and_scores:
-            # print(
-            #     f"Content: {doc.page_content} --- Similiarity: {similarity_score} --- Metadata: {doc.metadata}"
-            # )
-            # merge metadata dictionary with new dictionary containing similarity_score
-            asset_type_results.append({**doc.metadata, **{"score": similarity_score}})
+    print(f"Semantic search for query '{params.query}' in asset_types {asset_types}")
 
-        output.append(
-            {
-                "asset_type": asset_type,
-                "display_title": display_title,
-                "results": asset_type_results,
-            }
+    async def _search():
+        # embed the query once and reuse the vector for every asset_type
+        query_embedding = await _aembed_query(query)
+
+        return await _fan_out(
+            lambda asset_type: _semantic_search(
+                asset_type,
+                query_embedding,
+                k,
+                return_fields,
+                ef_runtime,
+                filters,
+            ),
+            asset_types,
         )
 
-    return output
-
-
-def _keyword_search(index: SearchIndex, query_string: str, k: int):
-    """Searches the index for the query_string using BM25 as scorer. Includes scores
-
-    Args:
-        index (SearchIndex): _description_
-        query_string (str): _description_
-        k (int): Max number of results to return
-
-    Returns:
-        _type_: _description_
-    """
-    results = index.search(
-        Query(query_string).with_scores().scorer("BM25").paging(offset=0, num=k)
+    return await _cached_search(
+        "semantic",
+        {
+            "query": QueryEmbeddingCache.normalize(query),
+            "k": k,
+            "return_fields": return_fields,
+            "ef_runtime": ef_runtime,
+            "filter": filters,
+        },
+        asset_types,
+        _search,
     )
-    return _redis_results_as_dicts(results)
 
 
-def _keyword_search_union(
-    index: SearchIndex, field: str, value: str, k: int
+@app.post("/search/semantic/batch", tags=["search"])
+async def batch_semantic_search_endpoint(
+    params: BatchSemanticSearchRequest = Body(
+        openapi_examples=batch_semantic_search_examples
+    ),
 ) -> List[Dict[str, Any]]:
-    """Used when you want to search TEXT fields that contain a union of multiple
-    keywords. Order of keywords does not matter.
+    """Semantic search for many queries sharing asset_types, k and filter
 
     Args:
-        index (SearchIndex): _description_
-        field (str): _description_
-        value (str): String with each keyword separated by a space from the next.
-        k (int): Max number of results to return
+        params (BatchSemanticSearchRequest, optional): _description_. Defaults to Body(openapi_examples=batch_semantic_search_examples).
+
+    Raises:
+        ValueError: if too many queries, or invalid "asset_types" passed in body
 
     Returns:
-        _type_: _description_
+        List[Dict[str, Any]]: one dict per query, in order, with the query and its
+            per asset_type results as returned by /search/semantic.
     """
-    return _keyword_search(index, f"@{field}:({value})", k)
-
-
-def _keyword_search_exact(index: SearchIndex, field: str, value: str, k: int):
-    """Used when you want to search for an exact match on a TAG field, or for
-    an exact match on a subphrase of a TEXT field.
+    if len(params.queries) > SEMANTIC_BATCH_MAX_QUERIES:
+        raise ValueError(
+            f"Max number of queries {SEMANTIC_BATCH_MAX_QUERIES} is less than number of queries: {len(params.queries)}"
+        )
 
-    Args:
-        index (SearchIndex): _description_
-        field (str): _description_
-        value (str): _description_
-        k (int): Max number of results to return
+    # add necessary prefix for e5-large-unsupervised embedder
+    queries = ["query: " + query.strip() for query in params.queries]
 
-    Returns:
-        _type_: _description_
-    """
-    # if it's a tag field, we use tag syntax: "@field:{value}""
-    if field in schema.tag_fields:
-        filter_expression = Tag(field) == value
-    # otherwise using text syntax: "@field:\"value\""
+    k = params.k
+    if not k:
+        k = SEMANTIC_SEARCH_DEFAULT_K
     else:
-        filter_expression = Text(field) == value
+        k = int(k)
 
-    filter_expression = str(filter_expression)
-    return _keyword_search(index, filter_expression, k)
+    asset_types = params.asset_types
+    if not asset_types:
+        asset_types = list(sorted(ASSET_TYPES.keys()))
+    for asset_type in asset_types:
+        if asset_type not in ASSET_TYPES:
+            raise ValueError(f"asset_type {asset_type} is not valid")
 
+    return_fields = _get_return_fields(params.return_fields)
+    filters = _build_semantic_filter(params.filter)
+    ef_runtime = params.ef_runtime
 
-def _keyword_search_fuzzy(index: SearchIndex, field: str, value: str, k: int):
-    """For Levenshtein fuzzy match for a TEXT field.
+    print(f"Batch semantic search for {len(queries)} queries in asset_types {asset_types}")
 
-    Args:
-        index (SearchIndex): _description_
-        field (str): _description_
-        value (str): _description_
-        k (int): Max number of results to return
+    # embed every query up front in full Triton batches
+    query_embeddings = await embedder.aembed_queries_array(
+        queries, max_inflight_batches=SEMANTIC_BATCH_CONCURRENCY
+    )
 
-    Returns:
-        _type_: _description_
-    """
-    # TODO: can make it configurable how much Levenshtein distance to allow
-    # For example, one % is used for stricter matches, and three %%% for looser matches
-    keywords = [f"%%{x}%%" for x in value.split() if x not in REDIS_STOP_WORDS]
-    fuzzy_match = Text(field) % "".join(keywords)
-    filter_expression = str(fuzzy_match)
-    return _keyword_search(index, filter_expression, k)
+    # the KNN searches of every query and asset_type share the search thread pool
+    all_results = await asyncio.gather(
+        *[
+            _fan_out(
+                lambda asset_type, query_embedding=query_embedding: _semantic_search(
+                    asset_type,
+                    query_embedding,
+                    k,
+                    return_fields,
+                    ef_runtime,
+                    filters,
+                ),
+                asset_types,
+            )
+            for query_embedding in query_embeddings
+        ]
+    )
 
+    return [
+        {"query": query, "results": results}
+        for query, results in zip(params.queries, all_results)
+    ]
 
-def _keyword_search_wildcard(index: SearchIndex, field: str, value: str, k: int):
-    """Allows using * as wildcard symbol
+
+def _semantic_search(
+    asset_type: str,
+    query_embedding: np.ndarray,
+    k: int,
+    return_fields: List[str],
+    ef_runtime: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """KNN search of one asset_type with an already embedded query
 
     Args:
-        index (SearchIndex): _description_
-        field (str): _description_
-        value (str): Should contain "*"
+        asset_type (str): asset_type to search
+        query_embedding (np.ndarray): embedded query
         k (int): Max number of results to return
+        return_fields (List[str]): fields to return for each result
+        ef_runtime (Optional[int]): HNSW EF_RUNTIME for this query
+        filters (Optional[Dict[str, Any]]): pre-filter for the KNN query, None for no filter
 
     Returns:
-        _type_: _description_
+        List[Dict[str, Any]]: requested fields of each result, along with its similarity score
     """
-    assert "*" in value
-
-    wildcard_match = Text(field) % value
-    filter_expression = str(wildcard_match)
-    return _keyword_search(index, filter_expression, k)
+    return _search_vectorstore(
+        asset_type,
+        lambda rds: rds.knn_search(
+            query_embedding,
+            k,
+            return_fields,
+            ef_runtime=ef_runtime,
+            filters=filters,
+        ),
+    )
 
 
 @app.post("/search/keyword", tags=["search"])
@@ -411,52 +903,193 @@ async def keyword_search_endpoint(
     if search_type not in ["union", "exact", "fuzzy", "wildcard"]:
         raise ValueError(f"search_type parameter has invalid value: {search_type}")
 
+    # which fields to return for each result
+    return_fields = _get_return_fields(params.return_fields)
+
     ### END JSON BODY PARAMATERS ###
 
     print(
         f"Keyword search for value '{value}' in field '{field}' with search_type '{search_type}' in asset_types {asset_types}"
     )
 
-    output = []
+    return await _cached_search(
+        "keyword",
+        {
+            "search_type": search_type,
+            "field": field,
+            "value": value,
+            "k": k,
+            "return_fields": return_fields,
+        },
+        asset_types,
+        lambda: _fan_out(
+            lambda asset_type: _keyword_search_asset_type(
+                asset_type, search_type, field, value, k, return_fields
+            ),
+            asset_types,
+        ),
+    )
 
-    for asset_type in asset_types:
-        display_title = ASSET_TYPES[asset_type]["display_title"]
-
-        # index = SearchIndex.from_existing(name=asset_type, redis_url=REDIS_URL)
-        schema_dict = {
-            "index": {
-                "name": asset_type,
-                "prefix": f"doc:{asset_type}",
-                "storage_type": "hash",
-                "key_separator": ":",
-            },
-            "fields": schema.index_schema,
-        }
-        index = SearchIndex.from_dict(
-            schema_dict=schema_dict, 
-            redis_url=REDIS_URL
-        )
 
-        if search_type == "union":
-            asset_type_results = _keyword_search_union(index, field, value, k)
-        elif search_type == "exact":
-            asset_type_results = _keyword_search_exact(index, field, value, k)
-        elif search_type == "fuzzy":
-            asset_type_results = _keyword_search_fuzzy(index, field, value, k)
-        elif search_type == "wildcard":
-            asset_type_results = _keyword_search_wildcard(index, field, value, k)
+def _keyword_search_asset_type(
+    asset_type: str,
+    search_type: str,
+    field: str,
+    value: str,
+    k: int,
+    return_fields: List[str],
+) -> List[Dict[str, Any]]:
+    """Keyword search of one asset_type
 
-        # print(asset_type_results)
+    Args:
+        asset_type (str): asset_type to search
+        search_type (str): one of "union", "exact", "fuzzy", "wildcard"
+        field (str): name of field we are looking for
+        value (str): value to match on
+        k (int): Max number of results to return
+        return_fields (List[str]): fields to return for each result
 
-        output.append(
-            {
-                "asset_type": asset_type,
-                "display_title": display_title,
-                "results": asset_type_results,
-            }
+    Returns:
+        List[Dict[str, Any]]: requested fields of each result, along with its BM25 score
+    """
+    return _search_vectorstore(
+        asset_type,
+        lambda rds: rds.keyword_search(search_type, field, value, k, return_fields),
+    )
+
+
+@app.post("/search/hybrid", tags=["search"])
+async def hybrid_search_endpoint(
+    params: HybridSearchRequest = Body(openapi_examples=hybrid_search_examples),
+) -> List[Dict[str, Any]]:
+    """BM25 and semantic search of the same query, fused into one ranking
+
+    Args:
+        params (HybridSearchRequest, optional): _description_. Defaults to Body(openapi_examples=hybrid_search_examples).
+
+    Raises:
+        ValueError: if invalid "asset_types" or "fusion" passed in body
+
+    Returns:
+        List[Dict[str, Any]]: list of dicts. Each dict corresponds to an asset_type.
+    """
+    # add necessary prefix for e5-large-unsupervised embedder
+    query = "query: " + params.query.strip()
+
+    k = params.k
+    if not k:
+        k = HYBRID_SEARCH_DEFAULT_K
+    else:
+        k = int(k)
+
+    # only fetch as many results from each search as the fusion looks at
+    candidates = max(int(params.candidates or k), k)
+
+    asset_types = params.asset_types
+    if not asset_types:
+        asset_types = list(sorted(ASSET_TYPES.keys()))
+
+    fusion = (params.fusion or "rrf").lower().strip()
+    if fusion not in ["rrf", "weighted"]:
+        raise ValueError(f"fusion parameter has invalid value: {fusion}")
+    semantic_weight = params.semantic_weight
+    if semantic_weight is None:
+        semantic_weight = 0.5
+    rrf_k = params.rrf_k or 60
+
+    return_fields = _get_return_fields(params.return_fields)
+    filters = _build_semantic_filter(params.filter)
+    ef_runtime = params.ef_runtime
+
+    print(f"Hybrid search for query '{params.query}' in asset_types {asset_types}")
+
+    async def _search():
+        query_embedding, keyword_results = await asyncio.gather(
+            _aembed_query(query),
+            _fan_out(
+                # the BM25 query matches any of the keywords, and is filtered like the KNN query
+                lambda asset_type: _search_vectorstore(
+                    asset_type,
+                    lambda rds: rds.keyword_search(
+                        "any", "content", params.query, candidates, return_fields, filters
+                    ),
+                ),
+                asset_types,
+            ),
+        )
+        semantic_results = await _fan_out(
+            lambda asset_type: _semantic_search(
+                asset_type,
+                query_embedding,
+                candidates,
+                return_fields,
+                ef_runtime,
+                filters,
+            ),
+            asset_types,
         )
 
-    return output
+        for semantic, keyword in zip(semantic_results, keyword_results):
+            semantic["results"] = fuse_results(
+                semantic["results"],
+                keyword["results"],
+                k,
+                method=fusion,
+                semantic_weight=semantic_weight,
+                rrf_k=rrf_k,
+            )
+        return semantic_results
+
+    return await _cached_search(
+        "hybrid",
+        {
+            "query": QueryEmbeddingCache.normalize(query),
+            "k": k,
+            "candidates": candidates,
+            "fusion": fusion,
+            "semantic_weight": semantic_weight,
+            "rrf_k": rrf_k,
+            "return_fields": return_fields,
+            "ef_runtime": ef_runtime,
+            "filter": filters,
+        },
+        asset_types,
+        _search,
+    )
+
+
+def _prepare_chunk(
+    chunk: Dict[str, Any], storage_type: str = "hash"
+) -> Tuple[str, Dict[str, Any]]:
+    """Formats a chunk for the embedder and its metadata for redis
+
+    Args:
+        chunk (Dict[str, Any]): chunk with at least a "text" field
+        storage_type (str): "hash" or "json". Lists are only serialized to strings for hash.
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: text to embed, and metadata to save alongside the vector
+    """
+    # must have prefix for e5 embedder
+    new_text = "passage: "
+
+    # document_title
+    if chunk.get("document_title") is not None:
+        document_title = chunk["document_title"].strip()
+        if not chunk["text"].startswith(document_title):
+            if not _ends_with_eos_punctuation(document_title):
+                new_text += document_title + ". "
+            else:
+                new_text += document_title + " "
+    
+    new_text += chunk["text"].strip()
+
+    chunk["last_indexed"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+
+    chunk = _add_filter_fields(chunk)
+    if storage_type == "json":
+        return new_text, chunk
+    return new_text, _convert_data_structs_to_str(chunk)
 
 
 @app.post("/data/insert", tags=["data"])
@@ -475,7 +1108,7 @@ async def insert_data_endpoint(
 
     asset_type: str = params.asset_type
 
-    rds: Redis = _get_vectorstore(asset_type)
+    rds: VectorBackend = await _run_blocking(_get_vectorstore, asset_type, 0)
 
     text_inputs = []
     chunk_inputs = []
@@ -484,47 +1117,278 @@ async def insert_data_endpoint(
             print("Warning: chunk is missing text")
             continue
 
-        # must have prefix for e5 embedder
-        new_text = "passage: "
-
-        # document_title
-        if chunk.get("document_title") is not None:
-            document_title = chunk["document_title"].strip()
-            if not chunk["text"].startswith(document_title):
-                if not _ends_with_eos_punctuation(document_title):
-                    new_text += document_title + ". "
-                else:
-                    new_text += document_title + " "
-        
-        new_text += chunk["text"].strip()
+        new_text, chunk = _prepare_chunk(chunk, rds.storage_type)
 
         text_inputs.append(new_text)
 
-        chunk["last_indexed"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
-
-        chunk_inputs.append(_convert_data_structs_to_str(chunk))
+        chunk_inputs.append(chunk)
 
         # print(f"Added text chunk: {new_text}")
 
     if len(text_inputs) > 0:
-        # embed all chunks at once
-        # if we do not create embeddings here first, then
-        # they are created in rds.add_texts, but sequentially looping through
-        # each chunk and making a separate triton request which is slow
-        embedder = TritonHFEmbeddings(triton_host=TRITON_HOST)
-        embeddings = []
-        # 16 is max batch size triton accepts based on our config
-        for i in range(0, len(text_inputs), 16):
-            embeddings.extend(embedder.embed_documents(text_inputs[i : i + 16]))
+        # embed the chunks in batches, keeping several batches in flight,
+        # and write each batch to redis as soon as its vectors arrive
+        semaphore = asyncio.Semaphore(INSERT_CONCURRENCY)
 
-        # first param is texts to embed into a vector
-        # second param is metadata to be saved alongside the vector
-        # third param is embeddings
-        rds.add_texts(texts=text_inputs, metadatas=chunk_inputs, embeddings=embeddings)
+        # 16 is max batch size triton accepts based on our config
+        await asyncio.gather(
+            *[
+                _embed_and_write(
+                    rds, text_inputs[i : i + 16], chunk_inputs[i : i + 16], semaphore
+                )
+                for i in range(0, len(text_inputs), 16)
+            ]
+        )
+        await _invalidate_search_cache([asset_type])
 
     return text_inputs
 
 
+async def _embed_and_write(
+    rds: VectorBackend,
+    texts: List[str],
+    metadatas: List[Dict[str, Any]],
+    semaphore: asyncio.Semaphore,
+    keys: Optional[List[str]] = None,
+) -> List[str]:
+    """Embeds one batch of texts and writes it to redis with a pipeline
+
+    Args:
+        rds (VectorBackend): vectorstore of the asset_type
+        texts (List[str]): texts formatted for the embedder
+        metadatas (List[Dict[str, Any]]): metadata to be saved alongside each vector
+        semaphore (asyncio.Semaphore): bounds the number of Triton batches in flight
+        keys (Optional[List[str]]): redis keys to write to. Random keys if None.
+
+    Returns:
+        List[str]: redis keys of the new items
+    """
+    async with semaphore:
+        embeddings = await embedder.aembed_documents_array(texts)
+
+    return await _run_blocking(
+        rds.add_embedded_texts, texts, metadatas, embeddings, keys
+    )
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body generator reads the request body.
+
+    StreamingResponse watches for a disconnect by reading request messages while it
+    streams, which takes the body chunks away from the generator. The generator
+    reading the body already stops on a disconnect, so only stream.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post(
+    "/data/insert/stream", tags=["data"], openapi_extra=insert_stream_openapi_extra
+)
+async def insert_data_stream_endpoint(
+    request: Request, asset_type: str
+) -> StreamingResponse:
+    """Insert chunks sent as newline-delimited JSON, one chunk per line
+
+    Chunks are embedded and written in batches as they arrive, so memory use does not
+    grow with the number of chunks. The response streams back one JSON line per chunk,
+    either {"line": n, "id": key} or {"line": n, "error": message}.
+
+    Args:
+        request (Request): request whose body is NDJSON chunks
+        asset_type (str): asset_type to insert into
+
+    Returns:
+        StreamingResponse: NDJSON with one result per chunk
+    """
+    rds: VectorBackend = await _run_blocking(_get_vectorstore, asset_type, 0)
+
+    return _DuplexStreamingResponse(
+        _insert_stream(request, asset_type, rds), media_type="application/x-ndjson"
+    )
+
+
+async def _iter_ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def _ndjson_record(record: Dict[str, Any]) -> str:
+    return json.dumps(record) + "\n"
+
+
+async def _insert_stream(
+    request: Request, asset_type: str, rds: VectorBackend
+) -> AsyncIterator[str]:
+    semaphore = asyncio.Semaphore(INSERT_CONCURRENCY)
+    # (line numbers, task) of the batches sent off to be embedded and written
+    pending = collections.deque()
+
+    batch_lines = []
+    batch_texts = []
+    batch_metadatas = []
+
+    async def _batch_records(line_numbers: List[int], task: asyncio.Task):
+        try:
+            keys = await task
+        except Exception as e:
+            return [{"line": n, "error": str(e)} for n in line_numbers]
+        return [{"line": n, "id": key} for n, key in zip(line_numbers, keys)]
+
+    line_number = 0
+    async for line in _iter_ndjson_lines(request):
+        line_number += 1
+        if not line.strip():
+            continue
+
+        try:
+            chunk = json.loads(line)
+            if not isinstance(chunk, dict):
+                raise ValueError("chunk must be a JSON object")
+            if chunk.pop("asset_type", asset_type) != asset_type:
+                raise ValueError("chunk asset_type does not match asset_type parameter")
+            if not chunk.get("text"):
+                raise ValueError("chunk is missing text")
+            new_text, chunk = _prepare_chunk(chunk, rds.storage_type)
+        except (ValueError, TypeError, AttributeError) as e:
+            # a malformed line only fails itself, not the rest of the stream
+            yield _ndjson_record({"line": line_number, "error": str(e)})
+            continue
+
+        batch_lines.append(line_number)
+        batch_texts.append(new_text)
+        batch_metadatas.append(chunk)
+
+        # 16 is max batch size triton accepts based on our config
+        if len(batch_texts) == 16:
+            task = asyncio.create_task(
+                _embed_and_write(rds, batch_texts, batch_metadatas, semaphore)
+            )
+            pending.append((batch_lines, task))
+            batch_lines, batch_texts, batch_metadatas = [], [], []
+
+        # report finished batches, and wait on the oldest one when too many are held in memory
+        while pending and (pending[0][1].done() or len(pending) > INSERT_CONCURRENCY):
+            for record in await _batch_records(*pending.popleft()):
+                yield _ndjson_record(record)
+
+    if batch_texts:
+        task = asyncio.create_task(
+            _embed_and_write(rds, batch_texts, batch_metadatas, semaphore)
+        )
+        pending.append((batch_lines, task))
+
+    while pending:
+        for record in await _batch_records(*pending.popleft()):
+            yield _ndjson_record(record)
+
+    await _invalidate_search_cache([asset_type])
+
+    print(f"Streamed insert of {line_number} lines into asset_type {asset_type}")
+
+
+def _chunk_key(rds: VectorBackend, document_url: str, text: str) -> str:
+    """Deterministic redis key for a chunk of a document, from a hash of its
+    embedding text. The document_url is hashed in too, so identical boilerplate
+    chunks of different documents do not collide.
+    """
+    digest = hashlib.sha256(f"{document_url}\n{text}".encode("utf-8")).hexdigest()
+    return f"{rds.key_prefix}:{digest[:32]}"
+
+
+@app.post("/data/upsert", tags=["data"])
+async def upsert_data_endpoint(
+    params: UpsertDataRequest = Body(openapi_examples=upsert_data_examples),
+) -> Dict[str, Any]:
+    """Replace all chunks of one document, re-embedding only new or changed chunks
+
+    Each chunk gets a deterministic id from a hash of its embedding text. Chunks whose
+    id already exists only get their metadata refreshed, new ids are embedded and written,
+    and chunks of the document that are no longer present are deleted.
+
+    Args:
+        params (UpsertDataRequest, optional): _description_. Defaults to Body(openapi_examples=upsert_data_examples).
+
+    Returns:
+        Dict[str, Any]: ids of the document's chunks and counts of what changed.
+    """
+    document_url: str = params.document_url
+    asset_type: str = params.asset_type
+
+    rds: VectorBackend = await _run_blocking(_get_vectorstore, asset_type, 0)
+
+    existing_keys = set(await _run_blocking(rds.find_document_keys, document_url))
+
+    keys = []
+    new_keys, new_texts, new_metadatas = [], [], []
+    unchanged_keys, unchanged_metadatas = [], []
+    for chunk in params.chunks:
+        if not chunk.get("text"):
+            print("Warning: chunk is missing text")
+            continue
+
+        chunk["document_url"] = document_url
+        new_text, chunk = _prepare_chunk(chunk, rds.storage_type)
+        key = _chunk_key(rds, document_url, new_text)
+        if key in keys:
+            # duplicate chunk within the document
+            continue
+        keys.append(key)
+
+        if key in existing_keys:
+            unchanged_keys.append(key)
+            unchanged_metadatas.append(chunk)
+        else:
+            new_keys.append(key)
+            new_texts.append(new_text)
+            new_metadatas.append(chunk)
+
+    stale_keys = list(existing_keys - set(keys))
+
+    semaphore = asyncio.Semaphore(INSERT_CONCURRENCY)
+    # 16 is max batch size triton accepts based on our config
+    await asyncio.gather(
+        *[
+            _embed_and_write(
+                rds,
+                new_texts[i : i + 16],
+                new_metadatas[i : i + 16],
+                semaphore,
+                keys=new_keys[i : i + 16],
+            )
+            for i in range(0, len(new_texts), 16)
+        ]
+    )
+
+    # refresh metadata of unchanged chunks and delete stale chunks in one pipeline
+    await _run_blocking(
+        rds.update_metadata_and_delete, unchanged_keys, unchanged_metadatas, stale_keys
+    )
+    await _invalidate_search_cache([asset_type])
+
+    print(
+        f"Upserted document {document_url} into asset_type {asset_type}: "
+        f"{len(new_keys)} embedded, {len(unchanged_keys)} unchanged, {len(stale_keys)} deleted"
+    )
+
+    return {
+        "ids": keys,
+        "items_embedded": len(new_keys),
+        "items_unchanged": len(unchanged_keys),
+        "items_deleted": len(stale_keys),
+    }
+
+
 @app.post("/data/delete", tags=["data"])
 async def delete_data_endpoint(
     params: DeleteDataRequest = Body(openapi_examples=delete_data_examples),
@@ -532,24 +1396,13 @@ async def delete_data_endpoint(
     ids: List[str] = params.ids
     asset_type: str = params.asset_type
 
-    # index = SearchIndex.from_existing(name=asset_type, redis_url=REDIS_URL)
-    schema_dict = {
-        "index": {
-            "name": asset_type,
-            "prefix": f"doc:{asset_type}",
-            "storage_type": "hash",
-            "key_separator": ":",
-        },
-        "fields": schema.index_schema,
-    }
-    index = SearchIndex.from_dict(
-        schema_dict=schema_dict, 
-        redis_url=REDIS_URL
-    )
+    rds: VectorBackend = await _run_blocking(_get_vectorstore, asset_type, 0)
 
     print(f"Deleting items with ids: {ids}")
 
-    items_deleted: int = index.client.delete(*ids)
+    # also drops the document records that no chunk references anymore
+    items_deleted: int = await _run_blocking(rds.delete_chunks, ids)
+    await _invalidate_search_cache([asset_type])
 
     print(f"Number of items deleted: {items_deleted}")
 
@@ -558,16 +1411,224 @@ async def delete_data_endpoint(
 
 @app.post("/data/dump", tags=["data"])
 async def dump_data_endpoint() -> JSONResponse:
-    r = asset_types_index.client
-    success = r.bgsave()
+    success = redis_client.bgsave()
     if success:
         return JSONResponse(status_code=200, content={"success": True})
     return JSONResponse(status_code=500, content={"success": False})
 
 
+# state of the latest reindex of each asset_type
+reindex_jobs: Dict[str, Dict[str, Any]] = {}
+
+# reindexes copy for minutes, keep them off the search thread pool
+reindex_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reindex")
+# running reindex tasks, the event loop only keeps weak references to them
+reindex_tasks = set()
+
+
+def _reindex(job: Dict[str, Any], live: RedisVectorstore, shadow: RedisVectorstore) -> None:
+    """Copies the chunks of the live version into the shadow version"""
+    asset_type = job["asset_type"]
+    max_chunks_per_second = job["max_chunks_per_second"]
+
+    job["documents_copied"] = reindex.copy_documents(
+        redis_client, live.index_name, shadow.index_name, REINDEX_BATCH_SIZE
+    )
+    job["chunks_copied"] = reindex.copy_chunks(
+        redis_client,
+        live.key_prefix,
+        shadow.key_prefix,
+        live.storage_type,
+        ASSET_TYPES[asset_type].get("vector_index"),
+        batch_size=REINDEX_BATCH_SIZE,
+        max_chunks_per_second=max_chunks_per_second,
+        progress=job,
+        # fill the fields of schema.field_migrations from the stored fields
+        migrate=lambda chunks: migrations.migrate_chunks(
+            redis_client, live.index_name, chunks
+        ),
+        # without the file the quantized vectors are copied as the full precision ones
+        source_vectors=live.full_vectors if live.full_vectors.is_complete() else None,
+        target_vectors=shadow.full_vectors if shadow.rescore_factor > 0 else None,
+    )
+    # chunks deleted from the live version after the copy read them
+    job["chunks_removed"] = reindex.remove_deleted_chunks(
+        redis_client, live.key_prefix, shadow.key_prefix, REINDEX_BATCH_SIZE
+    )
+
+
+async def _set_index_versions(
+    asset_type: str, rds: VectorBackend, current: int, building: Optional[int] = None
+) -> None:
+    # record the versions locally first, so our own check does not reopen them
+    vectorstores[asset_type] = rds
+    vectorstore_versions[asset_type] = (current, building)
+    await _run_blocking(
+        indexes.write_version_state,
+        redis_client,
+        asset_type,
+        current,
+        building,
+        REINDEX_LEASE_SECONDS,
+    )
+
+
+async def _renew_build_lease(asset_type: str) -> None:
+    while True:
+        await asyncio.sleep(REINDEX_LEASE_SECONDS / 3)
+        try:
+            await _run_blocking(
+                indexes.renew_build_lease, redis_client, asset_type, REINDEX_LEASE_SECONDS
+            )
+        except redis.RedisError as e:
+            print(f"Could not renew the reindex lease of asset_type {asset_type}: {e}")
+
+
+def _drop_expired_build(asset_type: str) -> None:
+    """Drops the version a dead router was building, and stops reporting it"""
+    build = indexes.expired_build(redis_client, asset_type)
+    if build is None:
+        return
+    current, building = build
+    index_name = indexes.versioned_index_name(asset_type, building)
+    print(f"Dropping index {index_name} of asset_type {asset_type}, its reindex lease expired")
+    indexes.write_version_state(redis_client, asset_type, current)
+    reindex.drop_version(
+        redis_client,
+        asset_type,
+        index_name,
+        REINDEX_BATCH_SIZE,
+        REINDEX_MAX_CHUNKS_PER_SECOND,
+        FullVectorFile(redis_client, RESCORE_VECTORS_DIR, index_name, EMBEDDING_DIMS),
+    )
+
+
+async def _run_reindex(job: Dict[str, Any], live: RedisVectorstore, shadow: RedisVectorstore):
+    asset_type = job["asset_type"]
+    live_version = indexes.index_version(asset_type, live.index_name)
+    loop = asyncio.get_running_loop()
+    lease = asyncio.create_task(_renew_build_lease(asset_type))
+    try:
+        await loop.run_in_executor(reindex_executor, _reindex, job, live, shadow)
+        lease.cancel()
+
+        job["state"] = "switching"
+        # every router uses the new version from now on, by its own name until the
+        # alias points at it, since switching from version 0 drops that index first
+        await _set_index_versions(
+            asset_type, shadow, indexes.index_version(asset_type, shadow.index_name)
+        )
+        await _run_blocking(
+            reindex.switch_alias, redis_client, asset_type, live.index_name, shadow.index_name
+        )
+        shadow.search_index_name = asset_type
+        await _invalidate_search_cache([asset_type])
+        print(f"Switched asset_type {asset_type} to index {shadow.index_name}")
+
+        if not job["keep_previous"]:
+            job["state"] = "dropping_previous"
+            # routers still on the previous version move off it at their next check
+            await asyncio.sleep(REINDEX_DROP_DELAY_SECONDS)
+            await loop.run_in_executor(
+                reindex_executor,
+                reindex.drop_version,
+                redis_client,
+                asset_type,
+                live.index_name,
+                REINDEX_BATCH_SIZE,
+                job["max_chunks_per_second"],
+                live.full_vectors,
+            )
+        job["state"] = "done"
+    except Exception as e:
+        lease.cancel()
+        print(f"Reindex of asset_type {asset_type} failed: {e}")
+        # writes went to both versions, searches keep using the live version
+        if vectorstores.get(asset_type) is not shadow:
+            await _set_index_versions(asset_type, live, live_version)
+        job["state"] = "failed"
+        job["error"] = str(e)
+    job["finished"] = time.time()
+
+
+@app.post("/data/reindex", tags=["data"])
+async def reindex_endpoint(
+    params: ReindexRequest = Body(openapi_examples=reindex_examples),
+) -> Dict[str, Any]:
+    """Rebuilds the index of an asset_type in the background, then switches to it
+
+    Args:
+        params (ReindexRequest, optional): _description_. Defaults to Body(openapi_examples=reindex_examples).
+
+    Raises:
+        ValueError: if the asset_type is invalid or not stored in redis
+        HTTPException: 409 if the asset_type is already being reindexed
+
+    Returns:
+        Dict[str, Any]: state of the reindex, also returned by GET /data/reindex
+    """
+    asset_type = params.asset_type
+    job = reindex_jobs.get(asset_type)
+    if job is not None and job["state"] not in ["done", "failed"]:
+        raise HTTPException(
+            status_code=409, detail=f"asset_type {asset_type} is already being reindexed"
+        )
+
+    live = await _run_blocking(_get_vectorstore, asset_type, 0)
+    if isinstance(live, reindex.DualWriteBackend):
+        raise HTTPException(
+            status_code=409, detail=f"asset_type {asset_type} is being reindexed by another router"
+        )
+    if not isinstance(live, RedisVectorstore):
+        raise ValueError(f"asset_type {asset_type} is not stored in redis, it cannot be reindexed")
+    # the router that was building the next version died
+    await asyncio.get_running_loop().run_in_executor(
+        reindex_executor, _drop_expired_build, asset_type
+    )
+
+    # the version after the current one, also after any leftover of a failed reindex
+    version = indexes.index_version(asset_type, live.index_name) + 1
+    while await _run_blocking(
+        indexes.index_exists, redis_client, indexes.versioned_index_name(asset_type, version)
+    ):
+        version += 1
+    shadow = await _run_blocking(_open_redis_vectorstore, asset_type, version)
+
+    job = {
+        "asset_type": asset_type,
+        "state": "copying",
+        "source_index": live.index_name,
+        "target_index": shadow.index_name,
+        "max_chunks_per_second": params.max_chunks_per_second or REINDEX_MAX_CHUNKS_PER_SECOND,
+        "keep_previous": params.keep_previous,
+        "chunks_copied": 0,
+        "started": time.time(),
+    }
+    reindex_jobs[asset_type] = job
+
+    # writes made during the copy go to both versions, on every router
+    await _set_index_versions(
+        asset_type,
+        reindex.DualWriteBackend(live, shadow),
+        indexes.index_version(asset_type, live.index_name),
+        version,
+    )
+    task = asyncio.create_task(_run_reindex(job, live, shadow))
+    reindex_tasks.add(task)
+    task.add_done_callback(reindex_tasks.discard)
+
+    print(f"Reindexing asset_type {asset_type} from {live.index_name} into {shadow.index_name}")
+    return job
+
+
+@app.get("/data/reindex", tags=["data"])
+async def reindex_status_endpoint() -> List[Dict[str, Any]]:
+    return list(reindex_jobs.values())
+
+
 @app.get("/asset-types", tags=["asset-types"])
 async def asset_types_endpoint() -> List[Dict[str, Any]]:
-    results = asset_types_index.search("*")
+    results = _get_asset_types_index().search("*")
 
     dicts = _redis_results_as_dicts(results)
     for d in dicts:
@@ -612,7 +1673,9 @@ async def update_asset_types_endpoint(
     if "display_default" in updated_data:
         updated_data["display_default"] = int(updated_data["display_default"])
 
-    asset_types_index.load([updated_data], key_field="name")
+    _get_asset_types_index().load([updated_data], key_field="name")
+    if updated_data.get("name") in ASSET_TYPES:
+        await _invalidate_search_cache([updated_data["name"]])
     return updated_data
 
 
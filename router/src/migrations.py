@@ -0,0 +1,287 @@
+"""Schema migration of an asset type's chunks, reusing their stored vectors.
+
+Fills the fields declared in schema.field_migrations from the fields already stored
+on each chunk or its document record, converted to the type the index expects, then
+optionally rebuilds the index over the same keys with the current schema.index_schema.
+Vectors are never read or rewritten, so nothing is re-embedded.
+
+In place, searches see partial results while redis indexes the keys again. To migrate
+into a copy and switch over without downtime, use POST /data/reindex of the router,
+which applies the same field migrations.
+
+Usage:
+    python migrations.py --asset-type techblogs --rebuild-index
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from assettypes import ASSET_TYPES
+from embeddings import EMBEDDING_DIMS
+from search_cache import SearchResponseCache
+from vectorstore import document_record_key
+from reindex import Throttle, scan_batches
+import argparse
+import json
+import os
+import time
+import redis
+import indexes
+import schema
+
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
+REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
+REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
+
+
+def _parse(value: Any) -> Any:
+    # hash fields are strings, with lists and bools serialized as JSON
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _to_tag(value: Any) -> str:
+    value = _parse(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _any_true(value: Any) -> str:
+    value = _parse(value)
+    if isinstance(value, list):
+        return "true" if any(value) else "false"
+    return "true" if value else "false"
+
+
+CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "epoch": lambda value: indexes.iso_to_epoch(str(value)),
+    "number": lambda value: float(_parse(value)),
+    "tag": _to_tag,
+    "any_true": _any_true,
+    "string": str,
+}
+
+
+def migration_fields(migrations: Dict[str, Dict[str, str]]) -> List[str]:
+    """Chunk fields a migration reads, including the fields it writes to skip unchanged ones"""
+    return sorted(
+        {"document_url"} | set(migrations) | {m["source"] for m in migrations.values()}
+    )
+
+
+def migrate_chunks(
+    client: redis.Redis,
+    index_name: str,
+    chunks: List[Tuple[str, Dict[str, Any]]],
+    migrations: Optional[Dict[str, Dict[str, str]]] = None,
+) -> List[Dict[str, Any]]:
+    """Computes the migrated fields of chunks, and sets them on the chunks
+
+    Args:
+        client (redis.Redis): redis client
+        index_name (str): index whose document records the chunks reference
+        chunks (List[Tuple[str, Dict[str, Any]]]): key and stored fields of each chunk
+        migrations (Optional[Dict[str, Dict[str, str]]]): defaults to schema.field_migrations
+
+    Returns:
+        List[Dict[str, Any]]: fields to write for each chunk, empty if none changed
+    """
+    if migrations is None:
+        migrations = schema.field_migrations
+
+    # document fields moved to the document records, older chunks still have them
+    document_sources = sorted(
+        {m["source"] for m in migrations.values() if m["source"] in schema.document_fields}
+    )
+    document_urls = sorted(
+        {
+            chunk["document_url"]
+            for _, chunk in chunks
+            if chunk.get("document_url")
+            and any(chunk.get(field) is None for field in document_sources)
+        }
+    )
+    documents = {}
+    if document_urls:
+        pipeline = client.pipeline(transaction=False)
+        for document_url in document_urls:
+            pipeline.hmget(document_record_key(index_name, document_url), document_sources)
+        for document_url, values in zip(document_urls, pipeline.execute()):
+            documents[document_url] = {
+                field: value.decode("utf-8")
+                for field, value in zip(document_sources, values)
+                if value is not None
+            }
+
+    updates = []
+    for key, chunk in chunks:
+        document = documents.get(chunk.get("document_url"), {})
+        update = {}
+        for field, migration in migrations.items():
+            value = chunk.get(migration["source"])
+            if value is None:
+                value = document.get(migration["source"])
+            if value is None:
+                continue
+            try:
+                converted = CONVERTERS[migration["convert"]](value)
+            except ValueError:
+                print(f"Warning: chunk {key} has invalid {migration['source']} {value}")
+                continue
+            # hashes store numbers as strings
+            if chunk.get(field) is None or str(chunk[field]) != str(converted):
+                update[field] = converted
+        chunk.update(update)
+        updates.append(update)
+    return updates
+
+
+def _read_source_fields(
+    client: redis.Redis, keys: List[str], storage_type: str, fields: List[str]
+) -> List[Tuple[str, Dict[str, Any]]]:
+    pipeline = client.pipeline(transaction=False)
+    for key in keys:
+        if storage_type == "json":
+            pipeline.execute_command("JSON.GET", key, *[f"$.{field}" for field in fields])
+        else:
+            pipeline.hmget(key, fields)
+
+    chunks = []
+    for key, values in zip(keys, pipeline.execute()):
+        if storage_type == "json":
+            if values is None:
+                continue
+            values = json.loads(values)
+            # one path returns the bare list of matches, several return a dict by path
+            if len(fields) == 1:
+                values = {f"$.{fields[0]}": values}
+            chunk = {
+                field: next(iter(values.get(f"$.{field}", [])), None) for field in fields
+            }
+        else:
+            chunk = {
+                field: value.decode("utf-8")
+                for field, value in zip(fields, values)
+                if value is not None
+            }
+        chunks.append((key, chunk))
+    return chunks
+
+
+def migrate_in_place(
+    client: redis.Redis,
+    asset_type: str,
+    batch_size: int = 200,
+    max_chunks_per_second: Optional[float] = None,
+) -> Dict[str, int]:
+    """Rewrites the migrated fields of every chunk of an asset type in place
+
+    Args:
+        client (redis.Redis): redis client
+        asset_type (str): asset type to migrate, resolved through its alias
+        batch_size (int): number of chunks read and written per pipelined round trip
+        max_chunks_per_second (Optional[float]): rate limit, None for no limit
+
+    Returns:
+        Dict[str, int]: number of chunks read and updated
+    """
+    index_name = indexes.resolve_index(client, asset_type)
+    version = indexes.index_version(asset_type, index_name)
+    storage_type = indexes.index_storage_type(client, index_name)
+    fields = migration_fields(schema.field_migrations)
+
+    throttle = Throttle(max_chunks_per_second)
+    counts = {"chunks_read": 0, "chunks_updated": 0}
+    for keys in scan_batches(client, f"{indexes.key_prefix(asset_type, version)}:*", batch_size):
+        chunks = _read_source_fields(client, keys, storage_type, fields)
+        updates = migrate_chunks(client, index_name, chunks)
+
+        pipeline = client.pipeline(transaction=False)
+        for (key, _), update in zip(chunks, updates):
+            if not update:
+                continue
+            if storage_type == "json":
+                for field, value in update.items():
+                    pipeline.execute_command("JSON.SET", key, f"$.{field}", json.dumps(value))
+            else:
+                pipeline.hset(key, mapping=update)
+            counts["chunks_updated"] += 1
+        pipeline.execute()
+
+        counts["chunks_read"] += len(chunks)
+        throttle.wait(len(keys))
+    return counts
+
+
+def rebuild_index(client: redis.Redis, asset_type: str) -> str:
+    """Recreates the current index of an asset type over the same keys with the current schema
+
+    Returns:
+        str: name of the rebuilt index
+    """
+    index_name = indexes.resolve_index(client, asset_type)
+    version = indexes.index_version(asset_type, index_name)
+    storage_type = indexes.index_storage_type(client, index_name)
+
+    # dropping the index also drops its alias
+    client.ft(index_name).dropindex(delete_documents=False)
+    indexes.create_index(
+        client,
+        index_name,
+        indexes.index_prefix(asset_type, version),
+        storage_type,
+        ASSET_TYPES.get(asset_type, {}).get("vector_index"),
+        EMBEDDING_DIMS,
+    )
+    if index_name != asset_type:
+        client.ft(index_name).aliasadd(asset_type)
+    return index_name
+
+
+def wait_until_indexed(client: redis.Redis, index_name: str, poll_seconds: float = 2.0) -> None:
+    while True:
+        index_info = client.ft(index_name).info()
+        percent_indexed = float(index_info.get("percent_indexed", 1))
+        print(f"Index {index_name} is {percent_indexed * 100:.1f}% indexed")
+        if percent_indexed >= 1:
+            return
+        time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--asset-type", required=True)
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="recreate the index with the current schema.index_schema after the fields are migrated",
+    )
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--max-chunks-per-second", type=float, default=None)
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(REDIS_URL)
+
+    start = time.perf_counter()
+    counts = migrate_in_place(
+        client, args.asset_type, args.batch_size, args.max_chunks_per_second
+    )
+    print(
+        f"Migrated fields of {counts['chunks_updated']} of {counts['chunks_read']} chunks "
+        f"of asset_type {args.asset_type} in {time.perf_counter() - start:.1f}s"
+    )
+
+    if args.rebuild_index:
+        index_name = rebuild_index(client, args.asset_type)
+        wait_until_indexed(client, index_name)
+        print(f"Rebuilt index {index_name} in {time.perf_counter() - start:.1f}s")
+
+    # cached search responses of the asset type are stale now
+    SearchResponseCache(client).invalidate([args.asset_type])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,552 @@
+from typing import Any, Dict, List, Optional
+from backend import VectorBackend, REDIS_STOP_WORDS
+from vectorstore import split_document_fields, exact_distances
+import fnmatch
+import json
+import math
+import os
+import re
+import threading
+import uuid
+import numpy as np
+import schema
+
+
+# BM25 parameters, the redis defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _tokenize(text: Any) -> List[str]:
+    if isinstance(text, list):
+        text = " ".join(str(x) for x in text)
+    return re.findall(r"\w+", str(text).lower())
+
+
+def _levenshtein(a: str, b: str, max_distance: int) -> int:
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            )
+        previous = current
+    return previous[-1]
+
+
+class NumpyVectorBackend(VectorBackend):
+    """Embedded backend that needs no external service.
+
+    Vectors live in a memory-mapped float32 matrix on disk, one row per item, and KNN
+    is a brute force matrix product. With ivf_lists > 0 the rows are also clustered
+    with k-means once enough items are stored, and a query only scans the rows of its
+    nprobe closest clusters. k-means runs on a background thread, searches stay exact
+    until it is done. Metadata and document records are kept in memory and persisted
+    in an append-only log that is replayed on startup. The log is rewritten with only
+    the live records once most of it is overwritten or deleted records.
+    """
+
+    # metadata is kept as JSON values, lists do not need to be serialized
+    storage_type = "json"
+
+    # the log is compacted once it has this many records, more than half of them stale
+    compact_min_records = 10000
+    compact_garbage_ratio = 0.5
+
+    def __init__(
+        self,
+        path: str,
+        index_name: str,
+        dims: int,
+        distance_metric: str = "COSINE",
+        ivf_lists: int = 0,
+        nprobe: int = 8,
+        initial_capacity: int = 1024,
+    ) -> None:
+        os.makedirs(path, exist_ok=True)
+
+        self.index_name = index_name
+        self.key_prefix = f"doc:{index_name}"
+        self.dims = dims
+        self.distance_metric = distance_metric.upper()
+        self.ivf_lists = ivf_lists
+        self.nprobe = nprobe
+
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._log_path = os.path.join(path, "items.jsonl")
+        self._lock = threading.RLock()
+
+        # row -> key, None for free rows
+        self._keys: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        # key -> metadata, with the text under "content"
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        # document_url -> document record
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        # key -> field -> tokens, filled on first keyword search of a field
+        self._tokens: Dict[str, Dict[str, List[str]]] = {}
+
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        # rows holding an item, rebuilt after writes
+        self._live_rows: Optional[np.ndarray] = None
+
+        # IVF centroids, and the cluster of each row (-1 when not assigned)
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.full(0, -1, dtype=np.int32)
+        self._ivf_thread: Optional[threading.Thread] = None
+
+        # number of records in the log, live or not
+        self._log_records = 0
+
+        self._load(initial_capacity)
+
+    def _open_vectors(self, capacity: int) -> None:
+        size = capacity * self.dims * 4
+        if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < size:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(size)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dims)
+        )
+        self._capacity = capacity
+
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        assignments[: len(self._assignments)] = self._assignments
+        self._assignments = assignments
+
+    def _load(self, initial_capacity: int) -> None:
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        self._apply(json.loads(line))
+                        self._log_records += 1
+        # rows below the last used one that hold no item, e.g. after a compaction
+        self._free_rows = [row for row, key in enumerate(self._keys) if key is None]
+
+        capacity = max(initial_capacity, len(self._keys))
+        if os.path.exists(self._vectors_path):
+            capacity = max(capacity, os.path.getsize(self._vectors_path) // (self.dims * 4))
+        self._open_vectors(capacity)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op = record["op"]
+        if op == "put":
+            key, row = record["key"], record["row"]
+            while len(self._keys) <= row:
+                self._keys.append(None)
+            if row in self._free_rows:
+                self._free_rows.remove(row)
+            self._keys[row] = key
+            self._rows[key] = row
+            self._metadata[key] = record["metadata"]
+            self._tokens.pop(key, None)
+            self._live_rows = None
+        elif op == "update":
+            self._metadata[record["key"]].update(record["metadata"])
+            self._tokens.pop(record["key"], None)
+        elif op == "delete":
+            row = self._rows.pop(record["key"])
+            self._keys[row] = None
+            self._free_rows.append(row)
+            self._metadata.pop(record["key"], None)
+            self._tokens.pop(record["key"], None)
+            self._live_rows = None
+            if row < len(self._assignments):
+                self._assignments[row] = -1
+        elif op == "document":
+            self._documents[record["document_url"]] = record["document"]
+        elif op == "delete_document":
+            self._documents.pop(record["document_url"], None)
+
+    def _commit(self, records: List[Dict[str, Any]]) -> None:
+        # vectors are flushed before the log points at them
+        self._vectors.flush()
+        with open(self._log_path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for record in records:
+            self._apply(record)
+        self._log_records += len(records)
+
+        live_records = len(self._rows) + len(self._documents)
+        if (
+            self._log_records >= self.compact_min_records
+            and self._log_records - live_records > self.compact_garbage_ratio * self._log_records
+        ):
+            self._compact()
+
+    def _compact(self) -> None:
+        # rewrite the log with one record per live item and document, then swap it in
+        compact_path = f"{self._log_path}.compact"
+        with open(compact_path, "w") as f:
+            for document_url, document in self._documents.items():
+                record = {"op": "document", "document_url": document_url, "document": document}
+                f.write(json.dumps(record) + "\n")
+            for key, row in self._rows.items():
+                record = {"op": "put", "key": key, "row": row, "metadata": self._metadata[key]}
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(compact_path, self._log_path)
+        print(
+            f"Compacted log of {self.index_name} from {self._log_records} to "
+            f"{len(self._rows) + len(self._documents)} records"
+        )
+        self._log_records = len(self._rows) + len(self._documents)
+
+    def _allocate_row(self, allocated: List[int]) -> int:
+        # reuse the rows of deleted items first
+        for row in self._free_rows:
+            if row not in allocated:
+                return row
+        row = max([len(self._keys) - 1] + allocated) + 1
+        if row >= self._capacity:
+            self._open_vectors(max(self._capacity * 2, row + 1))
+        return row
+
+    def _document_records(self, metadatas: List[Dict[str, Any]]):
+        chunk_metadatas, records = [], []
+        for metadata in metadatas:
+            chunk, document = split_document_fields(metadata)
+            chunk_metadatas.append(chunk)
+            if document is not None:
+                records.append(
+                    {"op": "document", "document_url": document["document_url"], "document": document}
+                )
+        return chunk_metadatas, records
+
+    def add_embedded_texts(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        keys: Optional[List[str]] = None,
+    ) -> List[str]:
+        if keys is None:
+            keys = [f"{self.key_prefix}:{uuid.uuid4().hex}" for _ in texts]
+
+        with self._lock:
+            metadatas, records = self._document_records(metadatas)
+            allocated = []
+            for key, text, metadata, embedding in zip(keys, texts, metadatas, embeddings):
+                if key in self._rows:
+                    row = self._rows[key]
+                else:
+                    row = self._allocate_row(allocated)
+                    allocated.append(row)
+                self._vectors[row] = np.asarray(embedding, dtype=np.float32)
+                if self._centroids is not None:
+                    self._assignments[row] = self._nearest_centroids(self._vectors[row], 1)[0]
+                records.append(
+                    {"op": "put", "key": key, "row": row, "metadata": {"content": text, **metadata}}
+                )
+            self._commit(records)
+        return keys
+
+    def update_metadata_and_delete(
+        self,
+        keys: List[str],
+        metadatas: List[Dict[str, Any]],
+        delete_keys: List[str],
+    ) -> None:
+        with self._lock:
+            metadatas, records = self._document_records(metadatas)
+            for key, metadata in zip(keys, metadatas):
+                if key in self._rows:
+                    records.append({"op": "update", "key": key, "metadata": metadata})
+            for key in delete_keys:
+                if key in self._rows:
+                    records.append({"op": "delete", "key": key})
+            self._commit(records)
+
+    def delete_chunks(self, keys: List[str]) -> int:
+        with self._lock:
+            existing = [key for key in dict.fromkeys(keys) if key in self._rows]
+            document_urls = set(
+                self._metadata[key].get("document_url") for key in existing
+            ) - {None}
+            records = [{"op": "delete", "key": key} for key in existing]
+            self._commit(records)
+
+            # drop the records of documents that have no chunks left
+            remaining = set(metadata.get("document_url") for metadata in self._metadata.values())
+            self._commit(
+                [
+                    {"op": "delete_document", "document_url": document_url}
+                    for document_url in document_urls - remaining
+                ]
+            )
+        return len(existing)
+
+    def find_document_keys(self, document_url: str) -> List[str]:
+        with self._lock:
+            return [
+                key
+                for key, metadata in self._metadata.items()
+                if metadata.get("document_url") == document_url
+            ]
+
+    def _matches(self, metadata: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+        for field, condition in (filters or {}).items():
+            value = metadata.get(field)
+            if field in schema.tag_fields:
+                if value is None or str(value) not in [str(x) for x in condition]:
+                    return False
+            else:
+                low, high = condition
+                if value is None:
+                    return False
+                if low is not None and float(value) < low:
+                    return False
+                if high is not None and float(value) > high:
+                    return False
+        return True
+
+    def _result(
+        self, key: str, return_fields: List[str], score: float
+    ) -> Dict[str, Any]:
+        metadata = self._metadata[key]
+        res = {"id": key}
+        for field in return_fields:
+            if field in schema.document_fields:
+                document = self._documents.get(metadata.get("document_url"), {})
+                value = document.get(field, metadata.get(field))
+            else:
+                value = metadata.get(field)
+            if value is not None:
+                res[field] = value
+        res["score"] = score
+        return res
+
+    def _relevance_score(self, distance: float) -> float:
+        # same scores as the langchain redis vectorstore
+        if self.distance_metric == "L2":
+            return 1.0 - distance / math.sqrt(2)
+        return 1.0 - distance
+
+    def _normalized(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _get_live_rows(self) -> np.ndarray:
+        if self._live_rows is None:
+            self._live_rows = np.array(
+                [row for row, key in enumerate(self._keys) if key is not None], dtype=np.int64
+            )
+        return self._live_rows
+
+    def build_ivf(self, iterations: int = 10, seed: int = 0) -> None:
+        """Clusters the stored vectors into ivf_lists clusters with spherical k-means.
+
+        Trains on a copy of the vectors, so searches and writes only wait for the copy
+        and for the final assignment of every row to its cluster.
+        """
+        with self._lock:
+            rows = self._get_live_rows()
+            if len(rows) < self.ivf_lists:
+                return
+            vectors = self._normalized(np.array(self._vectors[rows]))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(rows), size=self.ivf_lists, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for i in range(self.ivf_lists):
+                members = vectors[assignments == i]
+                if len(members) > 0:
+                    centroids[i] = members.mean(axis=0)
+            centroids = self._normalized(centroids)
+
+        with self._lock:
+            # items were written and deleted meanwhile, assign the rows as they are now
+            rows = self._get_live_rows()
+            self._assignments[:] = -1
+            if len(rows) > 0:
+                vectors = self._normalized(np.asarray(self._vectors[rows]))
+                self._assignments[rows] = np.argmax(vectors @ centroids.T, axis=1)
+            self._centroids = centroids
+        print(f"Built IVF index of {self.index_name} with {self.ivf_lists} lists over {len(rows)} vectors")
+
+    def _start_ivf_training(self) -> None:
+        # called with the lock held, at most one training runs at a time
+        if self._ivf_thread is None or not self._ivf_thread.is_alive():
+            self._ivf_thread = threading.Thread(
+                target=self.build_ivf, name=f"ivf-{self.index_name}", daemon=True
+            )
+            self._ivf_thread.start()
+
+    def _nearest_centroids(self, vector: np.ndarray, n: int) -> np.ndarray:
+        similarities = self._centroids @ (vector / max(np.linalg.norm(vector), 1e-12))
+        return np.argsort(-similarities)[:n]
+
+    def knn_search(
+        self,
+        embedding: np.ndarray,
+        k: int,
+        return_fields: List[str],
+        ef_runtime: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Brute force, or IVF, KNN search. ef_runtime overrides nprobe for IVF."""
+        with self._lock:
+            # train the IVF index once there are about 40 vectors per list, the
+            # searches stay exact until it is trained
+            live_rows = len(self._rows)
+            if self.ivf_lists > 0 and self._centroids is None and live_rows >= 39 * self.ivf_lists:
+                self._start_ivf_training()
+
+            rows = self._get_live_rows()
+            if filters:
+                rows = np.array(
+                    [row for row in rows if self._matches(self._metadata[self._keys[row]], filters)],
+                    dtype=np.int64,
+                )
+            if self._centroids is not None and len(rows) > 0:
+                lists = self._nearest_centroids(
+                    np.asarray(embedding, dtype=np.float32), ef_runtime or self.nprobe
+                )
+                rows = rows[np.isin(self._assignments[rows], lists)]
+            if len(rows) == 0:
+                return []
+
+            distances = exact_distances(
+                embedding, np.asarray(self._vectors[rows]), self.distance_metric
+            )
+            order = np.argsort(distances, kind="stable")[:k]
+            return [
+                self._result(
+                    self._keys[rows[i]], return_fields, self._relevance_score(float(distances[i]))
+                )
+                for i in order
+            ]
+
+    def _field_tokens(self, key: str, field: str) -> List[str]:
+        tokens = self._tokens.setdefault(key, {})
+        if field not in tokens:
+            tokens[field] = _tokenize(self._metadata[key].get(field, ""))
+        return tokens[field]
+
+    def _keyword_matcher(self, search_type: str, field: str, value: str):
+        """Returns a function of an item's tokens giving the matched query terms, or None"""
+        terms = [x for x in _tokenize(value) if x not in REDIS_STOP_WORDS]
+
+        if search_type in ["union", "any"]:
+            def match(tokens):
+                matched = [term for term in terms if term in tokens]
+                if search_type == "union" and len(matched) < len(terms):
+                    return None
+                return matched or None
+        elif search_type == "exact":
+            phrase = _tokenize(value)
+            def match(tokens):
+                for i in range(len(tokens) - len(phrase) + 1):
+                    if tokens[i : i + len(phrase)] == phrase:
+                        return phrase
+                return None
+        elif search_type == "fuzzy":
+            def match(tokens):
+                matched = []
+                for term in terms:
+                    if not any(_levenshtein(term, token, 2) <= 2 for token in tokens):
+                        return None
+                    matched.append(term)
+                return matched or None
+        elif search_type == "wildcard":
+            if "*" not in value:
+                raise ValueError("wildcard search value must contain *")
+            patterns = [x.lower() for x in value.split() if x.lower() not in REDIS_STOP_WORDS]
+            def match(tokens):
+                matched = []
+                for pattern in patterns:
+                    found = [token for token in tokens if fnmatch.fnmatchcase(token, pattern)]
+                    if not found:
+                        return None
+                    matched.extend(found[:1])
+                return matched
+        else:
+            raise ValueError(f"search_type {search_type} is not valid")
+        return match
+
+    def keyword_search(
+        self,
+        search_type: str,
+        field: str,
+        value: str,
+        k: int,
+        return_fields: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Keyword search scored with BM25, with the same search types as redis."""
+        with self._lock:
+            keys = [
+                key
+                for key, metadata in self._metadata.items()
+                if not filters or self._matches(metadata, filters)
+            ]
+
+            if field in schema.tag_fields:
+                # tag fields only match whole values
+                separator = "|" if field == "document_url" else ","
+                matched = [
+                    key
+                    for key in keys
+                    if any(
+                        fnmatch.fnmatchcase(tag.strip(), value) if search_type == "wildcard" else tag.strip() == value
+                        for tag in str(self._metadata[key].get(field, "")).split(separator)
+                    )
+                ]
+                return [self._result(key, return_fields, 1.0) for key in matched[:k]]
+
+            match = self._keyword_matcher(search_type, field, value)
+            all_tokens = {key: self._field_tokens(key, field) for key in keys}
+            matches = {}
+            for key, tokens in all_tokens.items():
+                matched = match(tokens)
+                if matched:
+                    matches[key] = matched
+            if not matches:
+                return []
+
+            num_items = len(all_tokens)
+            mean_length = sum(len(tokens) for tokens in all_tokens.values()) / max(num_items, 1)
+            document_frequency: Dict[str, int] = {}
+            for matched in matches.values():
+                for term in set(matched):
+                    document_frequency[term] = document_frequency.get(term, 0) + 1
+
+            scores = {}
+            for key, matched in matches.items():
+                tokens = all_tokens[key]
+                score = 0.0
+                for term in set(matched):
+                    frequency = max(tokens.count(term), 1)
+                    idf = math.log(
+                        1 + (num_items - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5)
+                    )
+                    score += idf * frequency * (BM25_K1 + 1) / (
+                        frequency + BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / mean_length)
+                    )
+                scores[key] = score
+
+            ranked = sorted(scores, key=lambda key: scores[key], reverse=True)[:k]
+            return [self._result(key, return_fields, scores[key]) for key in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "numpy",
+                "num_items": len(self._rows),
+                "num_documents": len(self._documents),
+                "capacity": self._capacity,
+                "ivf_trained": self._centroids is not None,
+            }
@@ -0,0 +1,186 @@
+"""Recall vs memory report for quantized vector storage.
+
+Reads the float32 vectors of an existing chunk index and measures, in NumPy, how
+much top k recall each quantized layout keeps compared with exact float32 search,
+with and without full precision rescoring, and how many bytes of vectors it stores
+per chunk in redis and on disk.
+
+Usage:
+    python quantization_report.py --asset-type techblogs --k 10
+"""
+from typing import Dict, List, Tuple
+from vectorstore import exact_distances
+from embeddings import EMBEDDING_DIMS
+from indexes import resolve_index, index_version, key_prefix, index_storage_type
+import argparse
+import json
+import os
+import numpy as np
+import redis
+
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
+REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
+REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
+
+
+def load_vectors(
+    client: redis.Redis, asset_type: str, max_vectors: int
+) -> Tuple[List[bytes], np.ndarray]:
+    """Reads up to max_vectors float32 chunk vectors of an asset_type"""
+    is_json = index_storage_type(client, asset_type) == "json"
+    # the asset type is an alias of its current version after a reindex
+    version = index_version(asset_type, resolve_index(client, asset_type))
+
+    keys = []
+    for key in client.scan_iter(match=f"{key_prefix(asset_type, version)}:*", count=1000):
+        keys.append(key)
+        if len(keys) >= max_vectors:
+            break
+
+    pipeline = client.pipeline(transaction=False)
+    for key in keys:
+        if is_json:
+            pipeline.execute_command("JSON.GET", key, "$.content_vector")
+        else:
+            pipeline.hget(key, "content_vector")
+
+    found_keys, vectors = [], []
+    for key, value in zip(keys, pipeline.execute()):
+        if value is None:
+            continue
+        if is_json:
+            vector = np.asarray(json.loads(value)[0], dtype=np.float32)
+        else:
+            vector = np.frombuffer(value, dtype=np.float32)
+        if vector.shape[0] != EMBEDDING_DIMS:
+            # not a float32 vector, e.g. an index that is already quantized
+            continue
+        found_keys.append(key)
+        vectors.append(vector)
+
+    return found_keys, np.stack(vectors)
+
+
+def quantize(vectors: np.ndarray, datatype: str) -> np.ndarray:
+    """Round trips vectors through a storage datatype, returns what search would see"""
+    if datatype == "FLOAT32":
+        return vectors
+    if datatype == "FLOAT16":
+        return vectors.astype(np.float16).astype(np.float32)
+    if datatype == "INT8":
+        # scalar quantization with one scale per dimension
+        low = vectors.min(axis=0)
+        scale = np.maximum(vectors.max(axis=0) - low, 1e-12) / 255
+        codes = np.round((vectors - low) / scale)
+        return codes * scale + low
+    raise ValueError(f"datatype {datatype} is not valid")
+
+
+BYTES_PER_DIM = {"FLOAT32": 4, "FLOAT16": 2, "INT8": 1}
+
+
+def top_k(query: np.ndarray, vectors: np.ndarray, k: int, exclude: int) -> np.ndarray:
+    distances = exact_distances(query, vectors, "COSINE")
+    # the query is one of the stored vectors, it is not its own neighbour
+    distances[exclude] = np.inf
+    return np.argsort(distances, kind="stable")[:k]
+
+
+def recall_report(
+    vectors: np.ndarray, k: int, num_queries: int, rescore_factors: List[int], seed: int
+) -> List[Dict[str, float]]:
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+
+    exact = {row: set(top_k(vectors[row], vectors, k, row)) for row in query_rows}
+
+    report = []
+    for datatype in ["FLOAT32", "FLOAT16", "INT8"]:
+        quantized = quantize(vectors, datatype)
+        for rescore_factor in rescore_factors:
+            if datatype == "FLOAT32" and rescore_factor > 0:
+                continue
+            hits = 0
+            for row in query_rows:
+                candidates = top_k(vectors[row], quantized, k * max(rescore_factor, 1), row)
+                if rescore_factor > 0:
+                    distances = exact_distances(vectors[row], vectors[candidates], "COSINE")
+                    candidates = candidates[np.argsort(distances, kind="stable")[:k]]
+                hits += len(exact[row] & set(candidates[:k]))
+
+            # the vector is stored in the hash and again in the index,
+            # rescoring keeps a float32 copy on disk
+            bytes_per_chunk = 2 * BYTES_PER_DIM[datatype] * vectors.shape[1]
+            disk_bytes_per_chunk = 4 * vectors.shape[1] if rescore_factor > 0 else 0
+
+            report.append(
+                {
+                    "datatype": datatype,
+                    "rescore_factor": rescore_factor,
+                    "recall": hits / (k * len(query_rows)),
+                    "vector_bytes_per_chunk": bytes_per_chunk,
+                    "disk_bytes_per_chunk": disk_bytes_per_chunk,
+                    # how many more chunks fit in the same redis memory than with float32
+                    "chunks_per_float32_chunk": (8 * vectors.shape[1]) / bytes_per_chunk,
+                }
+            )
+    return report
+
+
+def measured_memory(client: redis.Redis, asset_type: str, keys: List[bytes]) -> Dict[str, float]:
+    """Memory the current index actually uses, from FT.INFO and MEMORY USAGE"""
+    index_info = client.ft(asset_type).info()
+    sample = keys[:1000]
+    pipeline = client.pipeline(transaction=False)
+    for key in sample:
+        pipeline.memory_usage(key)
+    usages = [usage for usage in pipeline.execute() if usage is not None]
+    return {
+        "num_docs": int(index_info.get("num_docs", 0)),
+        "vector_index_sz_mb": float(index_info.get("vector_index_sz_mb", 0)),
+        "mean_chunk_key_bytes": float(np.mean(usages)) if usages else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--asset-type", default="techblogs")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--max-vectors", type=int, default=20000)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[0, 2, 4])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(REDIS_URL)
+
+    keys, vectors = load_vectors(client, args.asset_type, args.max_vectors)
+    print(f"Loaded {len(vectors)} float32 vectors of asset_type {args.asset_type}")
+
+    memory = measured_memory(client, args.asset_type, keys)
+    print(
+        f"Current index: {memory['num_docs']} docs, vector index {memory['vector_index_sz_mb']:.1f} MB, "
+        f"{memory['mean_chunk_key_bytes']:.0f} bytes per chunk key"
+    )
+
+    print(
+        f"{'datatype':<10}{'rescore':>8}{'recall@' + str(args.k):>12}"
+        f"{'redis bytes':>13}{'disk bytes':>12}{'chunks x':>10}"
+    )
+    for row in recall_report(
+        vectors, args.k, args.num_queries, args.rescore_factors, args.seed
+    ):
+        print(
+            f"{row['datatype']:<10}{row['rescore_factor']:>8}{row['recall']:>12.4f}"
+            f"{row['vector_bytes_per_chunk']:>13}{row['disk_bytes_per_chunk']:>12}"
+            f"{row['chunks_per_float32_chunk']:>10.2f}"
+        )
+    print(
+        "Recall is measured with exact search over the quantized vectors. INT8 is reported for "
+        "comparison only, redis cannot index it. Rescoring vectors are kept on disk in RESCORE_VECTORS_DIR."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Zero-downtime reindex of an asset type through a redis index alias.
+
+A reindex builds the next version of the chunk index (e.g. techblogs_v7) from the
+current schema and vector_index settings, copies the current chunks into it with
+their stored vectors, then points the asset_type alias at it with FT.ALIASUPDATE.
+Searches keep using the current version until the switch.
+
+The router running the reindex records the current version and the one being built
+with indexes.write_version_state. The other routers compare them with the versions
+they opened before every write, and every few seconds or on a failed search, so they
+mirror their writes during the copy and move to the new version after the switch.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from backend import VectorBackend
+from snapshot import read_chunks, vector_datatype, VECTOR_KEY
+from vectorstore import VECTOR_DTYPES
+from full_vectors import FullVectorFile, RESCORE_ROW_KEY
+import json
+import time
+import uuid
+import numpy as np
+import redis
+import indexes
+
+
+class Throttle:
+    """Sleeps between batches so that at most max_per_second items are processed"""
+
+    def __init__(self, max_per_second: Optional[float]) -> None:
+        self.max_per_second = max_per_second
+        self.start = time.monotonic()
+        self.count = 0
+
+    def wait(self, count: int) -> None:
+        self.count += count
+        if not self.max_per_second:
+            return
+        ahead = self.count / self.max_per_second - (time.monotonic() - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def scan_batches(client: redis.Redis, match: str, batch_size: int) -> Iterator[List[str]]:
+    batch = []
+    for key in client.scan_iter(match=match, count=batch_size):
+        batch.append(key.decode("utf-8") if isinstance(key, bytes) else key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _convert_vectors(
+    chunks: List[Tuple[str, Dict[str, Any]]],
+    storage_type: str,
+    vector_index: Optional[Dict[str, Any]],
+    source_vectors: Optional[FullVectorFile] = None,
+    target_vectors: Optional[FullVectorFile] = None,
+) -> None:
+    # stores the vectors in the datatype of the target index, and copies their full
+    # precision vectors to the target's file if it rescores
+    vector_index = vector_index or indexes.DEFAULT_VECTOR_INDEX
+    dtype = VECTOR_DTYPES[vector_index.get("datatype", "FLOAT32").upper()]
+
+    source_rows, stored = [], []
+    for _, chunk in chunks:
+        source_rows.append(chunk.pop(RESCORE_ROW_KEY, None))
+        vector = chunk[VECTOR_KEY]
+        if storage_type == "json":
+            # json vectors are float32 lists whatever the index datatype
+            stored.append(np.asarray(vector, dtype=np.float32))
+        else:
+            vector = np.frombuffer(vector, dtype=VECTOR_DTYPES[vector_datatype(vector)])
+            chunk[VECTOR_KEY] = vector.astype(dtype).tobytes()
+            stored.append(vector.astype(np.float32))
+
+    if target_vectors is None or not chunks:
+        return
+    # fall back to the stored vector, it is only lossy if it was quantized
+    full_vectors = np.stack(stored)
+    copied = [i for i, row in enumerate(source_rows) if row is not None]
+    if source_vectors is not None and copied:
+        full_vectors[copied] = source_vectors.read([int(source_rows[i]) for i in copied])
+    target_rows = target_vectors.allocate(len(chunks))
+    target_vectors.write(target_rows, full_vectors)
+    for (_, chunk), row in zip(chunks, target_rows):
+        chunk[RESCORE_ROW_KEY] = row
+
+
+def copy_chunks(
+    client: redis.Redis,
+    source_prefix: str,
+    target_prefix: str,
+    storage_type: str,
+    vector_index: Optional[Dict[str, Any]],
+    batch_size: int = 200,
+    max_chunks_per_second: Optional[float] = None,
+    progress: Optional[Dict[str, Any]] = None,
+    migrate: Optional[Callable[[List[Tuple[str, Dict[str, Any]]]], Any]] = None,
+    source_vectors: Optional[FullVectorFile] = None,
+    target_vectors: Optional[FullVectorFile] = None,
+) -> int:
+    """Copies every chunk under source_prefix to target_prefix, reusing its vector
+
+    Chunks that already exist under target_prefix were written there since the copy
+    started and are newer, they are not overwritten.
+
+    Args:
+        client (redis.Redis): redis client
+        source_prefix (str): key prefix of the current version
+        target_prefix (str): key prefix of the version being built
+        storage_type (str): "hash" or "json"
+        vector_index (Optional[Dict[str, Any]]): vector_index settings of the new version
+        batch_size (int): number of chunks read and written per pipelined round trip
+        max_chunks_per_second (Optional[float]): copy rate limit, None for no limit
+        progress (Optional[Dict[str, Any]]): "chunks_copied" is updated after each batch
+        migrate (Optional[Callable]): rewrites the fields of each batch of (key, chunk)
+            in place before they are written, e.g. migrations.migrate_chunks
+        source_vectors (Optional[FullVectorFile]): full precision vectors of the current version
+        target_vectors (Optional[FullVectorFile]): full precision vectors of the new
+            version, None if it does not rescore
+
+    Returns:
+        int: number of chunks copied
+    """
+    throttle = Throttle(max_chunks_per_second)
+    copied = 0
+    for keys in scan_batches(client, f"{source_prefix}:*", batch_size):
+        target_keys = {key: target_prefix + key[len(source_prefix) :] for key in keys}
+
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.exists(target_keys[key])
+        exists = dict(zip(keys, pipeline.execute()))
+
+        chunks = read_chunks(client, [k for k in keys if not exists[k]], storage_type)
+        if migrate is not None:
+            migrate(chunks)
+
+        _convert_vectors(chunks, storage_type, vector_index, source_vectors, target_vectors)
+
+        pipeline = client.pipeline(transaction=False)
+        for key, chunk in chunks:
+            if storage_type == "json":
+                pipeline.execute_command("JSON.SET", target_keys[key], "$", json.dumps(chunk))
+            else:
+                pipeline.hset(target_keys[key], mapping=chunk)
+            copied += 1
+        pipeline.execute()
+
+        if progress is not None:
+            progress["chunks_copied"] = copied
+        throttle.wait(len(keys))
+    return copied
+
+
+def copy_documents(
+    client: redis.Redis, source_index: str, target_index: str, batch_size: int = 200
+) -> int:
+    """Copies the document records of an index version to the next one"""
+    source_prefix = f"docinfo:{source_index}:"
+    copied = 0
+    for keys in scan_batches(client, f"{source_prefix}*", batch_size):
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hgetall(key)
+        documents = pipeline.execute()
+
+        pipeline = client.pipeline(transaction=False)
+        for key, document in zip(keys, documents):
+            if document:
+                target_key = f"docinfo:{target_index}:{key[len(source_prefix) :]}"
+                pipeline.hset(target_key, mapping=document)
+                copied += 1
+        pipeline.execute()
+    return copied
+
+
+def remove_deleted_chunks(
+    client: redis.Redis, source_prefix: str, target_prefix: str, batch_size: int = 200
+) -> int:
+    """Deletes copied chunks whose source was deleted while the copy was running"""
+    deleted = 0
+    for keys in scan_batches(client, f"{target_prefix}:*", batch_size):
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.exists(source_prefix + key[len(target_prefix) :])
+        stale = [key for key, exists in zip(keys, pipeline.execute()) if not exists]
+        if stale:
+            deleted += client.delete(*stale)
+    return deleted
+
+
+def switch_alias(client: redis.Redis, asset_type: str, source_index: str, target_index: str) -> None:
+    """Points the asset_type alias at target_index"""
+    if source_index == asset_type:
+        # the version 0 index holds the name, drop it (not its chunks) so the
+        # alias can take it over
+        client.ft(source_index).dropindex(delete_documents=False)
+        client.ft(target_index).aliasadd(asset_type)
+    else:
+        client.ft(target_index).aliasupdate(asset_type)
+
+
+def drop_version(
+    client: redis.Redis,
+    asset_type: str,
+    index_name: str,
+    batch_size: int = 200,
+    max_chunks_per_second: Optional[float] = None,
+    full_vectors: Optional[FullVectorFile] = None,
+) -> int:
+    """Deletes an index version that no longer serves traffic, its chunks and their
+    full precision vectors
+
+    Chunks are deleted by prefix rather than with FT.DROPINDEX DD, because the
+    version 0 prefix "doc:{asset_type}" also matches other asset types' keys.
+    """
+    version = indexes.index_version(asset_type, index_name)
+    prefix = indexes.key_prefix(asset_type, version)
+
+    if index_name != asset_type and indexes.index_exists(client, index_name):
+        client.ft(index_name).dropindex(delete_documents=False)
+
+    throttle = Throttle(max_chunks_per_second)
+    deleted = 0
+    for match in [f"{prefix}:*", f"docinfo:{index_name}:*"]:
+        for keys in scan_batches(client, match, batch_size):
+            deleted += client.unlink(*keys)
+            throttle.wait(len(keys))
+    if full_vectors is not None:
+        full_vectors.remove()
+    return deleted
+
+
+class DualWriteBackend(VectorBackend):
+    """Serves reads from the current version and mirrors writes to the one being built.
+
+    Keys are those of the current version, they are translated to the new version's
+    key prefix for the mirrored writes.
+    """
+
+    def __init__(self, live: VectorBackend, shadow: VectorBackend) -> None:
+        self.live = live
+        self.shadow = shadow
+        self.key_prefix = live.key_prefix
+        self.storage_type = live.storage_type
+
+    def _shadow_keys(self, keys: List[str]) -> List[str]:
+        return [
+            self.shadow.key_prefix + key[len(self.live.key_prefix) :]
+            if key.startswith(f"{self.live.key_prefix}:")
+            else key
+            for key in keys
+        ]
+
+    def add_embedded_texts(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        keys: Optional[List[str]] = None,
+    ) -> List[str]:
+        if keys is None:
+            keys = [f"{self.key_prefix}:{uuid.uuid4().hex}" for _ in texts]
+        self.live.add_embedded_texts(texts, metadatas, embeddings, keys)
+        self.shadow.add_embedded_texts(texts, metadatas, embeddings, self._shadow_keys(keys))
+        return keys
+
+    def update_metadata_and_delete(
+        self,
+        keys: List[str],
+        metadatas: List[Dict[str, Any]],
+        delete_keys: List[str],
+    ) -> None:
+        self.live.update_metadata_and_delete(keys, metadatas, delete_keys)
+        # chunks the copy has not reached yet are copied with the new metadata later
+        shadow_keys = self._shadow_keys(keys)
+        pipeline = self.shadow.client.pipeline(transaction=False)
+        for key in shadow_keys:
+            pipeline.exists(key)
+        copied = pipeline.execute()
+        self.shadow.update_metadata_and_delete(
+            [key for key, exists in zip(shadow_keys, copied) if exists],
+            [metadata for metadata, exists in zip(metadatas, copied) if exists],
+            self._shadow_keys(delete_keys),
+        )
+
+    def delete_chunks(self, keys: List[str]) -> int:
+        items_deleted = self.live.delete_chunks(keys)
+        self.shadow.delete_chunks(self._shadow_keys(keys))
+        return items_deleted
+
+    def find_document_keys(self, document_url: str) -> List[str]:
+        return self.live.find_document_keys(document_url)
+
+    def knn_search(
+        self,
+        embedding: np.ndarray,
+        k: int,
+        return_fields: List[str],
+        ef_runtime: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        return self.live.knn_search(embedding, k, return_fields, ef_runtime, filters)
+
+    def keyword_search(
+        self,
+        search_type: str,
+        field: str,
+        value: str,
+        k: int,
+        return_fields: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        return self.live.keyword_search(search_type, field, value, k, return_fields, filters)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.live.stats()
@@ -26,25 +26,56 @@ metadata = {
     "last_indexed": "2024-01-16T15:17:09",
 }
 
+# Only fields that are searched or filtered on are indexed. Chunk level flags and
+# document dates are indexed as TAG and NUMERIC fields so they can pre-filter KNN queries.
 index_schema = {
-    "tag": [{"name": "document_url", "separator": "|"}],
+    "tag": [
+        {"name": "document_url", "separator": "|"},
+        {"name": "chunk_contains_code"},
+    ],
     "text": [
         {"name": "text"},
         {"name": "text_components"},
-        {"name": "word_count"},
-        {"name": "contains_code"},
-        {"name": "heading_section_tag"},
-        {"name": "heading_section_index"},
         {"name": "heading_section_title"},
-        {"name": "only_code"},
-        {"name": "paragraph_index"},
-        {"name": "paragraph_sentence_index"},
         {"name": "document_title"},
-        {"name": "document_date"},
-        {"name": "document_date_modified"},
-        {"name": "document_full_text"},
-        {"name": "last_indexed"},
     ],
+    "numeric": [
+        {"name": "document_date_epoch"},
+        {"name": "document_date_modified_epoch"},
+    ],
+}
+
+# stored in every chunk hash and returned by search, but never searched on
+stored_fields = [
+    "word_count",
+    "contains_code",
+    "heading_section_tag",
+    "heading_section_index",
+    "only_code",
+    "paragraph_index",
+    "paragraph_sentence_index",
+    "last_indexed",
+]
+# stored once per document_url in a separate document record instead of in every
+# chunk, and added to search results by looking up the record of each result.
+# document_title stays on the chunks too because keyword search uses it.
+document_fields = [
+    "document_date",
+    "document_date_modified",
+    "document_full_text",
+]
+
+# fields that hold one value per text component
+list_fields = {
+    "text_components",
+    "word_count",
+    "contains_code",
+    "heading_section_tag",
+    "heading_section_index",
+    "heading_section_title",
+    "only_code",
+    "paragraph_index",
+    "paragraph_sentence_index",
 }
 
 tag_fields = set()
@@ -54,3 +85,37 @@ for field in index_schema["tag"]:
 text_fields = list()
 for field in index_schema["text"]:
     text_fields.append(field["name"])
+
+numeric_fields = list()
+for field in index_schema["numeric"]:
+    numeric_fields.append(field["name"])
+
+# derived from the chunk fields at insert time, only used to filter
+filter_fields = ["chunk_contains_code"] + numeric_fields
+
+# how a schema migration fills an indexed field from the fields already stored, so
+# chunks written before the field was added or retyped are rebuilt without re-embedding.
+# "convert" is one of migrations.CONVERTERS. Document fields are read from the document record.
+field_migrations = {
+    "document_date_epoch": {"source": "document_date", "convert": "epoch"},
+    "document_date_modified_epoch": {"source": "document_date_modified", "convert": "epoch"},
+    "chunk_contains_code": {"source": "contains_code", "convert": "any_true"},
+}
+
+# fields that search endpoints can return
+returnable_fields = (
+    ["content"]
+    + sorted(tag_fields)
+    + text_fields
+    + numeric_fields
+    + stored_fields
+    + document_fields
+)
+
+# fields returned when the caller does not pass return_fields.
+# document_full_text holds the whole document, so only return it when asked for.
+default_return_fields = [
+    name
+    for name in sorted(tag_fields) + text_fields + stored_fields + document_fields
+    if name != "document_full_text" and name not in filter_fields
+]
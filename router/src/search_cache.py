@@ -0,0 +1,108 @@
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+import redis
+
+
+class SearchResponseCache:
+    """Redis cache of full search responses.
+
+    Entries are keyed by the normalized request plus the current generation of every
+    asset_type it searched. Writes to an asset_type bump its generation, so entries
+    computed before the write are never looked up again and simply expire.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        ttl: int = 300,
+        redis_prefix: str = "searchcache",
+    ) -> None:
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.redis_prefix = redis_prefix
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # time the hits would have taken to compute, minus the lookups
+        self.latency_saved_ms = 0.0
+
+    def _generation_key(self, asset_type: str) -> str:
+        return f"{self.redis_prefix}:generation:{asset_type}"
+
+    def lookup(
+        self, kind: str, request: Dict[str, Any], asset_types: List[str]
+    ) -> Tuple[Optional[str], Optional[Any]]:
+        """Looks up the response of a search request.
+
+        Args:
+            kind (str): which search endpoint, e.g. "semantic" or "keyword"
+            request (Dict[str, Any]): normalized request parameters
+            asset_types (List[str]): asset_types the request searches
+
+        Returns:
+            Tuple[Optional[str], Optional[Any]]: cache key to store the response under,
+                and the cached response. The key is None if redis is unavailable.
+        """
+        start = time.perf_counter()
+        try:
+            generations = self.redis_client.mget(
+                [self._generation_key(asset_type) for asset_type in asset_types]
+            )
+            digest = hashlib.sha256(
+                json.dumps(
+                    [kind, request, asset_types, generations], sort_keys=True, default=str
+                ).encode("utf-8")
+            ).hexdigest()
+            key = f"{self.redis_prefix}:{kind}:{digest}"
+            value = self.redis_client.get(key)
+        except redis.RedisError as e:
+            print(f"Warning: could not read search cache from redis: {e}")
+            return None, None
+
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            return key, None
+
+        entry = json.loads(value)
+        lookup_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.hits += 1
+            self.latency_saved_ms += max(entry["compute_ms"] - lookup_ms, 0.0)
+        return key, entry["response"]
+
+    def put(self, key: str, response: Any, compute_ms: float) -> None:
+        entry = {"response": response, "compute_ms": compute_ms}
+        try:
+            self.redis_client.set(key, json.dumps(entry), ex=self.ttl)
+        except redis.RedisError as e:
+            print(f"Warning: could not write search cache to redis: {e}")
+
+    def invalidate(self, asset_types: List[str]) -> None:
+        """Bumps the generation of asset_types after their data changed."""
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for asset_type in asset_types:
+            pipeline.incr(self._generation_key(asset_type))
+        try:
+            pipeline.execute()
+        except redis.RedisError as e:
+            print(f"Warning: could not bump search cache generation in redis: {e}")
+            return
+        with self._lock:
+            self.invalidations += len(asset_types)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+                "invalidations": self.invalidations,
+                "latency_saved_ms": self.latency_saved_ms,
+            }
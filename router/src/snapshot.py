@@ -0,0 +1,390 @@
+"""Snapshot export and import of one asset type, without re-embedding.
+
+Export streams every chunk of an asset type out of redis with SCAN and pipelined
+reads. Vectors are written to a .npy file and the other chunk fields to NDJSON.
+Import bulk loads a snapshot into the same or another asset type with pipelined
+writes, reusing the stored vectors. Neither touches Triton or the rest of redis.
+
+Usage:
+    python snapshot.py export --asset-type techblogs --path /data/snapshots/techblogs
+    python snapshot.py import --path /data/snapshots/techblogs --asset-type staging_techblogs
+
+Index key prefixes match by plain string prefix, so an asset type whose name starts
+with the name of another one, e.g. techblogs_copy next to techblogs, cannot be
+imported into.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timezone
+from assettypes import ASSET_TYPES
+from embeddings import EMBEDDING_DIMS
+from search_cache import SearchResponseCache
+from vectorstore import VECTOR_DTYPES
+from full_vectors import FullVectorFile, RESCORE_ROW_KEY
+import argparse
+import json
+import os
+import time
+import numpy as np
+import redis
+import indexes
+
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
+REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
+REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
+# where indexes that rescore keep their full precision vectors, as in the router
+RESCORE_VECTORS_DIR = os.environ.get("RESCORE_VECTORS_DIR", "/data/rescore_vectors")
+
+VECTOR_KEY = "content_vector"
+SNAPSHOT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+# full precision copies kept for rescoring, only if the index has them
+FULL_VECTORS_FILE = "vectors_full.npy"
+CHUNKS_FILE = "chunks.ndjson"
+DOCUMENTS_FILE = "documents.ndjson"
+
+
+def scan_keys(client: redis.Redis, match: str, count: int = 1000) -> List[str]:
+    return [
+        key.decode("utf-8") if isinstance(key, bytes) else key
+        for key in client.scan_iter(match=match, count=count)
+    ]
+
+
+def _batches(items: List[Any], batch_size: int) -> Iterator[List[Any]]:
+    for i in range(0, len(items), batch_size):
+        yield items[i : i + batch_size]
+
+
+def vector_datatype(vector: bytes) -> str:
+    """Redis datatype of a hash vector, from its size"""
+    for datatype, dtype in VECTOR_DTYPES.items():
+        if len(vector) == EMBEDDING_DIMS * np.dtype(dtype).itemsize:
+            return datatype
+    raise ValueError(f"vector of {len(vector)} bytes does not have {EMBEDDING_DIMS} dims")
+
+
+def read_chunks(
+    client: redis.Redis, keys: List[str], storage_type: str
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """Reads chunks with one pipelined round trip, skips keys deleted since the SCAN"""
+    pipeline = client.pipeline(transaction=False)
+    for key in keys:
+        if storage_type == "json":
+            pipeline.execute_command("JSON.GET", key, "$")
+        else:
+            pipeline.hgetall(key)
+
+    chunks = []
+    for key, value in zip(keys, pipeline.execute()):
+        if not value:
+            continue
+        if storage_type == "json":
+            chunks.append((key, json.loads(value)[0]))
+        else:
+            # everything but the vectors is utf-8 text
+            chunks.append(
+                (
+                    key,
+                    {
+                        k.decode("utf-8"): v
+                        if k == VECTOR_KEY.encode()
+                        else v.decode("utf-8")
+                        for k, v in value.items()
+                    },
+                )
+            )
+    return chunks
+
+
+def export_snapshot(
+    client: redis.Redis,
+    asset_type: str,
+    path: str,
+    batch_size: int = 500,
+    rescore_vectors_dir: str = RESCORE_VECTORS_DIR,
+) -> Dict[str, Any]:
+    """Writes every chunk and document record of an asset type to a snapshot directory
+
+    Args:
+        client (redis.Redis): redis client
+        asset_type (str): asset type, which is also the index name
+        path (str): directory to write the snapshot to
+        batch_size (int): number of keys read per pipelined round trip
+        rescore_vectors_dir (str): directory of the full precision vectors of the index
+
+    Returns:
+        Dict[str, Any]: manifest of the snapshot
+    """
+    # the current version if the asset type was reindexed
+    index_name = indexes.resolve_index(client, asset_type)
+    version = indexes.index_version(asset_type, index_name)
+    storage_type = indexes.index_storage_type(client, index_name)
+    chunk_prefix = f"{indexes.key_prefix(asset_type, version)}:"
+    document_prefix = f"docinfo:{index_name}:"
+
+    keys = scan_keys(client, f"{chunk_prefix}*")
+    os.makedirs(path, exist_ok=True)
+
+    source_vectors = FullVectorFile(client, rescore_vectors_dir, index_name, EMBEDDING_DIMS)
+    if not source_vectors.is_complete():
+        print(f"Full precision vectors of {index_name} are missing, exporting the stored ones")
+        source_vectors = None
+    vectors = None
+    full_vectors = None
+    datatype = None
+    num_chunks = 0
+    with open(os.path.join(path, CHUNKS_FILE), "w", encoding="utf-8") as chunks_file:
+        for batch in _batches(keys, batch_size):
+            batch_start = num_chunks
+            # snapshot row -> row of the chunk's full precision vector on disk
+            full_rows = {}
+            for key, chunk in read_chunks(client, batch, storage_type):
+                vector = chunk.pop(VECTOR_KEY)
+                row = chunk.pop(RESCORE_ROW_KEY, None)
+
+                if vectors is None:
+                    # json stores float32 lists, hashes store the index datatype
+                    datatype = "FLOAT32" if storage_type == "json" else vector_datatype(vector)
+                    # rows past the last chunk stay unused if keys were deleted meanwhile
+                    vectors = np.lib.format.open_memmap(
+                        os.path.join(path, VECTORS_FILE),
+                        mode="w+",
+                        dtype=VECTOR_DTYPES[datatype],
+                        shape=(len(keys), EMBEDDING_DIMS),
+                    )
+
+                if storage_type == "json":
+                    vectors[num_chunks] = vector
+                else:
+                    vectors[num_chunks] = np.frombuffer(vector, dtype=vectors.dtype)
+                if row is not None and source_vectors is not None:
+                    full_rows[num_chunks] = int(row)
+
+                chunk["id"] = key[len(chunk_prefix) :]
+                chunks_file.write(json.dumps(chunk) + "\n")
+                num_chunks += 1
+
+            if full_rows and full_vectors is None:
+                full_vectors = np.lib.format.open_memmap(
+                    os.path.join(path, FULL_VECTORS_FILE),
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(len(keys), EMBEDDING_DIMS),
+                )
+                full_vectors[:batch_start] = vectors[:batch_start]
+            if full_vectors is not None:
+                # chunks written before rescoring was enabled only have their stored vector
+                full_vectors[batch_start:num_chunks] = vectors[batch_start:num_chunks]
+                if full_rows:
+                    full_vectors[list(full_rows)] = source_vectors.read(list(full_rows.values()))
+
+    if vectors is None:
+        np.save(os.path.join(path, VECTORS_FILE), np.zeros((0, EMBEDDING_DIMS), np.float32))
+    for array in [vectors, full_vectors]:
+        if array is not None:
+            array.flush()
+
+    num_documents = 0
+    document_keys = scan_keys(client, f"{document_prefix}*")
+    with open(os.path.join(path, DOCUMENTS_FILE), "w", encoding="utf-8") as documents_file:
+        for batch in _batches(document_keys, batch_size):
+            pipeline = client.pipeline(transaction=False)
+            for key in batch:
+                pipeline.hgetall(key)
+            for key, document in zip(batch, pipeline.execute()):
+                if not document:
+                    continue
+                record = {k.decode("utf-8"): v.decode("utf-8") for k, v in document.items()}
+                record["id"] = key[len(document_prefix) :]
+                documents_file.write(json.dumps(record) + "\n")
+                num_documents += 1
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "asset_type": asset_type,
+        "storage_type": storage_type,
+        "vector_index": ASSET_TYPES.get(asset_type, {}).get("vector_index"),
+        "vector_datatype": datatype,
+        "dims": EMBEDDING_DIMS,
+        "num_chunks": num_chunks,
+        "num_documents": num_documents,
+        "full_vectors": full_vectors is not None,
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    return manifest
+
+
+def _read_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def import_snapshot(
+    client: redis.Redis,
+    path: str,
+    asset_type: Optional[str] = None,
+    batch_size: int = 500,
+    rescore_vectors_dir: str = RESCORE_VECTORS_DIR,
+) -> Dict[str, Any]:
+    """Loads a snapshot into an asset type, creating its index if it is missing
+
+    Vectors are written in the datatype of the target index, converted from the
+    snapshot if needed. Chunks keep their ids, so existing chunks with the same id
+    are overwritten and other chunks of the target are left alone.
+
+    Args:
+        client (redis.Redis): redis client
+        path (str): snapshot directory written by export_snapshot
+        asset_type (Optional[str]): asset type to load into. Defaults to the one exported.
+        batch_size (int): number of keys written per pipelined round trip
+        rescore_vectors_dir (str): directory of the full precision vectors of the index
+
+    Raises:
+        ValueError: if the snapshot does not fit the target index, or the key prefix
+            of the target overlaps the one of another index
+
+    Returns:
+        Dict[str, Any]: number of chunks and document records written
+    """
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"snapshot version {manifest['version']} is not supported")
+    if manifest["dims"] != EMBEDDING_DIMS:
+        raise ValueError(
+            f"snapshot has {manifest['dims']} dims, the embedder has {EMBEDDING_DIMS}"
+        )
+
+    asset_type = asset_type or manifest["asset_type"]
+    asset_type_info = ASSET_TYPES.get(asset_type, {})
+    storage_type = manifest["storage_type"]
+    if asset_type_info.get("storage_type", storage_type) != storage_type:
+        raise ValueError(
+            f"snapshot has {storage_type} storage, asset_type {asset_type} uses "
+            f"{asset_type_info['storage_type']}"
+        )
+    vector_index = asset_type_info.get("vector_index", manifest["vector_index"])
+
+    index_name = indexes.resolve_index(client, asset_type)
+    version = indexes.index_version(asset_type, index_name)
+    chunk_prefix = indexes.key_prefix(asset_type, version)
+    # the chunks would also show up in the searches of the overlapping indexes
+    overlapping = indexes.overlapping_indexes(
+        client, index_name, indexes.index_prefix(asset_type, version), chunk_prefix
+    )
+    if overlapping:
+        raise ValueError(
+            f"key prefix {chunk_prefix} of asset_type {asset_type} overlaps the prefix of "
+            f"the indexes {', '.join(overlapping)}, import into another asset type"
+        )
+    indexes.ensure_index(
+        client,
+        index_name,
+        indexes.index_prefix(asset_type, version),
+        storage_type,
+        vector_index,
+        EMBEDDING_DIMS,
+    )
+    datatype = (vector_index or indexes.DEFAULT_VECTOR_INDEX).get("datatype", "FLOAT32")
+    dtype = VECTOR_DTYPES[datatype.upper()]
+    target_vectors = None
+    if int((vector_index or {}).get("rescore_factor") or 0) > 0:
+        target_vectors = FullVectorFile(client, rescore_vectors_dir, index_name, EMBEDDING_DIMS)
+
+    num_chunks = manifest["num_chunks"]
+    vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+    full_vectors = None
+    if manifest["full_vectors"]:
+        full_vectors = np.load(os.path.join(path, FULL_VECTORS_FILE), mmap_mode="r")
+
+    def write_chunks(rows: List[int], chunks: List[Dict[str, Any]]) -> None:
+        if target_vectors is not None:
+            # fall back to the stored vectors, they are only lossy if they were quantized
+            source = full_vectors if full_vectors is not None else vectors
+            target_rows = target_vectors.allocate(len(rows))
+            target_vectors.write(target_rows, np.asarray(source[rows], dtype=np.float32))
+            for chunk, target_row in zip(chunks, target_rows):
+                chunk[RESCORE_ROW_KEY] = target_row
+
+        pipeline = client.pipeline(transaction=False)
+        for row, chunk in zip(rows, chunks):
+            key = f"{chunk_prefix}:{chunk.pop('id')}"
+            vector = vectors[row]
+            if storage_type == "json":
+                chunk[VECTOR_KEY] = np.asarray(vector, dtype=np.float32).tolist()
+                pipeline.execute_command("JSON.SET", key, "$", json.dumps(chunk))
+            else:
+                chunk[VECTOR_KEY] = np.asarray(vector, dtype=dtype).tobytes()
+                pipeline.hset(key, mapping=chunk)
+        pipeline.execute()
+
+    rows, chunks = [], []
+    for row, chunk in enumerate(_read_ndjson(os.path.join(path, CHUNKS_FILE))):
+        if row >= num_chunks:
+            break
+        rows.append(row)
+        chunks.append(chunk)
+        if len(chunks) >= batch_size:
+            write_chunks(rows, chunks)
+            rows, chunks = [], []
+    if chunks:
+        write_chunks(rows, chunks)
+
+    num_documents = 0
+    for batch in _batches(list(_read_ndjson(os.path.join(path, DOCUMENTS_FILE))), batch_size):
+        pipeline = client.pipeline(transaction=False)
+        for document in batch:
+            pipeline.hset(f"docinfo:{index_name}:{document.pop('id')}", mapping=document)
+        pipeline.execute()
+        num_documents += len(batch)
+
+    # cached search responses of the asset type are stale now
+    SearchResponseCache(client).invalidate([asset_type])
+
+    return {"asset_type": asset_type, "num_chunks": num_chunks, "num_documents": num_documents}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="write an asset type to a snapshot")
+    export_parser.add_argument("--asset-type", required=True)
+    export_parser.add_argument("--path", required=True)
+    export_parser.add_argument("--batch-size", type=int, default=500)
+
+    import_parser = subparsers.add_parser("import", help="load a snapshot into an asset type")
+    import_parser.add_argument("--path", required=True)
+    import_parser.add_argument(
+        "--asset-type", default=None, help="defaults to the asset type that was exported"
+    )
+    import_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(REDIS_URL)
+
+    start = time.perf_counter()
+    if args.command == "export":
+        manifest = export_snapshot(client, args.asset_type, args.path, args.batch_size)
+        print(
+            f"Exported {manifest['num_chunks']} chunks and {manifest['num_documents']} documents "
+            f"of asset_type {args.asset_type} to {args.path} in {time.perf_counter() - start:.1f}s"
+        )
+    else:
+        counts = import_snapshot(client, args.path, args.asset_type, args.batch_size)
+        print(
+            f"Imported {counts['num_chunks']} chunks and {counts['num_documents']} documents "
+            f"into asset_type {counts['asset_type']} in {time.perf_counter() - start:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
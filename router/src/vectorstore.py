@@ -0,0 +1,624 @@
+from langchain.vectorstores.redis import Redis
+from redis.commands.search.query import Query
+from redisvl.query.filter import Text, Tag, Num, FilterExpression
+from typing import List, Dict, Any, Optional, Tuple
+from backend import VectorBackend, MissingFilterFieldsError, REDIS_STOP_WORDS
+from full_vectors import FullVectorFile, RESCORE_ROW_KEY
+import hashlib
+import json
+import re
+import uuid
+import numpy as np
+import indexes
+import schema
+
+
+def apply_return_fields(
+    query: Query, return_fields: List[str], storage_type: str
+) -> Query:
+    """Adds a RETURN clause for return_fields. JSON documents are read through JSONPath."""
+    if storage_type != "json":
+        return query.return_fields(*return_fields)
+    for field in return_fields:
+        query = query.return_field(f"$.{field}", as_field=field)
+    return query
+
+
+def decode_result_fields(result: Dict[str, Any], storage_type: str) -> Dict[str, Any]:
+    """JSON documents return list fields serialized, hand them back as real lists.
+    Hash storage keeps its JSON strings as they are.
+    """
+    if storage_type != "json":
+        return result
+    for field in schema.list_fields:
+        if isinstance(result.get(field), str):
+            result[field] = json.loads(result[field])
+    return result
+
+
+def split_document_fields(
+    metadata: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Moves the document level fields out of a chunk's metadata.
+
+    Returns:
+        Tuple[Dict[str, Any], Optional[Dict[str, Any]]]: chunk metadata, and the
+            document record it references. None if the chunk has no document_url.
+    """
+    document_url = metadata.get("document_url")
+    if not document_url:
+        return metadata, None
+
+    chunk = dict(metadata)
+    document = {"document_url": document_url}
+    if chunk.get("document_title") is not None:
+        document["document_title"] = chunk["document_title"]
+    for field in schema.document_fields:
+        value = chunk.pop(field, None)
+        if value is not None:
+            document[field] = value
+    return chunk, document
+
+
+def with_document_url(return_fields: List[str]) -> List[str]:
+    """Document fields are looked up by document_url, so make sure it is returned."""
+    if "document_url" in return_fields:
+        return return_fields
+    if any(field in schema.document_fields for field in return_fields):
+        return return_fields + ["document_url"]
+    return return_fields
+
+
+def redis_filter_expression(filters: Optional[Dict[str, Any]]) -> str:
+    """Turns backend independent filters into a redis query expression, "*" for no filter"""
+    expressions: List[FilterExpression] = []
+    for field, condition in (filters or {}).items():
+        if field in schema.tag_fields:
+            expressions.append(Tag(field) == list(condition))
+        else:
+            low, high = condition
+            if low is not None:
+                expressions.append(Num(field) >= low)
+            if high is not None:
+                expressions.append(Num(field) <= high)
+
+    if not expressions:
+        return "*"
+
+    filter_expression = expressions[0]
+    for expression in expressions[1:]:
+        filter_expression = filter_expression & expression
+    return str(filter_expression)
+
+
+def document_record_key(index_name: str, document_url: str) -> str:
+    # one record per document_url, shared by the chunks of the document
+    digest = hashlib.sha256(document_url.encode("utf-8")).hexdigest()
+    return f"docinfo:{index_name}:{digest[:32]}"
+
+
+# numpy dtype of each redis vector datatype
+VECTOR_DTYPES = {
+    "FLOAT16": np.float16,
+    "FLOAT32": np.float32,
+    "FLOAT64": np.float64,
+}
+
+
+def exact_distances(
+    query: np.ndarray, vectors: np.ndarray, distance_metric: str
+) -> np.ndarray:
+    """Distances as redis reports them: 1 - cosine similarity, 1 - inner product, or squared L2."""
+    query = np.asarray(query, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if distance_metric == "L2":
+        return ((vectors - query) ** 2).sum(axis=1)
+    if distance_metric == "IP":
+        return 1 - vectors @ query
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+    return 1 - (vectors @ query) / np.maximum(norms, 1e-12)
+
+
+class RedisVectorstore(Redis, VectorBackend):
+    """langchain Redis vectorstore with a direct search path for the router.
+
+    langchain builds a Document with every metadata field for each result, and
+    similarity_search_with_relevance_scores always re-embeds the query string.
+    knn_search takes an already embedded query and only asks redis for the
+    fields the caller needs.
+
+    storage_type is "hash" (langchain's layout) or "json", where list metadata
+    is stored as real arrays.
+
+    Document level fields (schema.document_fields) are not copied into every chunk.
+    They are stored once per document_url in a hash outside the index prefix, and
+    hydrate_documents adds them back to search results.
+
+    vector_datatype overrides the datatype of the indexed vectors, since langchain
+    only knows FLOAT32 and FLOAT64. With rescore_factor > 0, a full precision copy of
+    every vector is written to full_vectors on disk, KNN fetches rescore_factor * k
+    candidates, and they are reranked by their exact distance to the query.
+
+    index_name is the concrete index version, which document records are keyed by.
+    Searches go to search_index_name when it is set, the asset type alias once this
+    version is the current one, so a switch made by another router applies at once.
+    """
+
+    storage_type = "hash"
+    vector_datatype: Optional[str] = None
+    rescore_factor = 0
+    full_vectors: Optional[FullVectorFile] = None
+    search_index_name: Optional[str] = None
+    @classmethod
+    def from_client(
+        cls,
+        client: Any,
+        embedding: Any,
+        index_name: str,
+        index_schema: Dict[str, Any],
+        vector_schema: Optional[Dict[str, Any]] = None,
+    ) -> "RedisVectorstore":
+        """Opens an existing index with an already connected redis client.
+
+        langchain's constructors connect from a url, from_existing_index even twice,
+        which leaves a connection pool behind every time a vectorstore is reopened.
+        """
+        rds = cls.__new__(cls)
+        rds.index_name = index_name
+        rds._embeddings = embedding
+        rds.client = client
+        rds.relevance_score_fn = None
+        rds._schema = rds._get_schema_with_defaults(index_schema, vector_schema)
+        return rds
+
+    # fields of the live index, read from FT.INFO on first use
+    _attributes: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def live_attributes(self, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        if self._attributes is None or refresh:
+            self._attributes = indexes.index_attributes(self.client, self.index_name)
+        return self._attributes
+
+    def live_vector_field(self) -> Dict[str, Any]:
+        return self.live_attributes().get(self._schema.content_vector_key, {})
+
+    def check_filter_fields(self, filters: Optional[Dict[str, Any]]) -> None:
+        """Raises MissingFilterFieldsError if the live index lacks a filtered field"""
+        if not filters:
+            return
+        missing = [field for field in filters if field not in self.live_attributes()]
+        if missing:
+            # the index may have been rebuilt with them since they were read
+            missing = [
+                field for field in missing if field not in self.live_attributes(refresh=True)
+            ]
+        if missing:
+            raise MissingFilterFieldsError(self.index_name, sorted(missing))
+
+    def index_algorithm(self) -> str:
+        """FLAT or HNSW, as the index was created, which may not be the configured one"""
+        algorithm = self.live_vector_field().get("algorithm")
+        if algorithm is None:
+            algorithm = self._schema.content_vector.algorithm
+        return str(algorithm).upper()
+
+    @property
+    def index_vector_dtype(self):
+        # queries and hash vectors must match the live index, which keeps the datatype
+        # it was created with until it is reindexed
+        datatype = self.live_vector_field().get("data_type") or self.vector_datatype
+        if datatype is not None:
+            return VECTOR_DTYPES[str(datatype).upper()]
+        return self._schema.vector_dtype
+
+    def document_key(self, document_url: str) -> str:
+        return document_record_key(self.index_name, document_url)
+
+    def _write_documents(self, pipeline, metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # queue one document record per document_url, return the chunk metadata
+        chunk_metadatas = []
+        documents = {}
+        for metadata in metadatas:
+            chunk, document = split_document_fields(metadata)
+            chunk_metadatas.append(chunk)
+            if document is not None:
+                documents[document["document_url"]] = document
+        for document_url, document in documents.items():
+            pipeline.hset(self.document_key(document_url), mapping=document)
+        return chunk_metadatas
+
+    def hydrate_documents(
+        self, results: List[Dict[str, Any]], return_fields: List[str]
+    ) -> List[Dict[str, Any]]:
+        """Adds the requested document fields to search results with one pipelined lookup.
+
+        Args:
+            results (List[Dict[str, Any]]): search results, with a document_url if
+                any document field was requested.
+            return_fields (List[str]): Fields the caller asked for.
+
+        Returns:
+            List[Dict[str, Any]]: the same results, with their document fields.
+        """
+        fields = [field for field in return_fields if field in schema.document_fields]
+        if fields:
+            document_urls = list(
+                dict.fromkeys(
+                    res["document_url"] for res in results if res.get("document_url")
+                )
+            )
+            pipeline = self.client.pipeline(transaction=False)
+            for document_url in document_urls:
+                pipeline.hmget(self.document_key(document_url), fields)
+            documents = dict(zip(document_urls, pipeline.execute()))
+
+            for res in results:
+                values = documents.get(res.get("document_url"))
+                if values is None:
+                    continue
+                for field, value in zip(fields, values):
+                    # chunks written before the split still carry their own copy
+                    if value is not None:
+                        res[field] = value.decode("utf-8") if isinstance(value, bytes) else value
+
+        if "document_url" not in return_fields:
+            for res in results:
+                res.pop("document_url", None)
+        return results
+
+    def knn_search(
+        self,
+        embedding: np.ndarray,
+        k: int,
+        return_fields: List[str],
+        ef_runtime: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """KNN search using a precomputed embedding.
+
+        Args:
+            embedding (np.ndarray): Query embedding.
+            k (int): Max number of results to return
+            return_fields (List[str]): Fields to return for each result.
+            ef_runtime (Optional[int]): HNSW candidate list size for this query.
+                Ignored for FLAT indexes.
+            filters (Optional[Dict[str, Any]]): Pre-filter applied inside the KNN query.
+                None searches every item.
+
+        Returns:
+            List[Dict[str, Any]]: id, requested fields and relevance "score" of each result.
+        """
+        vector_key = self._schema.content_vector_key
+        self.check_filter_fields(filters)
+        filter_expression = redis_filter_expression(filters)
+        params_dict = {
+            "vector": np.asarray(embedding, dtype=self.index_vector_dtype).tobytes()
+        }
+
+        num_candidates = k
+        if self.rescore_factor > 0:
+            num_candidates = k * self.rescore_factor
+
+        knn_args = ""
+        # FLAT indexes reject EF_RUNTIME
+        if ef_runtime and self.index_algorithm() == "HNSW":
+            knn_args = " EF_RUNTIME $ef_runtime"
+            params_dict["ef_runtime"] = int(ef_runtime)
+
+        search_fields = with_document_url(return_fields)
+        query_fields = search_fields
+        if self.rescore_factor > 0:
+            query_fields = search_fields + [RESCORE_ROW_KEY]
+        redis_query = apply_return_fields(
+            Query(f"({filter_expression})=>[KNN {num_candidates} @{vector_key} $vector{knn_args} AS distance]"),
+            query_fields,
+            self.storage_type,
+        )
+        redis_query = (
+            redis_query.return_field("distance")
+            .sort_by("distance")
+            .paging(0, num_candidates)
+            .dialect(2)
+        )
+
+        results = self.client.ft(self.search_index_name or self.index_name).search(redis_query, params_dict)
+        docs = results.docs
+        distances = [self._calculate_fp_distance(result.distance) for result in docs]
+
+        if self.rescore_factor > 0 and docs:
+            docs, distances = self._rescore(embedding, docs, distances, k)
+
+        relevance_score_fn = self._select_relevance_score_fn()
+
+        output = []
+        for result, distance in zip(docs, distances):
+            res = {"id": result.id}
+            for field in search_fields:
+                if hasattr(result, field):
+                    res[field] = getattr(result, field)
+            res["score"] = relevance_score_fn(distance)
+            output.append(decode_result_fields(res, self.storage_type))
+
+        return self.hydrate_documents(output, return_fields)
+
+    def _rescore(
+        self, embedding: np.ndarray, docs: List[Any], distances: List[float], k: int
+    ):
+        # rerank the quantized candidates by their exact distance to the query,
+        # the results carry the row of their full precision vector on disk
+        candidates, rows = [], []
+        for i, result in enumerate(docs):
+            row = getattr(result, RESCORE_ROW_KEY, None)
+            # items written before rescoring was enabled keep their quantized distance
+            if row is not None:
+                candidates.append(i)
+                rows.append(int(row))
+
+        distances = np.asarray(distances, dtype=np.float32)
+        if rows:
+            distance_metric = str(self._schema.content_vector.distance_metric).upper()
+            distance_metric = distance_metric.split(".")[-1]
+            distances[candidates] = exact_distances(
+                embedding, self.full_vectors.read(rows), distance_metric
+            )
+        order = np.argsort(distances, kind="stable")[:k]
+        return [docs[i] for i in order], [float(distances[i]) for i in order]
+
+    def add_embedded_texts(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        keys: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Writes already embedded texts with one pipelined round trip.
+
+        Stores the same hash layout as langchain's add_texts, or one JSON document
+        per text for json storage. Document fields go to one record per document_url.
+
+        Args:
+            texts (List[str]): Texts that were embedded.
+            metadatas (List[Dict[str, Any]]): Metadata saved alongside each vector.
+            embeddings (np.ndarray): One embedding per text.
+            keys (Optional[List[str]]): redis keys to write to. Random keys if None.
+
+        Returns:
+            List[str]: redis keys of the new items.
+        """
+        content_key = self._schema.content_key
+        vector_key = self._schema.content_vector_key
+        vector_dtype = self.index_vector_dtype
+
+        if keys is None:
+            keys = [f"{self.key_prefix}:{uuid.uuid4().hex}" for _ in texts]
+
+        # the full precision copies are on disk before any chunk points at them
+        rows = [None] * len(keys)
+        if self.rescore_factor > 0:
+            rows = self.full_vectors.allocate(len(keys))
+            self.full_vectors.write(rows, embeddings)
+
+        if self.storage_type == "json":
+            pipeline = self.client.json().pipeline(transaction=False)
+            metadatas = self._write_documents(pipeline, metadatas)
+            for key, text, metadata, embedding, row in zip(keys, texts, metadatas, embeddings, rows):
+                # RedisJSON stores every number as a double, storing a quantized
+                # vector would save nothing, only the index quantizes it
+                document = {
+                    content_key: text,
+                    vector_key: np.asarray(embedding, dtype=np.float32).tolist(),
+                    **metadata,
+                }
+                if row is not None:
+                    document[RESCORE_ROW_KEY] = row
+                pipeline.set(key, "$", document)
+            pipeline.execute()
+            return keys
+
+        pipeline = self.client.pipeline(transaction=False)
+        metadatas = self._write_documents(pipeline, metadatas)
+        for key, text, metadata, embedding, row in zip(keys, texts, metadatas, embeddings, rows):
+            mapping = {
+                content_key: text,
+                vector_key: np.asarray(embedding, dtype=vector_dtype).tobytes(),
+                **metadata,
+            }
+            if row is not None:
+                mapping[RESCORE_ROW_KEY] = row
+            pipeline.hset(key, mapping=mapping)
+        pipeline.execute()
+
+        return keys
+
+    def _redis_results_as_dicts(
+        self, results, return_fields: List[str]
+    ) -> List[Dict[str, Any]]:
+        # redis-py sets payload on every result, the others are dropped unless asked for
+        dropped = [
+            field
+            for field in ["payload", "content", "content_vector"]
+            if field not in return_fields
+        ]
+        output = []
+        for result in results.docs:
+            res = {k: v for k, v in result.__dict__.items() if k not in dropped}
+            output.append(decode_result_fields(res, self.storage_type))
+        return output
+
+    def _keyword_query(self, search_type: str, field: str, value: str) -> Optional[str]:
+        if search_type == "union":
+            # keywords in any order
+            return f"@{field}:({value})"
+        if search_type == "exact":
+            # tag syntax "@field:{value}" for a tag field, text syntax "@field:\"value\"" otherwise
+            if field in schema.tag_fields:
+                return str(Tag(field) == value)
+            return str(Text(field) == value)
+        if search_type == "fuzzy":
+            # TODO: can make it configurable how much Levenshtein distance to allow
+            # For example, one % is used for stricter matches, and three %%% for looser matches
+            keywords = [f"%%{x}%%" for x in value.split() if x not in REDIS_STOP_WORDS]
+            return str(Text(field) % "".join(keywords))
+        if search_type == "wildcard":
+            if "*" not in value:
+                raise ValueError("wildcard search value must contain *")
+            return str(Text(field) % value)
+        if search_type == "any":
+            keywords = [
+                x for x in re.findall(r"\w+", value.lower()) if x not in REDIS_STOP_WORDS
+            ]
+            if not keywords:
+                return None
+            return f"@{field}:({'|'.join(keywords)})"
+        raise ValueError(f"search_type {search_type} is not valid")
+
+    def keyword_search(
+        self,
+        search_type: str,
+        field: str,
+        value: str,
+        k: int,
+        return_fields: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Keyword search scored with BM25.
+
+        Args:
+            search_type (str): "union" for keywords in any order, "exact" for a TAG value or
+                a phrase of a TEXT field, "fuzzy" for a Levenshtein match, "wildcard" for
+                a value with * in it, and "any" for items with at least one keyword.
+            field (str): field to search
+            value (str): value to match on
+            k (int): Max number of results to return
+            return_fields (List[str]): Fields to return for each result.
+            filters (Optional[Dict[str, Any]]): Only items matching filters are searched.
+
+        Returns:
+            List[Dict[str, Any]]: id, requested fields and BM25 "score" of each result.
+        """
+        query_string = self._keyword_query(search_type, field, value)
+        if query_string is None:
+            return []
+        self.check_filter_fields(filters)
+        filter_expression = redis_filter_expression(filters)
+        if filter_expression != "*":
+            query_string = f"({filter_expression}) {query_string}"
+
+        # document fields are not in the chunk index, they are looked up by document_url
+        query = Query(query_string).with_scores().scorer("BM25")
+        query = apply_return_fields(query, with_document_url(return_fields), self.storage_type)
+        results = self.client.ft(self.search_index_name or self.index_name).search(query.paging(offset=0, num=k))
+
+        return self.hydrate_documents(
+            self._redis_results_as_dicts(results, return_fields), return_fields
+        )
+
+    def find_document_keys(self, document_url: str) -> List[str]:
+        return self.find_keys(str(Tag("document_url") == document_url))
+
+    def find_keys(self, filter_expression: str, max_keys: int = 10000) -> List[str]:
+        """Returns the redis keys of every item matching filter_expression.
+
+        Args:
+            filter_expression (str): redis search query, e.g. a TAG match.
+            max_keys (int): Max number of keys to return.
+
+        Returns:
+            List[str]: redis keys of the matching items.
+        """
+        redis_query = Query(filter_expression).no_content().paging(0, max_keys)
+        results = self.client.ft(self.index_name).search(redis_query)
+        return [result.id for result in results.docs]
+
+    def _full_vector_rows(self, keys: List[str]) -> List[int]:
+        # rows on disk of the chunks about to be deleted, so they can be reused
+        if self.rescore_factor <= 0 or not keys:
+            return []
+        pipeline = self.client.pipeline(transaction=False)
+        for key in keys:
+            if self.storage_type == "json":
+                pipeline.execute_command("JSON.GET", key, f"$.{RESCORE_ROW_KEY}")
+            else:
+                pipeline.hget(key, RESCORE_ROW_KEY)
+        rows = []
+        for value in pipeline.execute():
+            if value is not None and self.storage_type == "json":
+                value = next(iter(json.loads(value)), None)
+            if value is not None:
+                rows.append(int(value))
+        return rows
+
+    def update_metadata_and_delete(
+        self,
+        keys: List[str],
+        metadatas: List[Dict[str, Any]],
+        delete_keys: List[str],
+    ) -> None:
+        """Overwrites metadata fields of existing items and deletes other items,
+        in one pipelined round trip. Vectors are left untouched.
+
+        Args:
+            keys (List[str]): redis keys of the items to update.
+            metadatas (List[Dict[str, Any]]): Metadata fields to write for each item.
+            delete_keys (List[str]): redis keys of the items to delete.
+        """
+        deleted_rows = self._full_vector_rows(delete_keys)
+        if self.storage_type == "json":
+            pipeline = self.client.json().pipeline(transaction=False)
+            metadatas = self._write_documents(pipeline, metadatas)
+            for key, metadata in zip(keys, metadatas):
+                for field, value in metadata.items():
+                    pipeline.set(key, f"$.{field}", value)
+            # the JSON pipeline's delete is JSON.DEL, one key at a time
+            for key in delete_keys:
+                pipeline.delete(key)
+        else:
+            pipeline = self.client.pipeline(transaction=False)
+            metadatas = self._write_documents(pipeline, metadatas)
+            for key, metadata in zip(keys, metadatas):
+                pipeline.hset(key, mapping=metadata)
+            if delete_keys:
+                pipeline.delete(*delete_keys)
+        pipeline.execute()
+        if deleted_rows:
+            self.full_vectors.free(deleted_rows)
+
+    def delete_chunks(self, keys: List[str]) -> int:
+        """Deletes chunks, and the records of documents that have no chunks left.
+
+        Args:
+            keys (List[str]): redis keys of the chunks to delete.
+
+        Returns:
+            int: Number of chunks deleted.
+        """
+        if not keys:
+            return 0
+
+        pipeline = self.client.pipeline(transaction=False)
+        for key in keys:
+            if self.storage_type == "json":
+                pipeline.execute_command("JSON.GET", key, "$.document_url")
+            else:
+                pipeline.hget(key, "document_url")
+        document_urls = set()
+        for value in pipeline.execute():
+            if value is None:
+                continue
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+            if self.storage_type == "json":
+                value = next(iter(json.loads(value)), None)
+            if value:
+                document_urls.add(value)
+
+        deleted_rows = self._full_vector_rows(keys)
+        items_deleted = self.client.delete(*keys)
+        if deleted_rows:
+            self.full_vectors.free(deleted_rows)
+
+        for document_url in document_urls:
+            if not self.find_keys(str(Tag("document_url") == document_url), max_keys=1):
+                self.client.delete(self.document_key(document_url))
+
+        return items_deleted
@@ -0,0 +1,189 @@
+import fnmatch
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault("TRITON_HOST", "localhost")
+
+from batcher import EmbeddingBatcher  # noqa: E402
+from embedding_cache import PassageEmbeddingCache, QueryEmbeddingCache  # noqa: E402
+from embeddings import EMBEDDING_DIMS  # noqa: E402
+from numpy_backend import NumpyVectorBackend  # noqa: E402
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        results = [
+            getattr(self.redis_client, name)(*args, **kwargs)
+            for name, args, kwargs in self.calls
+        ]
+        self.calls = []
+        return results
+
+
+class FakeSearchIndex:
+    def __init__(self, redis_client, name):
+        self.redis_client = redis_client
+        self.name = name
+
+    def info(self):
+        if self.name not in self.redis_client.indexes:
+            raise redis.ResponseError(f"{self.name}: no such index")
+        return self.redis_client.indexes[self.name]
+
+    def create_index(self, fields, definition):
+        args = definition.args
+        num_prefixes = args[args.index("PREFIX") + 1]
+        prefixes = args[args.index("PREFIX") + 2 : args.index("PREFIX") + 2 + num_prefixes]
+        self.redis_client.indexes[self.name] = {
+            "index_name": self.name,
+            "index_definition": [
+                b"key_type", args[1].encode(), b"prefixes", [p.encode() for p in prefixes]
+            ],
+            "attributes": [],
+        }
+
+
+class FakeRedis:
+    """In memory stand-in for the redis commands the caches, files and snapshots use.
+
+    Indexes only keep their definition, for FT.INFO, FT.CREATE and FT._LIST.
+    """
+
+    def __init__(self):
+        self.values = {}
+        # index name -> FT.INFO
+        self.indexes = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        self.values[key] = value
+        return True
+
+    def incr(self, key):
+        return self.incrby(key, 1)
+
+    def incrby(self, key, amount):
+        self.values[key] = str(int(self.values.get(key, b"0")) + amount).encode("utf-8")
+        return int(self.values[key])
+
+    def rpush(self, key, *values):
+        items = self.values.setdefault(key, [])
+        items.extend(str(value).encode("utf-8") for value in values)
+        return len(items)
+
+    def lpop(self, key, count=None):
+        items = self.values.get(key) or []
+        popped, self.values[key] = items[: count or 1], items[count or 1 :]
+        if count is None:
+            return popped[0] if popped else None
+        return popped or None
+
+    def delete(self, *keys):
+        return sum(self.values.pop(key, None) is not None for key in keys)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        mapping = dict(mapping or {})
+        if field is not None:
+            mapping[field] = value
+        fields = self.values.setdefault(key, {})
+        for field, value in mapping.items():
+            if not isinstance(value, bytes):
+                value = str(value).encode("utf-8")
+            fields[field.encode("utf-8")] = value
+        return len(mapping)
+
+    def hdel(self, key, *fields):
+        values = self.values.get(key) or {}
+        return sum(values.pop(field.encode("utf-8"), None) is not None for field in fields)
+
+    def hmget(self, key, fields):
+        values = self.values.get(key) or {}
+        return [values.get(field.encode("utf-8")) for field in fields]
+
+    def hgetall(self, key):
+        return dict(self.values.get(key) or {})
+
+    def scan_iter(self, match, count=None):
+        keys = [key for key in self.values if fnmatch.fnmatchcase(key, match)]
+        return [key.encode("utf-8") for key in keys]
+
+    def execute_command(self, *args):
+        if args[0] == "FT._LIST":
+            return [name.encode("utf-8") for name in self.indexes]
+        raise NotImplementedError(args[0])
+
+    def ft(self, index_name):
+        return FakeSearchIndex(self, index_name)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def fake_embedding(text: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIMS).astype(np.float32)
+
+
+class FakeTriton:
+    """Replaces the Triton call of an embedder, and records the texts it embeds"""
+
+    def __init__(self):
+        self.texts = []
+
+    async def __call__(self, texts):
+        self.texts.extend(texts)
+        return np.stack([fake_embedding(text) for text in texts])
+
+
+@pytest.fixture
+def fake_triton(monkeypatch):
+    import main
+
+    triton = FakeTriton()
+    monkeypatch.setattr(main.embedder, "_aembed_with_triton", triton)
+    monkeypatch.setattr(
+        main.embedder, "passage_cache", PassageEmbeddingCache(FakeRedis())
+    )
+    return triton
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path, fake_triton):
+    """TestClient of the router, with every asset type stored in a NumpyVectorBackend"""
+    from fastapi.testclient import TestClient
+    import main
+
+    vectorstores = {
+        asset_type: NumpyVectorBackend(str(tmp_path / asset_type), asset_type, EMBEDDING_DIMS)
+        for asset_type in main.ASSET_TYPES
+    }
+    monkeypatch.setattr(main, "vectorstores", vectorstores)
+    monkeypatch.setattr(main, "search_cache", None)
+    # queries embedded by earlier tests must not be served from the caches
+    monkeypatch.setattr(main.embedder, "query_cache", QueryEmbeddingCache())
+    monkeypatch.setattr(main, "query_batcher", EmbeddingBatcher(main.embedder))
+    return TestClient(main.app)
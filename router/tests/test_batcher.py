@@ -0,0 +1,30 @@
+import asyncio
+
+import numpy as np
+
+from batcher import EmbeddingBatcher
+from conftest import FakeTriton, fake_embedding
+from embedding_cache import QueryEmbeddingCache
+from embeddings import TritonHFEmbeddings
+
+
+def test_concurrent_queries_share_one_triton_batch():
+    embedder = TritonHFEmbeddings(triton_host="triton", query_cache=QueryEmbeddingCache())
+    triton = FakeTriton()
+    embedder._aembed_with_triton = triton
+    batcher = EmbeddingBatcher(embedder, max_batch_size=8, window_ms=50)
+    texts = ["query: a", "query: b", "query: a", "query: c"]
+
+    async def embed():
+        vectors = await asyncio.gather(*[batcher.aembed_query_array(text) for text in texts])
+        await batcher.aclose()
+        return vectors
+
+    vectors = asyncio.run(embed())
+
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_array_equal(vector, fake_embedding(text))
+    # duplicates in the same window take one slot
+    assert triton.texts == ["query: a", "query: b", "query: c"]
+    stats = batcher.stats()
+    assert stats["batches_sent"] == 1 and stats["queries_batched"] == 4
@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+
+from conftest import FakeRedis, fake_embedding
+from embedding_cache import PassageEmbeddingCache, QueryEmbeddingCache
+
+
+CHUNK = {
+    "text": "Many CUDA applications running on multi-GPU platforms usually use a single GPU.",
+    "document_title": "Improving CUDA Initialization Times Using cgroups in Certain Scenarios",
+    "document_url": "https://developer.nvidia.com/blog/improving-cuda-initialization-times/",
+    "document_date": "2024-01-05T22:14:41",
+    "contains_code": [False],
+}
+
+
+def test_get_many_counts_hits_and_misses():
+    cache = PassageEmbeddingCache(FakeRedis())
+    keys = cache.make_keys(["cached", "not cached"], "model", "1")
+    cache.put_many(keys[:1], np.stack([fake_embedding("cached")]))
+
+    vectors = cache.get_many(keys)
+
+    np.testing.assert_array_equal(vectors[0], fake_embedding("cached"))
+    assert vectors[1] is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_query_cache_evicts_the_least_recently_used_and_expired_vectors(monkeypatch):
+    cache = QueryEmbeddingCache(max_size=2, ttl=60)
+    keys = [cache.make_key(text, "model", "1") for text in ["a", "b", "c"]]
+    # whitespace does not change what the tokenizer sees
+    assert cache.make_key("  a \n", "model", "1") == keys[0]
+    assert cache.make_key("a", "model", "2") != keys[0]
+
+    cache.put(keys[0], [1.0])
+    cache.put(keys[1], [2.0])
+    cache.get(keys[0])
+    cache.put(keys[2], [3.0])
+    assert cache.get(keys[1]) is None
+    np.testing.assert_array_equal(cache.get(keys[0]), [1.0])
+    assert cache.stats()["evictions"] == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get(keys[0]) is None
+
+
+def test_insert_same_passage_twice_embeds_it_once(client, fake_triton):
+    for _ in range(2):
+        response = client.post(
+            "/data/insert", json={"asset_type": "techblogs", "chunks": [dict(CHUNK)]}
+        )
+        assert response.status_code == 200
+
+    assert len(fake_triton.texts) == 1
+    import main
+
+    assert main.embedder.passage_cache.stats() == {"hits": 1, "misses": 1}
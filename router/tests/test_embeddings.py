@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from conftest import fake_embedding
+from embedding_cache import QueryEmbeddingCache
+from embeddings import TritonClientPool, TritonHFEmbeddings
+
+
+def test_pool_reuses_its_clients_up_to_its_size(monkeypatch):
+    pool = TritonClientPool("triton:8000", size=2)
+    created = []
+
+    def create_client():
+        created.append(object())
+        return created[-1]
+
+    monkeypatch.setattr(pool, "_create_client", create_client)
+
+    with pool.client() as first:
+        with pool.client() as second:
+            assert first is not second
+    with pool.client() as again:
+        assert again in created
+    assert len(created) == 2
+
+    # every client is busy, a third caller waits for one to come back
+    borrowed = []
+    with pool.client(), pool.client():
+
+        def borrow():
+            with pool.client() as triton_client:
+                borrowed.append(triton_client)
+
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        thread.join(0.1)
+        assert borrowed == []
+    thread.join(5)
+    assert len(borrowed) == 1 and len(created) == 2
+
+
+def test_http_requests_ask_for_a_binary_output_tensor():
+    embedder = TritonHFEmbeddings(triton_host="triton")
+    inputs, outputs = embedder._build_triton_request(["query: cuda"])
+
+    assert list(inputs[0].shape()) == [1]
+    assert outputs[0]._get_tensor() == {"name": "output", "parameters": {"binary_data": True}}
+
+
+def test_async_queries_wait_for_triton_concurrently():
+    embedder = TritonHFEmbeddings(triton_host="triton", query_cache=QueryEmbeddingCache())
+    in_flight, max_in_flight = [], []
+
+    async def triton(texts):
+        in_flight.append(texts)
+        max_in_flight.append(len(in_flight))
+        # the event loop serves the other query meanwhile
+        await asyncio.sleep(0.01)
+        in_flight.remove(texts)
+        return np.stack([fake_embedding(text) for text in texts])
+
+    embedder._aembed_with_triton = triton
+
+    async def embed():
+        return await asyncio.gather(
+            embedder.aembed_query_array("query: a"), embedder.aembed_query_array("query: b")
+        )
+
+    vectors = asyncio.run(embed())
+    assert max(max_in_flight) == 2
+    np.testing.assert_array_equal(vectors[1], fake_embedding("query: b"))
+
+    # the second time it comes from the query cache
+    asyncio.run(embedder.aembed_query_array("query: a"))
+    assert len(max_in_flight) == 2
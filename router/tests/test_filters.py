@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import main
+from backend import MissingFilterFieldsError
+from docs.search.semantic import SemanticSearchFilter
+from test_embedding_cache import CHUNK
+from test_vectorstore import FakeSearchClient, _vectorstore
+
+
+def _insert(client, chunks):
+    response = client.post("/data/insert", json={"asset_type": "techblogs", "chunks": chunks})
+    assert response.status_code == 200
+
+
+def _search(client, search_filter):
+    response = client.post(
+        "/search/semantic",
+        json={
+            "query": "CUDA initialization",
+            "asset_types": ["techblogs"],
+            "k": 10,
+            "return_fields": ["document_url"],
+            "filter": search_filter,
+        },
+    )
+    assert response.status_code == 200
+    return sorted(result["document_url"] for result in response.json()[0]["results"])
+
+
+@pytest.fixture
+def posts(client, fake_triton):
+    _insert(
+        client,
+        [
+            dict(CHUNK, text="January post.", document_url="https://blog/jan", document_date="2024-01-31T23:30:00", contains_code=[True]),
+            dict(CHUNK, text="February post.", document_url="https://blog/feb", document_date="2024-02-01T08:00:00", contains_code=[False]),
+        ],
+    )
+    return client
+
+
+def test_date_only_upper_bound_includes_the_whole_day(posts):
+    assert _search(posts, {"document_date_to": "2024-01-31"}) == ["https://blog/jan"]
+    assert _search(posts, {"document_date_from": "2024-02-01"}) == ["https://blog/feb"]
+    assert _search(posts, {"document_date_to": "2024-01-31T12:00:00"}) == []
+
+
+def test_tag_filters(posts):
+    assert _search(posts, {"contains_code": True}) == ["https://blog/jan"]
+    assert _search(posts, {"document_url": ["https://blog/feb"]}) == ["https://blog/feb"]
+    assert _search(posts, {"contains_code": False, "document_url": "https://blog/jan"}) == []
+
+
+def test_build_semantic_filter():
+    filters = main._build_semantic_filter(
+        SemanticSearchFilter(document_date_from="2024-01-01", document_date_to="2024-01-01", contains_code=True)
+    )
+    low, high = filters["document_date_epoch"]
+    assert high - low == pytest.approx(24 * 3600, abs=0.01)
+    assert filters["chunk_contains_code"] == ["true"]
+    assert main._build_semantic_filter(None) is None
+
+
+def test_filter_on_a_field_the_live_index_lacks_is_a_bad_request(monkeypatch):
+    # an index created before chunk_contains_code was added to the schema
+    rds = _vectorstore(FakeSearchClient("HNSW", "FLOAT32"))
+    with pytest.raises(MissingFilterFieldsError) as error:
+        rds.knn_search(np.zeros(4, np.float32), 3, ["content"], filters={"chunk_contains_code": ["true"]})
+    assert error.value.fields == ["chunk_contains_code"]
+
+    monkeypatch.setattr(main, "vectorstores", {"techblogs": rds})
+    monkeypatch.setattr(main, "vectorstore_versions", {})
+    with pytest.raises(HTTPException) as http_error:
+        main._semantic_search(
+            "techblogs", np.zeros(4, np.float32), 3, ["content"], filters={"chunk_contains_code": ["true"]}
+        )
+    assert http_error.value.status_code == 400
+    assert "chunk_contains_code" in json.dumps(http_error.value.detail)
@@ -0,0 +1,51 @@
+import numpy as np
+
+from conftest import FakeRedis
+from full_vectors import FullVectorFile
+from quantization_report import recall_report
+
+
+def test_rows_of_deleted_vectors_are_reused(tmp_path):
+    client = FakeRedis()
+    full_vectors = FullVectorFile(client, str(tmp_path), "techblogs_v1", 8)
+    vectors = np.arange(3 * 8, dtype=np.float32).reshape(3, 8)
+
+    rows = full_vectors.allocate(3)
+    full_vectors.write(rows, vectors)
+    assert rows == [0, 1, 2]
+    np.testing.assert_array_equal(full_vectors.read([2, 0]), vectors[[2, 0]])
+
+    full_vectors.free([1])
+    assert full_vectors.allocate(2) == [1, 3]
+
+    # another router reads rows written past the end of its own mapping
+    other = FullVectorFile(client, str(tmp_path), "techblogs_v1", 8)
+    full_vectors.write([5000], vectors[:1])
+    np.testing.assert_array_equal(other.read([5000]), vectors[:1])
+
+    full_vectors.remove()
+    assert not (tmp_path / "techblogs_v1.f32").exists()
+    assert full_vectors.allocate(1) == [0]
+
+
+def test_a_lost_file_is_not_complete(tmp_path):
+    client = FakeRedis()
+    full_vectors = FullVectorFile(client, str(tmp_path), "techblogs", 8)
+    assert full_vectors.is_complete()
+
+    full_vectors.write(full_vectors.allocate(3), np.ones((3, 8), dtype=np.float32))
+    assert full_vectors.is_complete()
+
+    # the container was recreated without the volume, the rows are still allocated
+    (tmp_path / "techblogs.f32").unlink()
+    assert not FullVectorFile(client, str(tmp_path), "techblogs", 8).is_complete()
+
+
+def test_rescoring_keeps_the_float16_memory_savings():
+    vectors = np.random.default_rng(0).standard_normal((50, 16)).astype(np.float32)
+    report = recall_report(vectors, k=5, num_queries=10, rescore_factors=[0, 4], seed=0)
+    float16 = {row["rescore_factor"]: row for row in report if row["datatype"] == "FLOAT16"}
+
+    assert float16[0]["vector_bytes_per_chunk"] == float16[4]["vector_bytes_per_chunk"] == 2 * 2 * 16
+    assert float16[4]["disk_bytes_per_chunk"] == 4 * 16
+    assert float16[4]["chunks_per_float32_chunk"] == 2
@@ -0,0 +1,42 @@
+import pytest
+
+from fusion import fuse_results
+from test_search import _insert
+
+
+SEMANTIC = [{"id": "a", "score": 0.9, "content": "A"}, {"id": "b", "score": 0.8, "content": "B"}]
+KEYWORD = [{"id": "b", "score": 12.0, "content": "B"}, {"id": "c", "score": 6.0, "content": "C"}]
+
+
+def test_rrf_ranks_items_found_by_both_searches_first():
+    fused = fuse_results(SEMANTIC, KEYWORD, 3, rrf_k=60)
+
+    assert [result["id"] for result in fused] == ["b", "a", "c"]
+    assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert (fused[0]["semantic_score"], fused[0]["keyword_score"]) == (0.8, 12.0)
+    assert "keyword_score" not in fused[1] and "semantic_score" not in fused[2]
+
+
+def test_weighted_fusion_scales_bm25_by_the_best_score():
+    fused = fuse_results(SEMANTIC, KEYWORD, 2, method="weighted", semantic_weight=0.5)
+
+    assert [result["id"] for result in fused] == ["b", "a"]
+    assert fused[0]["score"] == pytest.approx(0.5 * 0.8 + 0.5 * 1.0)
+    with pytest.raises(ValueError):
+        fuse_results(SEMANTIC, KEYWORD, 2, method="max")
+
+
+def test_hybrid_search_fuses_both_rankings_of_each_asset_type(client, fake_triton):
+    _insert(client, "techblogs", ["NVLink connects GPUs.", "Tensor cores speed up matrix math."])
+
+    response = client.post(
+        "/search/hybrid",
+        json={"query": "NVLink", "asset_types": ["techblogs"], "k": 2, "return_fields": ["content"]},
+    )
+
+    assert response.status_code == 200
+    results = response.json()[0]["results"]
+    assert len(results) == 2
+    # only the NVLink chunk matches the keyword search, so it ranks first
+    assert results[0]["content"].endswith("NVLink connects GPUs.")
+    assert "keyword_score" in results[0] and "keyword_score" not in results[1]
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+import redis
+
+import indexes
+import main
+from conftest import FakeRedis
+
+
+class FakeStore:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+
+    def keyword_search(self, *args):
+        if self.fail:
+            raise redis.ResponseError("techblogs: no such index")
+        return [{"id": self.name}]
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    state = {"techblogs": (0, None)}
+    monkeypatch.setattr(main.indexes, "read_version_state", lambda client, asset_type: state[asset_type])
+    monkeypatch.setattr(
+        main,
+        "_open_index_versions",
+        lambda asset_type, current, building: FakeStore(f"v{current}"),
+    )
+    monkeypatch.setattr(main, "vectorstores", {"techblogs": FakeStore("v0")})
+    monkeypatch.setattr(main, "vectorstore_versions", {"techblogs": (0, None)})
+    monkeypatch.setattr(main, "version_checks", {"techblogs": 0.0})
+    return state
+
+
+def test_writes_follow_a_reindex_of_another_router(versions):
+    assert main._get_vectorstore("techblogs", 0).name == "v0"
+
+    versions["techblogs"] = (1, None)
+    # searches only check the versions every INDEX_VERSION_CHECK_SECONDS
+    assert main._get_vectorstore("techblogs").name == "v0"
+    assert main._get_vectorstore("techblogs", 0).name == "v1"
+    assert main.vectorstore_versions["techblogs"] == (1, None)
+
+
+def test_failed_search_reopens_the_switched_version(versions):
+    main.vectorstores["techblogs"] = FakeStore("v0", fail=True)
+    main.version_checks["techblogs"] = time.monotonic()
+    versions["techblogs"] = (1, None)
+
+    results = main._keyword_search_asset_type("techblogs", "union", "content", "redis", 3, [])
+    assert results == [{"id": "v1"}]
+
+
+def test_failed_search_raises_if_the_versions_did_not_change(versions):
+    main.vectorstores["techblogs"] = FakeStore("v0", fail=True)
+
+    with pytest.raises(redis.ResponseError):
+        main._keyword_search_asset_type("techblogs", "union", "content", "redis", 3, [])
+
+
+def test_a_dead_reindex_stops_dual_writes_and_its_version_is_dropped(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(main, "redis_client", client)
+    monkeypatch.setattr(
+        main,
+        "_open_index_versions",
+        lambda asset_type, current, building: FakeStore(f"v{current}+v{building}"),
+    )
+    monkeypatch.setattr(main, "vectorstores", {"techblogs": FakeStore("v0+v1")})
+    monkeypatch.setattr(main, "vectorstore_versions", {"techblogs": (0, 1)})
+    monkeypatch.setattr(main, "version_checks", {"techblogs": 0.0})
+    dropped = []
+    monkeypatch.setattr(
+        main.reindex,
+        "drop_version",
+        lambda client, asset_type, index_name, *args: dropped.append(index_name),
+    )
+
+    indexes.write_version_state(client, "techblogs", 0, 1, lease_seconds=60)
+    assert main._get_vectorstore("techblogs", 0).name == "v0+v1"
+    assert indexes.expired_build(client, "techblogs") is None
+
+    # the router running the reindex died and stopped renewing its lease
+    indexes.write_version_state(client, "techblogs", 0, 1, lease_seconds=-1)
+    assert main._get_vectorstore("techblogs", 0).name == "v0+vNone"
+    assert indexes.expired_build(client, "techblogs") == (0, 1)
+
+    main._drop_expired_build("techblogs")
+    assert dropped == ["techblogs_v1"]
+    assert indexes.read_version_state(client, "techblogs") == (0, None)
+    assert indexes.expired_build(client, "techblogs") is None
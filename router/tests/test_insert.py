@@ -0,0 +1,57 @@
+import asyncio
+
+import numpy as np
+
+import main
+from conftest import fake_embedding
+from test_embedding_cache import CHUNK
+
+
+def test_insert_embeds_batches_concurrently_and_writes_every_chunk(client, monkeypatch):
+    monkeypatch.setattr(main, "INSERT_CONCURRENCY", 2)
+    batches, in_flight, max_in_flight = [], [], []
+
+    async def triton(texts):
+        batches.append(len(texts))
+        in_flight.append(texts)
+        max_in_flight.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(texts)
+        return np.stack([fake_embedding(text) for text in texts])
+
+    monkeypatch.setattr(main.embedder, "_aembed_with_triton", triton)
+
+    chunks = [dict(CHUNK, text=f"Chunk {i} of a long post.") for i in range(40)]
+    response = client.post("/data/insert", json={"asset_type": "techblogs", "chunks": chunks})
+
+    assert response.status_code == 200
+    assert sorted(batches) == [8, 16, 16]
+    assert max(max_in_flight) == 2
+    assert main.vectorstores["techblogs"].stats()["num_items"] == 40
+
+
+def test_document_fields_are_stored_once_and_returned_with_every_chunk(client):
+    chunks = [
+        dict(CHUNK, text=f"Part {i} of the post.", document_full_text="The whole post.")
+        for i in range(2)
+    ]
+    response = client.post("/data/insert", json={"asset_type": "techblogs", "chunks": chunks})
+    assert response.status_code == 200
+
+    backend = main.vectorstores["techblogs"]
+    assert list(backend._documents) == [CHUNK["document_url"]]
+    assert all("document_full_text" not in metadata for metadata in backend._metadata.values())
+
+    response = client.post(
+        "/search/semantic",
+        json={
+            "query": "part of the post",
+            "asset_types": ["techblogs"],
+            "return_fields": ["document_full_text", "document_date"],
+        },
+    )
+    results = response.json()[0]["results"]
+    assert len(results) == 2
+    for result in results:
+        assert result["document_full_text"] == "The whole post."
+        assert result["document_date"] == CHUNK["document_date"]
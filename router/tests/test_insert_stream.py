@@ -0,0 +1,48 @@
+import json
+
+from test_embedding_cache import CHUNK
+
+
+def test_insert_stream_reports_each_line(client, fake_triton):
+    lines = [
+        json.dumps(dict(CHUNK, text=f"Chunk number {i} of the streamed document."))
+        for i in range(3)
+    ]
+    lines.insert(1, json.dumps({"document_title": "no text"}))
+    body = "\n".join(lines) + "\n"
+
+    response = client.post(
+        "/data/insert/stream",
+        params={"asset_type": "techblogs"},
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(record["line"] for record in records) == [1, 2, 3, 4]
+    errors = [record for record in records if "error" in record]
+    assert errors == [{"line": 2, "error": "chunk is missing text"}]
+    ids = [record["id"] for record in records if "id" in record]
+    assert len(ids) == 3 and all(key.startswith("doc:techblogs:") for key in ids)
+    assert len(fake_triton.texts) == 3
+
+
+def test_insert_stream_reports_a_malformed_chunk_and_goes_on(client, fake_triton):
+    lines = [
+        json.dumps(dict(CHUNK, text="A well formed chunk.")),
+        json.dumps(dict(CHUNK, text="A chunk with a numeric title.", document_title=42)),
+        json.dumps(dict(CHUNK, text="Another well formed chunk.")),
+    ]
+
+    response = client.post(
+        "/data/insert/stream",
+        params={"asset_type": "techblogs"},
+        content="\n".join(lines) + "\n",
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    records = {record["line"]: record for record in map(json.loads, response.text.splitlines())}
+    assert "error" in records[2]
+    assert "id" in records[1] and "id" in records[3]
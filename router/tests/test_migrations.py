@@ -0,0 +1,49 @@
+import numpy as np
+
+import indexes
+from conftest import FakeRedis
+from embeddings import EMBEDDING_DIMS
+from migrations import migrate_in_place
+from vectorstore import document_record_key
+
+
+DOCUMENT_URL = "https://example.com/post"
+
+
+def test_migration_fills_new_fields_from_stored_ones_without_touching_vectors():
+    client = FakeRedis()
+    indexes.create_index(client, "techblogs", "doc:techblogs", "hash", None, EMBEDDING_DIMS)
+    vector = np.ones(EMBEDDING_DIMS, dtype=np.float32).tobytes()
+    chunk = {"document_url": DOCUMENT_URL, "content_vector": vector}
+    # written before the filter fields existed
+    client.hset(
+        "doc:techblogs:old",
+        mapping=dict(chunk, document_date="2024-01-05T00:00:00", contains_code="[false, true]"),
+    )
+    # its document_date moved to the document record
+    client.hset("doc:techblogs:split", mapping=dict(chunk, contains_code="[false]"))
+    client.hset(
+        document_record_key("techblogs", DOCUMENT_URL), mapping={"document_date": "2024-01-05"}
+    )
+    client.hset(
+        "doc:techblogs:current",
+        mapping=dict(
+            chunk,
+            document_date="2024-01-05",
+            document_date_epoch=indexes.iso_to_epoch("2024-01-05"),
+            contains_code="[true]",
+            chunk_contains_code="true",
+        ),
+    )
+
+    counts = migrate_in_place(client, "techblogs", batch_size=2)
+
+    assert counts == {"chunks_read": 3, "chunks_updated": 2}
+    old = client.hgetall("doc:techblogs:old")
+    assert old[b"chunk_contains_code"] == b"true"
+    assert float(old[b"document_date_epoch"]) == indexes.iso_to_epoch("2024-01-05")
+    split = client.hgetall("doc:techblogs:split")
+    assert split[b"chunk_contains_code"] == b"false"
+    assert float(split[b"document_date_epoch"]) == indexes.iso_to_epoch("2024-01-05")
+    for key in ["doc:techblogs:old", "doc:techblogs:split", "doc:techblogs:current"]:
+        assert client.hgetall(key)[b"content_vector"] == vector
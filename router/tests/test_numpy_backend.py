@@ -0,0 +1,64 @@
+import numpy as np
+
+from numpy_backend import NumpyVectorBackend
+
+
+def _vectors(count, dims=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dims)).astype(np.float32)
+
+
+def test_searches_stay_exact_while_the_ivf_index_trains(tmp_path):
+    backend = NumpyVectorBackend(str(tmp_path), "techblogs", 8, ivf_lists=2, nprobe=1)
+    vectors = _vectors(100)
+    keys = [f"doc:techblogs:{i}" for i in range(100)]
+    backend.add_embedded_texts([f"text {i}" for i in range(100)], [{} for _ in keys], vectors, keys)
+
+    results = backend.knn_search(vectors[7], 1, ["content"])
+    assert results[0]["content"] == "text 7"
+
+    backend._ivf_thread.join()
+    assert backend.stats()["ivf_trained"]
+    assert (backend._assignments[:100] >= 0).all()
+    assert backend.knn_search(vectors[7], 1, ["content"])[0]["content"] == "text 7"
+
+
+def test_log_is_compacted_and_replays_the_live_items(tmp_path):
+    backend = NumpyVectorBackend(str(tmp_path), "techblogs", 8)
+    backend.compact_min_records = 20
+    vectors = _vectors(4)
+    keys = [f"doc:techblogs:{i}" for i in range(4)]
+    for _ in range(10):
+        backend.add_embedded_texts(["a", "b", "c", "d"], [{} for _ in keys], vectors, keys)
+    backend.delete_chunks(keys[1:2])
+
+    with open(tmp_path / "items.jsonl") as f:
+        assert len(f.readlines()) < 20
+
+    reopened = NumpyVectorBackend(str(tmp_path), "techblogs", 8)
+    assert reopened.stats()["num_items"] == 3
+    assert reopened.knn_search(vectors[2], 1, ["content"])[0]["content"] == "c"
+    # the row of the deleted item is reused
+    reopened.add_embedded_texts(["e"], [{}], vectors[:1], ["doc:techblogs:4"])
+    assert reopened._rows["doc:techblogs:4"] == 1
+
+
+def test_keyword_search_ranks_with_bm25(tmp_path):
+    backend = NumpyVectorBackend(str(tmp_path), "techblogs", 8)
+    texts = [
+        "GPU memory and GPU kernels on every GPU",
+        "a long post that mentions the GPU only once among many other words",
+        "nothing relevant here",
+    ]
+    metadatas = [{"document_url": f"https://example.com/{i}"} for i in range(3)]
+    keys = [f"doc:techblogs:{i}" for i in range(3)]
+    backend.add_embedded_texts(texts, metadatas, _vectors(3), keys)
+
+    results = backend.keyword_search("union", "content", "gpu", 3, ["content"])
+    assert [result["id"] for result in results] == keys[:2]
+    assert results[0]["score"] > results[1]["score"] > 0
+
+    assert [r["id"] for r in backend.keyword_search("fuzzy", "content", "kernals", 3, [])] == keys[:1]
+    assert [r["id"] for r in backend.keyword_search("wildcard", "content", "kern*", 3, [])] == keys[:1]
+    # tag fields only match whole values
+    tag_results = backend.keyword_search("exact", "document_url", "https://example.com/2", 3, [])
+    assert [result["id"] for result in tag_results] == keys[2:]
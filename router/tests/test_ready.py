@@ -0,0 +1,24 @@
+import redis
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_ready_once_redis_is_provisioned_and_triton_serves_the_model(monkeypatch):
+    client = TestClient(main.app)
+    monkeypatch.setattr(main.embedder, "is_ready", lambda: True)
+
+    def unreachable():
+        raise redis.ConnectionError("redis:6379 is unreachable")
+
+    monkeypatch.setattr(main, "_provision", unreachable)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"ready": False, "redis": False, "triton": True}
+
+    provisioned = []
+    monkeypatch.setattr(main, "_provision", lambda: provisioned.append(True))
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"ready": True, "redis": True, "triton": True}
+    assert provisioned == [True]
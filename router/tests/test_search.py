@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+import main
+from test_embedding_cache import CHUNK
+
+
+def _insert(client, asset_type, texts):
+    response = client.post(
+        "/data/insert",
+        json={"asset_type": asset_type, "chunks": [dict(CHUNK, text=text) for text in texts]},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_semantic_search_embeds_the_query_once_for_every_asset_type(client, fake_triton):
+    _insert(client, "techblogs", ["CUDA graphs cut launch overhead."])
+    _insert(client, "summarize_techblogs", ["A summary of CUDA graphs."])
+    fake_triton.texts.clear()
+
+    response = client.post(
+        "/search/semantic",
+        json={
+            "query": "CUDA graphs",
+            "asset_types": ["techblogs", "summarize_techblogs"],
+            "return_fields": ["content"],
+        },
+    )
+
+    assert response.status_code == 200
+    assert fake_triton.texts == ["query: CUDA graphs"]
+    output = response.json()
+    assert [asset_type["asset_type"] for asset_type in output] == ["techblogs", "summarize_techblogs"]
+    # the stored content is the embedded passage, prefixed with the title
+    assert output[0]["results"][0]["content"].endswith("CUDA graphs cut launch overhead.")
+    assert output[1]["results"][0]["content"].endswith("A summary of CUDA graphs.")
+
+
+def test_asset_types_are_searched_concurrently(monkeypatch):
+    monkeypatch.setattr(main, "SEARCH_FANOUT", True)
+    # each search waits for the other one, they would time out one after the other
+    barrier = threading.Barrier(2, timeout=5)
+
+    def search(asset_type):
+        barrier.wait()
+        return [{"id": asset_type}]
+
+    output = asyncio.run(main._fan_out(search, ["techblogs", "summarize_techblogs"]))
+    assert [asset_type["results"] for asset_type in output] == [
+        [{"id": "techblogs"}],
+        [{"id": "summarize_techblogs"}],
+    ]
+
+
+def test_keyword_search_returns_every_asset_type_in_order(client):
+    _insert(client, "techblogs", ["Tensor cores speed up matrix math."])
+
+    response = client.post(
+        "/search/keyword",
+        json={"value": "tensor", "asset_types": ["summarize_techblogs", "techblogs"]},
+    )
+
+    assert response.status_code == 200
+    output = response.json()
+    assert [asset_type["asset_type"] for asset_type in output] == ["summarize_techblogs", "techblogs"]
+    assert output[0]["results"] == [] and len(output[1]["results"]) == 1
+
+
+def test_batch_search_answers_every_query_in_order(client, fake_triton):
+    _insert(client, "techblogs", ["Tensor cores speed up matrix math.", "NVLink connects GPUs."])
+    fake_triton.texts.clear()
+
+    response = client.post(
+        "/search/semantic/batch",
+        json={
+            "queries": ["NVLink connects GPUs.", "Tensor cores", "NVLink connects GPUs."],
+            "asset_types": ["techblogs"],
+            "k": 1,
+            "return_fields": ["content"],
+        },
+    )
+
+    assert response.status_code == 200
+    output = response.json()
+    assert [query["query"] for query in output] == [
+        "NVLink connects GPUs.", "Tensor cores", "NVLink connects GPUs."
+    ]
+    # repeated queries are embedded once, in one Triton batch
+    assert sorted(fake_triton.texts) == ["query: NVLink connects GPUs.", "query: Tensor cores"]
+    assert output[0]["results"] == output[2]["results"]
+    assert len(output[1]["results"][0]["results"]) == 1
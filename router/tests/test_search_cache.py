@@ -0,0 +1,32 @@
+import main
+from conftest import FakeRedis
+from search_cache import SearchResponseCache
+from test_embedding_cache import CHUNK
+
+
+def _keyword_search(client):
+    response = client.post(
+        "/search/keyword", json={"value": "cuda", "asset_types": ["techblogs"]}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_cached_responses_are_dropped_by_writes_to_their_asset_type(client, monkeypatch):
+    cache = SearchResponseCache(FakeRedis())
+    monkeypatch.setattr(main, "search_cache", cache)
+
+    first = _keyword_search(client)
+    assert _keyword_search(client) == first
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+    # only the generation of the asset types written to is bumped
+    cache.invalidate(["summarize_techblogs"])
+    _keyword_search(client)
+    assert cache.stats()["hits"] == 2
+
+    response = client.post("/data/insert", json={"asset_type": "techblogs", "chunks": [dict(CHUNK)]})
+    assert response.status_code == 200
+    after_insert = _keyword_search(client)
+    assert cache.stats()["misses"] == 2
+    assert len(after_insert[0]["results"]) == len(first[0]["results"]) + 1
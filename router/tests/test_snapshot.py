@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import indexes
+from conftest import FakeRedis
+from embeddings import EMBEDDING_DIMS
+from snapshot import export_snapshot, import_snapshot
+
+
+def _techblogs_client():
+    client = FakeRedis()
+    indexes.create_index(client, "techblogs", "doc:techblogs", "hash", None, EMBEDDING_DIMS)
+    vectors = np.random.default_rng(0).normal(size=(3, EMBEDDING_DIMS)).astype(np.float32)
+    for i, vector in enumerate(vectors):
+        client.hset(
+            f"doc:techblogs:{i}",
+            mapping={
+                "content": f"chunk {i}",
+                "document_url": "https://example.com/post",
+                "content_vector": vector.tobytes(),
+            },
+        )
+    client.hset(
+        "docinfo:techblogs:post",
+        mapping={"document_url": "https://example.com/post", "document_title": "Post"},
+    )
+    return client, vectors
+
+
+def test_snapshot_round_trip_into_another_asset_type(tmp_path):
+    client, vectors = _techblogs_client()
+
+    manifest = export_snapshot(client, "techblogs", str(tmp_path / "snapshot"), 2, str(tmp_path))
+    assert manifest["num_chunks"] == 3 and manifest["num_documents"] == 1
+
+    counts = import_snapshot(
+        client, str(tmp_path / "snapshot"), "staging_techblogs", 2, str(tmp_path)
+    )
+    assert counts == {"asset_type": "staging_techblogs", "num_chunks": 3, "num_documents": 1}
+    assert indexes.index_prefixes(client, "staging_techblogs") == ["doc:staging_techblogs"]
+    for i, vector in enumerate(vectors):
+        chunk = client.hgetall(f"doc:staging_techblogs:{i}")
+        assert chunk[b"content"] == f"chunk {i}".encode()
+        np.testing.assert_array_equal(np.frombuffer(chunk[b"content_vector"], np.float32), vector)
+    assert client.hgetall("docinfo:staging_techblogs:post")[b"document_title"] == b"Post"
+
+
+def test_import_refuses_a_key_prefix_another_index_matches(tmp_path):
+    client, _ = _techblogs_client()
+    export_snapshot(client, "techblogs", str(tmp_path / "snapshot"), 2, str(tmp_path))
+
+    # "doc:techblogs" would also index the "doc:techblogs_copy:" chunks
+    with pytest.raises(ValueError, match="techblogs"):
+        import_snapshot(client, str(tmp_path / "snapshot"), "techblogs_copy", 2, str(tmp_path))
+    assert not indexes.index_exists(client, "techblogs_copy")
+    assert client.scan_iter("doc:techblogs_copy:*") == []
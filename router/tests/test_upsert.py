@@ -0,0 +1,34 @@
+from test_embedding_cache import CHUNK
+
+
+def _upsert(client, texts):
+    response = client.post(
+        "/data/upsert",
+        json={
+            "asset_type": "techblogs",
+            "document_url": CHUNK["document_url"],
+            "chunks": [dict(CHUNK, text=text) for text in texts],
+        },
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_upsert_only_embeds_changed_chunks(client, fake_triton):
+    texts = [f"Paragraph {i} of the post." for i in range(3)]
+    first = _upsert(client, texts)
+    assert (first["items_embedded"], first["items_unchanged"], first["items_deleted"]) == (3, 0, 0)
+
+    texts[1] = "Paragraph 1 of the post, edited."
+    second = _upsert(client, texts)
+    assert (second["items_embedded"], second["items_unchanged"], second["items_deleted"]) == (1, 2, 1)
+
+    # unchanged chunks keep their ids, the edited chunk gets a new one
+    assert second["ids"][0] == first["ids"][0] and second["ids"][2] == first["ids"][2]
+    assert second["ids"][1] != first["ids"][1]
+    assert len(fake_triton.texts) == 4
+
+    import main
+
+    backend = main.vectorstores["techblogs"]
+    assert sorted(backend.find_document_keys(CHUNK["document_url"])) == sorted(second["ids"])
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import numpy as np
+from redis.commands.search.query import Query
+
+import indexes
+import main
+from test_embedding_cache import CHUNK
+from vectorstore import RedisVectorstore, apply_return_fields, decode_result_fields
+
+
+class FakeSearchIndex:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def info(self):
+        return {"attributes": [self.client.vector_attribute]}
+
+    def search(self, query, params):
+        self.client.searches.append((self.name, query, params))
+        return SimpleNamespace(docs=[])
+
+
+class FakeSearchClient:
+    """Answers FT.INFO with one vector field and records FT.SEARCH calls"""
+
+    def __init__(self, algorithm, data_type):
+        self.vector_attribute = [
+            b"identifier", b"content_vector", b"attribute", b"content_vector",
+            b"type", b"VECTOR", b"algorithm", algorithm.encode(), b"data_type", data_type.encode(),
+        ]
+        self.searches = []
+
+    def ft(self, name):
+        return FakeSearchIndex(self, name)
+
+
+def _vectorstore(client, configured_algorithm="HNSW"):
+    rds = object.__new__(RedisVectorstore)
+    rds.client = client
+    rds.index_name = "techblogs"
+    rds.relevance_score_fn = lambda distance: 1 - distance
+    rds._schema = SimpleNamespace(
+        content_vector_key="content_vector",
+        content_vector=SimpleNamespace(algorithm=configured_algorithm),
+        vector_dtype=np.float32,
+    )
+    return rds
+
+
+def _results(*docs):
+    return SimpleNamespace(docs=[SimpleNamespace(**doc) for doc in docs])
+
+
+def test_keyword_results_keep_the_content_when_it_is_asked_for():
+    rds = object.__new__(RedisVectorstore)
+    results = _results({"id": "doc:techblogs:1", "payload": None, "content": "Redis streams", "score": 1.5})
+
+    assert rds._redis_results_as_dicts(results, ["content"]) == [
+        {"id": "doc:techblogs:1", "content": "Redis streams", "score": 1.5}
+    ]
+    assert rds._redis_results_as_dicts(results, ["document_title"]) == [
+        {"id": "doc:techblogs:1", "score": 1.5}
+    ]
+
+
+def test_ef_runtime_follows_the_algorithm_of_the_live_index():
+    # the config says HNSW, but the index was created as FLAT before it changed
+    client = FakeSearchClient("FLAT", "FLOAT32")
+    _vectorstore(client).knn_search(np.zeros(4, np.float32), 3, ["content"], ef_runtime=64)
+    _, query, params = client.searches[0]
+    assert "EF_RUNTIME" not in query.query_string() and "ef_runtime" not in params
+
+    client = FakeSearchClient("HNSW", "FLOAT32")
+    _vectorstore(client, "FLAT").knn_search(np.zeros(4, np.float32), 3, ["content"], ef_runtime=64)
+    _, query, params = client.searches[0]
+    assert "EF_RUNTIME $ef_runtime" in query.query_string() and params["ef_runtime"] == 64
+
+
+def test_query_vectors_follow_the_datatype_of_the_live_index():
+    # the config already says FLOAT16, the index is still FLOAT32 until it is reindexed
+    client = FakeSearchClient("FLAT", "FLOAT32")
+    rds = _vectorstore(client)
+    rds.vector_datatype = "FLOAT16"
+    rds.knn_search(np.ones(4, np.float32), 3, ["content"])
+    _, _, params = client.searches[0]
+    assert len(params["vector"]) == 4 * 4
+
+
+def test_from_client_uses_the_shared_client_without_connecting():
+    import schema
+
+    client = FakeSearchClient("HNSW", "FLOAT32")
+    rds = RedisVectorstore.from_client(
+        client, None, "techblogs", schema.index_schema, {"algorithm": "HNSW", "dims": 4}
+    )
+    assert rds.client is client
+    assert rds._schema.content_vector.algorithm == "HNSW"
+    rds.knn_search(np.zeros(4, np.float32), 3, ["content"])
+    assert client.searches[0][0] == "techblogs"
+
+
+def test_json_storage_keeps_list_metadata_as_arrays():
+    _, hash_chunk = main._prepare_chunk(dict(CHUNK), "hash")
+    _, json_chunk = main._prepare_chunk(dict(CHUNK), "json")
+    assert hash_chunk["contains_code"] == "[false]"
+    assert json_chunk["contains_code"] == [False]
+
+    # list fields are indexed element by element
+    paths = {field.as_name: field.name for field in indexes.index_fields("json", None, 4)}
+    assert paths["text_components"] == "$.text_components[*]"
+    assert paths["document_url"] == "$.document_url"
+
+    query = apply_return_fields(Query("*"), ["contains_code"], "json")
+    assert "$.contains_code" in query.get_args()
+    assert decode_result_fields({"contains_code": "[false]"}, "json") == {"contains_code": [False]}
+    assert decode_result_fields({"contains_code": "[false]"}, "hash") == {"contains_code": "[false]"}
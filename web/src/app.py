@@ -21,6 +21,17 @@ ROUTER_PORT = os.environ.get("ROUTER_PORT", "5006")
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 K_TEXT_RECS = 5
 MAX_TOKENS_CONTEXT = 2400  # max input seq length of 3072, leave room for prompt 
+# only ask the router for the fields we use to build the context and show the sources
+ROUTER_RETURN_FIELDS = [
+    "text",
+    "text_components",
+    "heading_section_index",
+    "heading_section_title",
+    "paragraph_index",
+    "only_code",
+    "document_title",
+    "document_url",
+]
 
 
 app = Flask(__name__)
@@ -229,6 +240,7 @@ def generate():
             "query": query,
             "k": k,
             "asset_types": asset_types,
+            "return_fields": ROUTER_RETURN_FIELDS,
         },
     )
     if response.status_code == 200:
@@ -52,13 +52,20 @@ def get_codeqa_chain(llm: BaseChatModel) -> Runnable:
     return _get_stuff_documents_chain(llm, codeqa_prompt)
 
 
+# hash storage returns list fields as JSON strings, json storage as lists
+def _as_list(value):
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
 # add newlines between headings and paragraphs
 def _format_text_without_code(result: dict) -> str:
-    heading_section_index = json.loads(result["heading_section_index"])
-    heading_section_title = json.loads(result["heading_section_title"])
-    paragraph_index = json.loads(result["paragraph_index"])
-    only_code = json.loads(result["only_code"])
-    text_components = json.loads(result["text_components"])
+    heading_section_index = _as_list(result["heading_section_index"])
+    heading_section_title = _as_list(result["heading_section_title"])
+    paragraph_index = _as_list(result["paragraph_index"])
+    only_code = _as_list(result["only_code"])
+    text_components = _as_list(result["text_components"])
 
     text = ""
     last_hsi = None
@@ -81,11 +88,11 @@ def _format_text_without_code(result: dict) -> str:
 
 # add newlines between headings and paragraphs
 def _format_text_with_code(result: dict) -> str:
-    heading_section_index = json.loads(result["heading_section_index"])
-    heading_section_title = json.loads(result["heading_section_title"])
-    paragraph_index = json.loads(result["paragraph_index"])
-    only_code = json.loads(result["only_code"])
-    text_components = json.loads(result["text_components"])
+    heading_section_index = _as_list(result["heading_section_index"])
+    heading_section_title = _as_list(result["heading_section_title"])
+    paragraph_index = _as_list(result["paragraph_index"])
+    only_code = _as_list(result["only_code"])
+    text_components = _as_list(result["text_components"])
 
     text = ""
     last_hsi = None